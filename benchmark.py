@@ -0,0 +1,268 @@
+"""
+Command latency benchmarks against simulated cameras, no camera hardware needed.
+
+Usage:
+    python benchmark.py --cameras 8 --latency 20 --jitter 5 --loss 0.01
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from onvif.client import UsernameDigestTokenDtDiff
+from zeep.wsdl.utils import etree_to_string
+from lib.CapabilityCache import CapabilityCache
+from lib.CommandDispatcher import CommandDispatcher
+from lib.ONVIFControl import ONVIFControl
+from lib.ONVIFSimulator import SimulatedCamera
+
+
+def percentiles(samples):
+    if not samples:
+        return 'no samples'
+    samples = sorted(samples)
+
+    def pick(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+
+    return f'p50 {pick(50):7.1f} ms  p95 {pick(95):7.1f} ms  p99 {pick(99):7.1f} ms  max {samples[-1] * 1000:7.1f} ms'
+
+
+def connect(simulators, capability_cache, timeout):
+    def setup(simulator):
+        camera = ONVIFControl('127.0.0.1', simulator.port, 'admin', 'admin', timeout=timeout, read_timeout=timeout,
+                              capability_cache=capability_cache)
+        start = time.perf_counter()
+        try:
+            camera.setup()
+            camera.revalidate()
+        except Exception:
+            camera.close()
+            return None, None
+        return camera, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(simulators)) as executor:
+        results = [result for result in executor.map(setup, simulators) if result[0] is not None]
+    return [camera for camera, _ in results], [elapsed for _, elapsed in results], time.perf_counter() - start
+
+
+def benchmark_setup(simulators, capability_cache, timeout):
+    for label in ('cold', 'cached'):
+        cameras, times, total = connect(simulators, capability_cache, timeout)
+        print(f'setup {label:6}  {len(cameras)}/{len(simulators)} cameras in {total * 1000:7.1f} ms   '
+              f'per camera {percentiles(times)}')
+        for camera in cameras:
+            camera.close()
+    return connect(simulators, capability_cache, timeout)[0]
+
+
+def benchmark_round_trip(cameras, repeats):
+    samples = []
+    errors = 0
+    for camera in cameras:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            try:
+                camera.move(0.5, 0)
+                camera.stop()
+                samples.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+    print(f'move->stop      {len(samples)} samples, {errors} errors   {percentiles(samples)}')
+
+
+def benchmark_throughput(cameras, duration):
+    counts = [0] * len(cameras)
+    errors = [0] * len(cameras)
+    deadline = time.perf_counter() + duration
+
+    def run(idx):
+        camera = cameras[idx]
+        speed = 0.1
+        while time.perf_counter() < deadline:
+            try:
+                camera.move(speed, 0)
+                counts[idx] += 1
+            except Exception:
+                errors[idx] += 1
+            speed = -speed
+        try:
+            camera.stop()
+        except Exception:
+            errors[idx] += 1
+
+    threads = [threading.Thread(target=run, args=(idx,)) for idx in range(len(cameras))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = sum(counts)
+    print(f'throughput      {total / duration:7.1f} commands/s over {len(cameras)} cameras '
+          f'({total / duration / len(cameras):.1f} per camera), {sum(errors)} errors')
+
+
+def benchmark_encode(camera, simulator, repeats):
+    """
+    CPU time to build one command's request, through zeep and from the precompiled template. Each template is first
+    checked byte for byte against zeep's request for the same values and security token, then sent to the
+    simulator to check the camera does what it was told.
+    """
+    client = camera.ptz.zeep_client
+    binding = camera.ptz.ws_client._binding
+    options = camera.ptz.ws_client._binding_options
+    nonce = 'benchmark-nonce!'
+    created = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    timeout = camera.move_timeout(1)
+    requests = {
+        ('move', False): ({'x': 0.25, 'y': -0.5}, {'PanTilt': {'x': 0.25, 'y': -0.5}}),
+        ('zoom', True): ({'zoom': -0.3, 'timeout': timeout}, {'Zoom': {'x': -0.3}}),
+        ('velocity', True): ({'x': 0.125, 'y': 1, 'zoom': 0.1, 'timeout': timeout},
+                             {'PanTilt': {'x': 0.125, 'y': 1}, 'Zoom': {'x': 0.1}}),
+        ('stop', False): ({}, None),
+    }
+
+    def zeep_request(key, velocity):
+        if key[0] == 'stop':
+            return 'Stop', {'ProfileToken': camera.profile_token}
+        request = {'ProfileToken': camera.profile_token, 'Velocity': velocity}
+        if key[1]:
+            request['Timeout'] = timeout
+        return 'ContinuousMove', request
+
+    wsse = client.wsse
+    client.wsse = UsernameDigestTokenDtDiff(wsse.username, wsse.password, dt_diff=getattr(wsse, 'dt_diff', None),
+                                            nonce=nonce, created=created, use_digest=wsse.use_digest)
+    try:
+        for key, (values, velocity) in requests.items():
+            operation, request = zeep_request(key, velocity)
+            expected = etree_to_string(binding._create(operation, (), request, client=client, options=options)[0])
+            same = camera.templates[key].render(values, nonce=nonce, created=created) == expected
+            print(f'template {key[0]:8} {"timeout" if key[1] else "       "}  '
+                  f'{"identical to zeep" if same else "DIFFERS from zeep"}')
+    finally:
+        client.wsse = wsse
+
+    operation, request = zeep_request(('velocity', True), requests['velocity', True][1])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        etree_to_string(binding._create(operation, (), request, client=client, options=options)[0])
+    zeep_time = (time.perf_counter() - start) / repeats
+    template = camera.templates['velocity', True]
+    values = requests['velocity', True][0]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        template.render(values)
+    template_time = (time.perf_counter() - start) / repeats
+    print(f'encode velocity  zeep {zeep_time * 1e6:7.1f} us  template {template_time * 1e6:7.1f} us  '
+          f'({zeep_time / template_time:.0f}x less CPU per command)')
+
+    try:
+        camera.velocity(0.125, 1, 0.1, 1)
+        sent = simulator.velocity == [0.125, 1, 0.1] and simulator.move_deadline is not None
+        camera.stop()
+        stopped = simulator.velocity == [0.0, 0.0, 0.0]
+        print(f'template sent    simulator {"followed" if sent and stopped else "DID NOT follow"} velocity and stop')
+    except Exception as err:
+        print(f'template sent    failed: {err}')
+
+
+def benchmark_overshoot(cameras, simulators, trials, hold, move_timeout):
+    """
+    Hold a move for hold seconds, release and measure how long the camera keeps moving afterwards. Compares a plain
+    move ended by Stop with bounded moves renewed by the dispatcher, with and without the Stop on release.
+    """
+    simulators = {simulator.port: simulator for simulator in simulators}
+    speed = 0.2
+    poll = 0.01
+
+    def run(camera, timeout, send_stop):
+        simulator = simulators[camera.port]
+        results = {'samples': [], 'stalls': 0, 'runaways': 0}
+        dispatcher = CommandDispatcher(f'{camera.name} overshoot', on_error=lambda err: None, move_timeout=timeout)
+        for _ in range(trials):
+            with simulator.lock:
+                simulator.update_position()
+                simulator.position[0] = -0.8
+            dispatcher.move(camera.move, speed, 0, timeout)
+            moved = moving = False
+            deadline = time.monotonic() + hold
+            while time.monotonic() < deadline:
+                was_moving, moving = moving, simulator.moving()
+                if was_moving and not moving:
+                    results['stalls'] += 1
+                moved = moved or moving
+                time.sleep(poll)
+            released = simulator.ptz_position()[0]
+            release_time = time.monotonic()
+            if send_stop:
+                dispatcher.stop(camera.stop)
+            else:
+                dispatcher.cancel_moves()
+            while simulator.moving() and time.monotonic() - release_time < (timeout or 0) + 2:
+                time.sleep(poll)
+            with simulator.lock:
+                if simulator.moving():
+                    results['runaways'] += 1
+                    simulator.velocity = [0.0, 0.0, 0.0]
+                    simulator.move_deadline = None
+            if moved:
+                results['samples'].append((simulator.ptz_position()[0] - released) / speed)
+        time.sleep(0.2)
+        dispatcher.close()
+        return dict(results, renewed=dispatcher.renewed, errors=dispatcher.errors)
+
+    for label, timeout, send_stop in (('stop', None, True),
+                                      (f'bounded {move_timeout:g}s + stop', move_timeout, True),
+                                      (f'bounded {move_timeout:g}s', move_timeout, False)):
+        with ThreadPoolExecutor(max_workers=len(cameras)) as executor:
+            results = list(executor.map(lambda camera: run(camera, timeout, send_stop), cameras))
+        samples = [sample for result in results for sample in result['samples']]
+        totals = {key: sum(result[key] for result in results) for key in ('stalls', 'runaways', 'renewed', 'errors')}
+        print(f'overshoot {label:19} {percentiles(samples)} of travel after release')
+        print(f'{"":29} {totals["stalls"]} stalls while held, {totals["runaways"]} runaways, '
+              f'{totals["renewed"]} renewals, {totals["errors"]} errors')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ONVIFControl against simulated cameras')
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=10, help='milliseconds added to every response')
+    parser.add_argument('--jitter', type=float, default=2, help='+/- milliseconds of random latency')
+    parser.add_argument('--loss', type=float, default=0, help='fraction of requests dropped, 0 to 1')
+    parser.add_argument('--repeats', type=int, default=50, help='move->stop round trips per camera')
+    parser.add_argument('--duration', type=float, default=5, help='seconds to run the throughput test')
+    parser.add_argument('--timeout', type=float, default=2, help='request timeout in seconds')
+    parser.add_argument('--trials', type=int, default=3, help='held moves per camera for the overshoot test')
+    parser.add_argument('--hold', type=float, default=1.5, help='seconds each move is held for the overshoot test')
+    parser.add_argument('--move-timeout', type=float, default=1, help='ONVIF Timeout of bounded moves in seconds')
+    parser.add_argument('--encodes', type=int, default=2000, help='requests built for the encode benchmark')
+    args = parser.parse_args()
+
+    simulators = [SimulatedCamera(latency=args.latency / 1000, jitter=args.jitter / 1000, loss=args.loss,
+                                  serial=f'SIM{idx + 1:04}').start()
+                  for idx in range(args.cameras)]
+    capability_cache = CapabilityCache(os.path.join(tempfile.mkdtemp(), 'capabilities.json'))
+    print(f'{args.cameras} simulated cameras, latency {args.latency} ms +/- {args.jitter} ms, loss {args.loss:.1%}')
+
+    cameras = benchmark_setup(simulators, capability_cache, args.timeout)
+    if not cameras:
+        print('No cameras connected')
+        return
+    benchmark_encode(cameras[0], {simulator.port: simulator for simulator in simulators}[cameras[0].port],
+                     args.encodes)
+    benchmark_round_trip(cameras, args.repeats)
+    benchmark_throughput(cameras, args.duration)
+    benchmark_overshoot(cameras, simulators, args.trials, args.hold, args.move_timeout)
+
+    for camera in cameras:
+        print(f'{camera.host}:{camera.port}  {camera.connection_stats()}')
+        camera.close()
+    for simulator in simulators:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,75 @@
 import os, sys, subprocess
-import configparser
-import shutil
+import threading
+from lib.StartupProfile import get_startup_profile
 import tkinter
-import re
+from concurrent.futures import ThreadPoolExecutor
 from lib.ManagePresets import ManagePresets
-from lib.pyinstaller_helper import resource_path, user_path
-from tkinter import Label, Menu, Tk
+from lib.pyinstaller_helper import resource_path
+from lib.Settings import Settings, supervisor_settings
+from tkinter import BooleanVar, Label, Menu, Tk
 from lib.CameraControl import CameraControl
+from lib.ConnectionSupervisor import get_connection_supervisor
+from lib.DiscoveryWindow import DiscoveryWindow
+from lib.Gamepad import Gamepad
+from lib.KeyboardControl import KeyboardControl
+from lib.LatencyWindow import LatencyWindow
+from lib.PreviewWall import PreviewWall
+from lib.SceneRecall import SceneRecall
+from lib.ThumbnailCache import get_thumbnail_cache
+from lib.TourScheduler import TourScheduler
+from lib.UIQueue import UIQueue
 
 
 class Controller:
     def __init__(self):
         self.app_name = 'Camera Control'
-        self.settings_filename = user_path(self.app_name, 'settings.ini')
+        self.profile = get_startup_profile()
+        self.profile.mark('imports')
+        self.settings = Settings(app_name=self.app_name)
+        self.settings_filename = self.settings.filename
         self.config = None
         self.cameras = []
+        self.executor = None
+        self.initialized = False
+        self.preview_wall = None
+        self.gamepad = None
+        self.gamepad_buttons = {}
+        self.focused = None
+        self.scene_recall = SceneRecall()
+        self.tours = TourScheduler()
+        self.tour_vars = {}
+        self.tour_defs = {}
+        self.profile_pending = 0
 
         self.root = Tk()
         self.root.title("Camera Control")
         self.root.configure(background='white')
         self.root.iconbitmap(resource_path(os.path.join('assets', 'favicon.ico')))
+        self.profile.mark('tk')
 
         self.message = Label(self.root, text="", anchor="center", background="white")
         self.message.grid(row=0, column=0)
 
+        self.ui_queue = UIQueue(self.root)
+        self.keyboard = KeyboardControl(self.root, self.keyboard_camera)
+
         self.menubar = Menu(self.root)
         self.filemenu = Menu(self.menubar, tearoff=0)
         self.filemenu.add_command(label="Settings", command=self.open_settings)
         self.filemenu.add_command(label="Reload", command=self.reload)
+        self.filemenu.add_command(label="Find cameras", command=self.open_discovery_window)
+        self.filemenu.add_command(label="Latency", command=self.open_latency_window)
         self.menubar.add_cascade(label="File", menu=self.filemenu)
 
         self.presetsmenu = Menu(self.menubar, tearoff=0)
         self.menubar.add_cascade(label="Presets", menu=self.presetsmenu)
 
+        self.scenesmenu = Menu(self.menubar, tearoff=0)
+        self.menubar.add_cascade(label="Scenes", menu=self.scenesmenu)
+
+        self.toursmenu = Menu(self.menubar, tearoff=0)
+        self.menubar.add_cascade(label="Tours", menu=self.toursmenu)
+
         self.move_speed_slow = 40
         self.move_speed_fast = 80
         self.zoom_speed_slow = 30
@@ -40,36 +77,199 @@ class Controller:
 
         self.reload()
         self.root.config(menu=self.menubar)
+        self.profile.mark('settings and layout')
+        self.root.after_idle(self.window_shown)
         self.root.after(500, self.initialize)  # delay starting for better UX
 
         self.root.protocol("WM_DELETE_WINDOW", self.close)
         self.root.mainloop()
 
     def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.ui_queue.close()
         for camera in self.cameras:
             camera.close()
+        if self.preview_wall:
+            self.preview_wall.close()
+        if self.gamepad:
+            self.gamepad.stop()
+        self.scene_recall.close()
+        self.tours.close()
         self.root.destroy()
 
     def reload(self):
+        """
+        Apply settings.ini to the running cameras. Only cameras whose section was added, removed or changed, or that
+        are built from a GENERAL key that changed, are rebuilt, unchanged cameras keep their widgets and connection.
+        The other GENERAL keys, e.g. the thumbnail cache size or the tour resume delay, are applied in place.
+        """
         try:
             self.load_settings()
-            self.cameras = []
-            cameras_sections = self.get_camera_sections()
-            for section in cameras_sections:
-                self.initialize_camera(section)
+            self.configure_preview_wall()
+            general = dict(self.config['GENERAL'])
+            get_connection_supervisor().configure(**supervisor_settings(general))
+            cache_mb = 20 if 'thumbnail_cache_mb' not in general else float(general['thumbnail_cache_mb'])
+            get_thumbnail_cache().configure(max_bytes=int(cache_mb * 1024 * 1024))
+            existing = {camera.section: camera for camera in self.cameras}
+            cameras = []
+            added = []
+            for section in self.get_camera_sections():
+                camera = existing.pop(section, None)
+                if camera and camera.is_configured(dict(self.config[section]), general):
+                    cameras.append(camera)
+                    continue
+                if camera:
+                    camera.destroy()
+                camera = self.initialize_camera(section)
+                cameras.append(camera)
+                added.append(camera)
+
+            for camera in existing.values():
+                camera.destroy()
+            self.cameras = cameras
+            if self.focused not in self.cameras:
+                self.focused = None
+            self.configure_gamepad()
 
             for idx, camera in enumerate(self.cameras):
                 frame = camera.get_frame()
                 frame.grid(row=idx + 1, column=0, padx=10, pady=10, sticky="nw")
 
             self.populate_presets_menu()
+            self.populate_scenes_menu()
+            self.populate_tours_menu()
+            if self.initialized:
+                self.start_cameras(added)
 
         except Exception as err:
             self.set_message(f'Error: {err}')
 
+    def configure_preview_wall(self):
+        # Preview wall mode shares a fixed number of workers and a frame rate budget between all previews
+        general = self.config['GENERAL']
+        if 'preview_wall' not in general or not general.getboolean('preview_wall'):
+            if self.preview_wall:
+                self.preview_wall.close()
+                self.preview_wall = None
+            return
+        focus_fps = 20 if 'preview_fps' not in general else max(1, int(general['preview_fps']))
+        background_fps = 2 if 'preview_background_fps' not in general else float(general['preview_background_fps'])
+        fps_budget = 60 if 'preview_fps_budget' not in general else float(general['preview_fps_budget'])
+        memory_mb = 256 if 'preview_memory_mb' not in general else int(general['preview_memory_mb'])
+        if self.preview_wall is None:
+            workers = 2 if 'preview_workers' not in general else int(general['preview_workers'])
+            self.preview_wall = PreviewWall(workers=max(1, workers))
+        self.preview_wall.configure(focus_fps=focus_fps, background_fps=background_fps, fps_budget=fps_budget,
+                                    memory_budget=memory_mb * 1024 * 1024)
+
+    def configure_gamepad(self):
+        general = self.config['GENERAL']
+        if 'joystick' not in general or not general.getboolean('joystick'):
+            if self.gamepad:
+                self.gamepad.stop()
+                self.gamepad = None
+            return
+        axes = (0, 1, 3) if 'joystick_axes' not in general else \
+            tuple(int(axis) for axis in general['joystick_axes'].split(','))
+        inverted = ('tilt', 'zoom') if 'joystick_invert' not in general else \
+            [axis.strip() for axis in general['joystick_invert'].split(',')]
+        invert = tuple(axis in inverted for axis in ('pan', 'tilt', 'zoom'))
+        next_button = 5 if 'joystick_next_button' not in general else int(general['joystick_next_button'])
+        previous_button = 4 if 'joystick_previous_button' not in general else int(general['joystick_previous_button'])
+        self.gamepad_buttons = {next_button: 1, previous_button: -1}
+        if self.gamepad:
+            self.gamepad.axes = axes
+            self.gamepad.invert = invert
+            return
+        self.gamepad = Gamepad(self.root, self.joystick_moved, self.joystick_button, axes=axes, invert=invert)
+        if not self.gamepad.start():
+            self.set_message(self.gamepad.error)
+            self.gamepad = None
+
+    def focus_camera(self, camera):
+        # The joystick drives the camera last used, switching stops whatever the joystick was doing
+        if camera is self.focused:
+            return
+        if self.focused:
+            self.focused.analog.release()
+            self.focused.set_focused(False)
+        self.focused = camera
+        if camera:
+            camera.set_focused(True)
+        self.keyboard.update()
+
+    def joystick_moved(self, x, y, z):
+        camera = self.keyboard_camera()
+        if camera:
+            camera.analog.update(x, y, z)
+
+    def keyboard_camera(self):
+        # Keyboard and joystick drive the focused camera, the first one until another is used
+        if self.focused is None and self.cameras:
+            self.focus_camera(self.cameras[0])
+        return self.focused
+
+    def joystick_button(self, button):
+        step = self.gamepad_buttons.get(button)
+        if step and self.cameras:
+            idx = self.cameras.index(self.focused) if self.focused in self.cameras else -step
+            self.focus_camera(self.cameras[(idx + step) % len(self.cameras)])
+
+    def window_shown(self):
+        # Idle callbacks run after Tk has drawn the window
+        self.profile.mark('window shown')
+        threading.Thread(target=self.preload, name='preload', daemon=True).start()
+
+    def preload(self):
+        """
+        Load the ONVIF stack and the parsed WSDLs while the window is already up, so the first camera doesn't pay
+        for them. zeep, onvif and requests take a few hundred milliseconds to import.
+        """
+        general = self.config['GENERAL'] if self.config and 'GENERAL' in self.config else {}
+        try:
+            if 'daemon' in general and general['daemon']:
+                import lib.DaemonClient
+                self.profile.mark('daemon client loaded')
+                return
+            from lib.WSDLCache import get_wsdl_cache
+            import lib.ONVIFControl
+            self.profile.mark('onvif loaded')
+            wsdl_cache = get_wsdl_cache()
+            for wsdl_file in ('devicemgmt.wsdl', 'media.wsdl', 'ptz.wsdl'):
+                wsdl_cache.document(wsdl_file)
+            self.profile.mark('wsdl loaded')
+        except Exception as err:
+            # Connecting will report the same problem on each camera
+            self.profile.mark(f'preload failed: {err}')
+
     def initialize(self):
-        for camera_control in self.cameras:
-            has_started = camera_control.start_camera()
+        self.initialized = True
+        self.profile.mark('cameras starting')
+        self.start_cameras(self.cameras)
+        if not self.cameras:
+            self.profile.finish(self.app_name)
+
+    def start_cameras(self, cameras):
+        # Connect to every camera concurrently, each frame enables itself when its own handshake finishes
+        general = self.config['GENERAL'] if self.config and 'GENERAL' in self.config else {}
+        workers = 8 if 'startup_workers' not in general else int(general['startup_workers'])
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='camera-startup')
+
+        for camera_control in cameras:
+            future = camera_control.start_camera_async(self.executor, self.ui_queue)
+            if self.profile.enabled and not self.profile.reported:
+                self.profile_pending += 1
+                future.add_done_callback(lambda f, camera=camera_control: self.ui_queue.post(self.camera_profiled,
+                                                                                            camera))
+
+    def camera_profiled(self, camera):
+        # Posted after the camera's own start_camera_done, so enabled is already set
+        self.profile.mark(f'{camera.name} {"ready" if camera.enabled else "failed"}')
+        self.profile_pending -= 1
+        if not self.profile_pending:
+            self.profile.finish(self.app_name)
 
     def populate_presets_menu(self):
         self.presetsmenu.delete(0, tkinter.END)
@@ -78,16 +278,99 @@ class Controller:
             self.presetsmenu.add_command(label=camera_control.name,
                                          command=lambda camera=camera_control: self.open_preset_window(camera))
 
+    def populate_scenes_menu(self):
+        self.scenesmenu.delete(0, tkinter.END)
+
+        for section, name, presets in self.settings.scenes():
+            self.scenesmenu.add_command(label=name,
+                                        command=lambda name=name, presets=presets: self.recall_scene(name, presets))
+
+    def recall_scene(self, name, presets):
+        # Recall waits up to the deadline, keep it off the Tk thread
+        general = self.config['GENERAL']
+        deadline = 2 if 'scene_deadline' not in general else float(general['scene_deadline'])
+        cameras = {camera.section: camera for camera in self.cameras}
+        targets = []
+        dispatchers = []
+        for section, token in presets.items():
+            camera = cameras.get(section)
+            if camera is not None:
+                # A scene is an operator action like any other, the camera's tours hold off
+                camera.touched()
+                targets.append((camera.name, camera.ovnif if camera.enabled else None, token))
+                dispatchers.append(camera.dispatcher)
+
+        self.set_message(f'Recalling scene {name}')
+        threading.Thread(target=self.run_scene, args=(name, targets, dispatchers, deadline), name=f'scene-{name}',
+                         daemon=True).start()
+
+    def run_scene(self, name, targets, dispatchers, deadline):
+        # GotoPreset goes to the cameras directly, moves still queued behind it would otherwise land after it
+        SceneRecall.flush(dispatchers, deadline / 4)
+        results = self.scene_recall.recall(targets, deadline)
+        self.ui_queue.post(self.set_message, SceneRecall.summary(name, results))
+
+    def populate_tours_menu(self):
+        """
+        One entry per tour to start and stop it. Running tours are restarted if their section changed and stopped if
+        it is gone. With a daemon the daemon runs the autostart tours, not the GUI.
+        """
+        general = self.config['GENERAL']
+        self.tours.configure(30 if 'tour_resume_delay' not in general else float(general['tour_resume_delay']))
+        self.toursmenu.delete(0, tkinter.END)
+        tours = self.settings.tours()
+        previous = self.tour_defs
+        self.tour_defs = {tour['id']: tour for tour in tours}
+        for tour_id in set(previous) - set(self.tour_defs):
+            self.tours.stop(tour_id)
+
+        self.tour_vars = {}
+        for tour in tours:
+            running = self.tours.running(tour['id'])
+            variable = self.tour_vars[tour['id']] = BooleanVar(self.root, value=running)
+            self.toursmenu.add_checkbutton(label=tour['name'], variable=variable,
+                                           command=lambda tour=tour: self.toggle_tour(tour))
+            if running and tour != previous.get(tour['id']):
+                self.toggle_tour(tour)
+            elif tour['autostart'] and not self.initialized and not general.get('daemon'):
+                variable.set(True)
+                self.toggle_tour(tour)
+        if tours:
+            self.toursmenu.add_separator()
+            self.toursmenu.add_command(label="Status", command=self.show_tour_status)
+
+    def toggle_tour(self, tour):
+        if self.tour_vars[tour['id']].get():
+            self.tours.start(tour['id'], tour['name'], tour['camera'], tour['presets'], tour['dwell'],
+                             lambda token, speed, section=tour['camera']: self.tour_goto(section, token, speed),
+                             tour['speed'])
+            self.set_message(f'Tour {tour["name"]} started')
+        else:
+            self.tours.stop(tour['id'])
+            self.set_message(f'Tour {tour["name"]} stopped')
+
+    def show_tour_status(self):
+        self.set_message(TourScheduler.summary(self.tours.stats()) or 'No tours running')
+
+    def tour_goto(self, section, token, speed):
+        # Tour scheduler thread, the camera is looked up each step so a reloaded camera is followed
+        for camera in self.cameras:
+            if camera.section == section:
+                return camera.tour_goto(token, speed)
+        raise RuntimeError(f'{section} is not configured')
+
+    def camera_used(self, camera):
+        self.tours.activity(camera.section)
+
     def open_preset_window(self, camera):
-        ManagePresets(self.root, camera, self.close_preset_window)
+        # The camera's preset store keeps the button strip in sync, nothing to reload on close
+        ManagePresets(self.root, camera, None)
 
-    def close_preset_window(self):
-        self.reload()
+    def open_discovery_window(self):
+        DiscoveryWindow(self.root, self.settings, self.ui_queue, self.reload)
 
-    def default_settings(self):
-        src = os.path.join(resource_path('assets'), 'default_settings.ini')
-        dst = self.settings_filename
-        shutil.copyfile(src, dst)
+    def open_latency_window(self):
+        LatencyWindow(self.root)
 
     def open_settings(self):
         if sys.platform == "win32":
@@ -96,21 +379,10 @@ class Controller:
             subprocess.call(["open", "-a", "TextEdit", self.settings_filename])
 
     def load_settings(self):
-        if not os.path.isfile(self.settings_filename):
-            self.default_settings()
-
-        self.config = configparser.ConfigParser(comment_prefixes='/', allow_no_value=True)
-        self.config.read(self.settings_filename)
+        self.config = self.settings.load()
 
     def get_camera_sections(self):
-        cameras = []
-        sections = list(self.config.sections())
-        for section in sections:
-            p = re.search(r"^Camera \d+$", section)
-            if p:
-                cameras.append(section)
-
-        return cameras
+        return self.settings.camera_sections()
 
     def get_general_settings(self):
         try:
@@ -122,8 +394,9 @@ class Controller:
             self.set_message("Failed to load speed from the configuration file")
 
     def initialize_camera(self, section):
-        camera_control = CameraControl(self.root, config=self.config[section], general=self.config['GENERAL'])
-        self.cameras.append(camera_control)
+        return CameraControl(self.root, config=self.config[section], general=self.config['GENERAL'], section=section,
+                             preview_wall=self.preview_wall, on_focus=self.focus_camera,
+                             on_activity=self.camera_used)
 
     def set_message(self, message):
         self.message.configure(text=message)
@@ -0,0 +1,39 @@
+"""
+Headless camera control daemon, cameras are read from the same settings.ini as the GUI.
+
+Usage:
+    python daemon.py [--settings settings.ini] [--host 127.0.0.1] [--port 8765]
+
+See lib/ControlServer.py for the HTTP and WebSocket API.
+"""
+import argparse
+import asyncio
+import logging
+from lib.ControlServer import ControlServer
+from lib.Settings import Settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Control PTZ cameras over a local HTTP and WebSocket API')
+    parser.add_argument('--settings', help='settings.ini to load, defaults to the GUI settings')
+    parser.add_argument('--host', help='address to listen on, defaults to daemon_host or 127.0.0.1')
+    parser.add_argument('--port', type=int, help='port to listen on, defaults to daemon_port or 8765')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    settings = Settings(args.settings)
+    settings.load()
+    general = settings.general
+    host = args.host or ('127.0.0.1' if 'daemon_host' not in general else general['daemon_host'])
+    port = args.port or (8765 if 'daemon_port' not in general else int(general['daemon_port']))
+    workers = 8 if 'startup_workers' not in general else int(general['startup_workers'])
+
+    server = ControlServer(settings, host=host, port=port, workers=workers)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
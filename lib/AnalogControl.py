@@ -0,0 +1,69 @@
+import time
+
+# How far past the middle of a step the stick has to go before the level changes, stops noise on a step boundary
+# from sending a command every sample
+HYSTERESIS = 0.25
+
+
+class AnalogControl:
+    """
+    Turns stick positions, sampled as often as the input device likes, into as few velocity commands as possible.
+
+    Each axis gets a dead zone and is quantised to steps levels in each direction. A command is only sent when the
+    quantised velocity changes and at most rate times a second, a change held back by the rate limit goes out with
+    a later sample so update() must keep being called while the stick is held. Centring the stick always stops the
+    camera straight away.
+    """
+
+    def __init__(self, camera, deadzone=0.1, steps=8, rate=10):
+        self.camera = camera
+        self.deadzone = min(max(deadzone, 0), 0.9)
+        self.steps = max(1, steps)
+        self.interval = 1 / rate if rate > 0 else 0
+        self.levels = (0, 0, 0)
+        self.last_time = 0
+        self.samples = 0
+        self.commands = 0
+
+    def stats(self):
+        return {'samples': self.samples, 'commands': self.commands, 'suppressed': self.samples - self.commands}
+
+    def level(self, value, previous):
+        magnitude = abs(value)
+        if magnitude <= self.deadzone:
+            return 0
+        scaled = min(1, (magnitude - self.deadzone) / (1 - self.deadzone)) * self.steps
+        scaled = scaled if value > 0 else -scaled
+        if previous and (scaled > 0) == (previous > 0) and abs(scaled - previous) < 0.5 + HYSTERESIS:
+            return previous
+        # Just past the dead zone is the slowest speed rather than nothing
+        level = max(1, round(abs(scaled)))
+        return level if value > 0 else -level
+
+    def update(self, x, y, z):
+        """x, y and z are stick positions from -1 to 1, returns True if a command was sent"""
+        self.samples += 1
+        if not self.camera.enabled:
+            # Sent again once the camera is ready if the stick is still held
+            self.levels = (0, 0, 0)
+            return False
+        levels = tuple(self.level(value, previous) for value, previous in zip((x, y, z), self.levels))
+        if levels == self.levels:
+            return False
+
+        now = time.monotonic()
+        if any(levels) and now - self.last_time < self.interval:
+            return False
+        self.levels = levels
+        self.last_time = now
+        self.commands += 1
+        if any(levels):
+            self.camera.set_velocity(*[level / self.steps for level in levels])
+        else:
+            self.camera.stop_move(None)
+        return True
+
+    def release(self):
+        """Stop the camera if the stick was moving it, used when the stick is handed to another camera"""
+        if any(self.levels):
+            self.update(0, 0, 0)
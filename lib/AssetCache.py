@@ -0,0 +1,62 @@
+import os
+import threading
+from fractions import Fraction
+from tkinter import PhotoImage
+from lib.pyinstaller_helper import resource_path
+
+
+class AssetCache:
+    """
+    Images from assets/ decoded once and shared by every widget that shows them.
+    Images can be pre-scaled for HiDPI screens, each scale is cached separately.
+    """
+
+    def __init__(self):
+        self.images = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def photo(self, name, scale=1):
+        with self.lock:
+            return self._photo(name, scale)
+
+    def _photo(self, name, scale):
+        key = (name, scale)
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        if scale == 1:
+            image = PhotoImage(file=resource_path(os.path.join('assets', name)))
+        else:
+            ratio = Fraction(scale).limit_denominator(4)
+            image = self._photo(name, 1)
+            if ratio.numerator > 1:
+                image = image.zoom(ratio.numerator)
+            if ratio.denominator > 1:
+                image = image.subsample(ratio.denominator)
+        self.images[key] = image
+        return image
+
+    def stats(self):
+        with self.lock:
+            resident_bytes = sum(image.width() * image.height() * 4 for image in self.images.values())
+            return {'images': len(self.images),
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'resident_bytes': resident_bytes,
+                    }
+
+    def clear(self):
+        with self.lock:
+            self.images = {}
+
+
+_shared_cache = AssetCache()
+
+
+def get_asset_cache():
+    return _shared_cache
@@ -1,114 +1,162 @@
-import os
-import time
-from math import floor
-from lib.ONVIFControl import ONVIFControl
-from lib.pyinstaller_helper import resource_path
-from tkinter import Button, PhotoImage, Label, LabelFrame
-from onvif.exceptions import ONVIFError
+from lib.AnalogControl import AnalogControl
+from lib.CommandDispatcher import CommandDispatcher
+from lib.ConnectionSupervisor import get_connection_supervisor
+from lib.AssetCache import get_asset_cache
+from lib.PreviewStream import PreviewStream
+from lib.Settings import camera_connection, status_settings
+from lib.ThumbnailCache import get_thumbnail_cache
+from tkinter import Button, Label, LabelFrame
+
+# The GENERAL keys a camera is built from, changing any other one on reload is applied without rebuilding cameras
+CAMERA_SETTINGS = ('move_speed_slow', 'move_speed_fast', 'zoom_speed_slow', 'zoom_speed_fast', 'ui_scale',
+                   'preview_wall', 'preview_height', 'preview_fps', 'connect_timeout', 'read_timeout', 'http_pool_size',
+                   'keepalive_interval', 'move_timeout', 'move_stop', 'joystick_deadzone', 'joystick_steps',
+                   'joystick_rate', 'command_queue_size', 'preset_ttl', 'max_presets', 'thumbnail_width', 'events',
+                   'event_pull_timeout', 'status_poll_interval', 'status_idle_interval', 'health_timeout', 'daemon')
 
 
 class CameraControl:
-    def __init__(self, tk_root, config, general):
+    def __init__(self, tk_root, config, general, section=None, preview_wall=None, on_focus=None, on_activity=None):
         self.root = tk_root
-        self.name = 'Camera' if 'name' not in config else config['name']
-        self.host = '' if 'host' not in config else config['host']
-        self.port = 80 if 'port' not in config else int(config['port'])
-        self.username = '' if 'username' not in config else config['username']
-        self.password = '' if 'password' not in config else config['password']
+        self.on_focus = on_focus
+        self.on_activity = on_activity
+        self.preview_wall = preview_wall
+        self.section = section
+        self.config = dict(config)
+        self.general = dict(general)
+        # Parsed the same way as the daemon's, so both connect to a camera with the same settings
+        self.connection = camera_connection(config, general)
+        self.name = self.connection['name']
+        self.host = self.connection['host']
+        self.port = self.connection['port']
+        self.preview_url = '' if 'preview' not in config else config['preview']
+        self.preview_height = 200 if 'preview_height' not in general else int(general['preview_height'])
+        # Drawn on a Tk timer, 0 or less would divide by zero there
+        self.preview_fps = 20 if 'preview_fps' not in general else max(1, int(general['preview_fps']))
         self.zoom_speed_slow = 40 if 'zoom_speed_slow' not in general else int(general['zoom_speed_slow'])
         self.zoom_speed_fast = 80 if 'zoom_speed_fast' in general else int(general['zoom_speed_fast'])
         self.move_speed_slow = 30 if 'move_speed_slow' in general else int(general['move_speed_slow'])
         self.move_speed_fast = 90 if 'move_speed_fast' not in general else int(general['move_speed_fast'])
+        self.keepalive_interval = 5 if 'keepalive_interval' not in general else float(general['keepalive_interval'])
+        self.ui_scale = 1 if 'ui_scale' not in general else float(general['ui_scale'])
+        self.button_size = round(40 * self.ui_scale)
+        self.command_queue_size = 16 if 'command_queue_size' not in general else int(general['command_queue_size'])
+        self.daemon_url = '' if 'daemon' not in general else general['daemon']
+        self.move_timeout = 0 if 'move_timeout' not in general else float(general['move_timeout'])
+        self.move_stop = 'move_stop' not in general or general['move_stop'].lower() in ('yes', 'true', 'on', '1')
+        self.joystick_deadzone = 0.1 if 'joystick_deadzone' not in general else float(general['joystick_deadzone'])
+        self.joystick_steps = 8 if 'joystick_steps' not in general else int(general['joystick_steps'])
+        self.joystick_rate = 10 if 'joystick_rate' not in general else float(general['joystick_rate'])
+        self.health_timeout = 1 if 'health_timeout' not in general else float(general['health_timeout'])
+        self.max_presets = 10 if 'max_presets' not in general else int(general['max_presets'])
+        self.thumbnail_width = 80 if 'thumbnail_width' not in general else int(general['thumbnail_width'])
+        self.thumbnail_width = round(self.thumbnail_width * self.ui_scale)
+        # Thumbnails are kept per camera rather than per section, so reordering settings.ini keeps them
+        self.thumbnail_key = f'{self.host}:{self.port}' if self.host else section or self.name
 
         self.ovnif = None
         self.enabled = False
-        self.cap = None
+        self.connected = False
+        self.closed = False
+        self.health = None
+        self.ui_queue = None
+        self.dispatcher = CommandDispatcher(self.name, max_queue=self.command_queue_size, on_error=self.command_failed,
+                                            on_idle=self.keepalive, idle_interval=self.keepalive_interval,
+                                            move_timeout=self.move_timeout)
+        self.analog = AnalogControl(self, deadzone=self.joystick_deadzone, steps=self.joystick_steps,
+                                    rate=self.joystick_rate)
+        self.preview = None
+        self.preview_photo = None
+        self.preview_pending = False
         self.preset_buttons = []
-        self.last_frame_time = time.time()
-        self.thread_running = False
+        self.preset_tokens = []
+        self.thumbnails = {}
+        self.current_preset = None
 
-        self.frame = LabelFrame(tk_root, text=self.name, background='white', padx=5, pady=5)
+        assets = get_asset_cache()
+        self.frame = LabelFrame(tk_root, text=self.name, background='white', padx=5, pady=5, highlightthickness=2,
+                                highlightbackground='white')
 
-        self.up_photo_fast = PhotoImage(file=resource_path(os.path.join('assets', 'up-fast.png')))
-        self.up_button_fast = Button(self.frame, image=self.up_photo_fast, height=40, width=40, state="disabled",
-                                     border=0, background='white')
+        self.up_photo_fast = assets.photo('up-fast.png', self.ui_scale)
+        self.up_button_fast = Button(self.frame, image=self.up_photo_fast, height=self.button_size,
+                                     width=self.button_size, state="disabled", border=0, background='white')
         self.up_button_fast.bind("<ButtonPress>", lambda evt: self.move_up(self.move_speed_fast))
         self.up_button_fast.bind("<ButtonRelease>", self.stop_move)
         self.up_button_fast.grid(row=0, column=5, padx=0, pady=0)
 
-        self.up_photo = PhotoImage(file=resource_path(os.path.join('assets', 'up-slow.png')))
-        self.up_button = Button(self.frame, image=self.up_photo, height=40, width=40, state="disabled", border=0,
-                                background='white')
+        self.up_photo = assets.photo('up-slow.png', self.ui_scale)
+        self.up_button = Button(self.frame, image=self.up_photo, height=self.button_size, width=self.button_size,
+                                state="disabled", border=0, background='white')
         self.up_button.bind("<ButtonPress>", lambda evt: self.move_up(self.move_speed_slow))
         self.up_button.bind("<ButtonRelease>", self.stop_move)
         self.up_button.grid(row=1, column=5, padx=0, pady=0)
 
-        self.down_photo = PhotoImage(file=resource_path(os.path.join('assets', 'down-slow.png')))
-        self.down_button = Button(self.frame, image=self.down_photo, height=40, width=40, state="disabled", border=0,
-                                  background='white')
+        self.down_photo = assets.photo('down-slow.png', self.ui_scale)
+        self.down_button = Button(self.frame, image=self.down_photo, height=self.button_size, width=self.button_size,
+                                  state="disabled", border=0, background='white')
         self.down_button.bind("<ButtonPress>", lambda evt: self.move_down(self.move_speed_slow))
         self.down_button.bind("<ButtonRelease>", self.stop_move)
         self.down_button.grid(row=3, column=5, padx=0, pady=0)
 
-        self.down_photo_fast = PhotoImage(file=resource_path(os.path.join('assets', 'down-fast.png')))
-        self.down_button_fast = Button(self.frame, image=self.down_photo_fast, height=40, width=40, state="disabled",
-                                       border=0, background='white')
+        self.down_photo_fast = assets.photo('down-fast.png', self.ui_scale)
+        self.down_button_fast = Button(self.frame, image=self.down_photo_fast, height=self.button_size,
+                                       width=self.button_size, state="disabled", border=0, background='white')
         self.down_button_fast.bind("<ButtonPress>", lambda evt: self.move_down(self.move_speed_fast))
         self.down_button_fast.bind("<ButtonRelease>", self.stop_move)
         self.down_button_fast.grid(row=4, column=5, padx=0, pady=0)
 
-        self.left_photo_fast = PhotoImage(file=resource_path(os.path.join('assets', 'left-fast.png')))
-        self.left_button_fast = Button(self.frame, image=self.left_photo_fast, height=40, width=40, state="disabled",
-                                       border=0, background='white')
+        self.left_photo_fast = assets.photo('left-fast.png', self.ui_scale)
+        self.left_button_fast = Button(self.frame, image=self.left_photo_fast, height=self.button_size,
+                                       width=self.button_size, state="disabled", border=0, background='white')
         self.left_button_fast.bind("<ButtonPress>", lambda evt: self.move_left(self.move_speed_fast))
         self.left_button_fast.bind("<ButtonRelease>", self.stop_move)
         self.left_button_fast.grid(row=2, column=2, padx=0, pady=0)
 
-        self.left_photo = PhotoImage(file=resource_path(os.path.join('assets', 'left-slow.png')))
-        self.left_button = Button(self.frame, image=self.left_photo, height=40, width=40, state="disabled", border=0,
-                                  background='white')
+        self.left_photo = assets.photo('left-slow.png', self.ui_scale)
+        self.left_button = Button(self.frame, image=self.left_photo, height=self.button_size, width=self.button_size,
+                                  state="disabled", border=0, background='white')
         self.left_button.bind("<ButtonPress>", lambda evt: self.move_left(self.move_speed_slow))
         self.left_button.bind("<ButtonRelease>", self.stop_move)
         self.left_button.grid(row=2, column=3, padx=0, pady=0)
 
-        self.right_photo = PhotoImage(file=resource_path(os.path.join('assets', 'right-slow.png')))
-        self.right_button = Button(self.frame, image=self.right_photo, height=40, width=40, state="disabled", border=0,
-                                   background='white')
+        self.right_photo = assets.photo('right-slow.png', self.ui_scale)
+        self.right_button = Button(self.frame, image=self.right_photo, height=self.button_size, width=self.button_size,
+                                   state="disabled", border=0, background='white')
         self.right_button.bind("<ButtonPress>", lambda evt: self.move_right(self.move_speed_slow))
         self.right_button.bind("<ButtonRelease>", self.stop_move)
         self.right_button.grid(row=2, column=6, padx=0, pady=0)
 
-        self.right_photo_fast = PhotoImage(file=resource_path(os.path.join('assets', 'right-fast.png')))
-        self.right_button_fast = Button(self.frame, image=self.right_photo_fast, height=40, width=40, state="disabled",
-                                        border=0, background='white')
+        self.right_photo_fast = assets.photo('right-fast.png', self.ui_scale)
+        self.right_button_fast = Button(self.frame, image=self.right_photo_fast, height=self.button_size,
+                                        width=self.button_size, state="disabled", border=0, background='white')
         self.right_button_fast.bind("<ButtonPress>", lambda evt: self.move_right(self.move_speed_fast))
         self.right_button_fast.bind("<ButtonRelease>", self.stop_move)
         self.right_button_fast.grid(row=2, column=7, padx=0, pady=0)
 
-        self.plus_photo_fast = PhotoImage(file=resource_path(os.path.join('assets', 'plus-fast.png')))
-        self.zoom_in_button_fast = Button(self.frame, image=self.plus_photo_fast, height=40, width=40, state="disabled",
-                                          border=0, background='white')
+        self.plus_photo_fast = assets.photo('plus-fast.png', self.ui_scale)
+        self.zoom_in_button_fast = Button(self.frame, image=self.plus_photo_fast, height=self.button_size,
+                                          width=self.button_size, state="disabled", border=0, background='white')
         self.zoom_in_button_fast.bind("<ButtonPress>", lambda evt: self.zoom_in(self.zoom_speed_fast))
         self.zoom_in_button_fast.bind("<ButtonRelease>", self.stop_move)
         self.zoom_in_button_fast.grid(row=0, column=1, padx=0, pady=0)
 
-        self.plus_photo = PhotoImage(file=resource_path(os.path.join('assets', 'plus.png')))
-        self.zoom_in_button = Button(self.frame, image=self.plus_photo, height=40, width=40, state="disabled", border=0,
-                                     background='white')
+        self.plus_photo = assets.photo('plus.png', self.ui_scale)
+        self.zoom_in_button = Button(self.frame, image=self.plus_photo, height=self.button_size, width=self.button_size,
+                                     state="disabled", border=0, background='white')
         self.zoom_in_button.bind("<ButtonPress>", lambda evt: self.zoom_in(self.zoom_speed_slow))
         self.zoom_in_button.bind("<ButtonRelease>", self.stop_move)
         self.zoom_in_button.grid(row=1, column=1, padx=0, pady=0)
 
-        self.minus_photo = PhotoImage(file=resource_path(os.path.join('assets', 'minus.png')))
-        self.zoom_out_button = Button(self.frame, image=self.minus_photo, height=40, width=40, state="disabled",
-                                      border=0, background='white')
+        self.minus_photo = assets.photo('minus.png', self.ui_scale)
+        self.zoom_out_button = Button(self.frame, image=self.minus_photo, height=self.button_size,
+                                      width=self.button_size, state="disabled", border=0, background='white')
         self.zoom_out_button.bind("<ButtonPress>", lambda evt: self.zoom_out(self.zoom_speed_slow))
         self.zoom_out_button.bind("<ButtonRelease>", self.stop_move)
         self.zoom_out_button.grid(row=3, column=1, padx=0, pady=0)
 
-        self.minus_photo_fast = PhotoImage(file=resource_path(os.path.join('assets', 'minus-fast.png')))
-        self.zoom_out_button_fast = Button(self.frame, image=self.minus_photo_fast, height=40, width=40,
-                                           state="disabled", border=0, background='white')
+        self.minus_photo_fast = assets.photo('minus-fast.png', self.ui_scale)
+        self.zoom_out_button_fast = Button(self.frame, image=self.minus_photo_fast, height=self.button_size,
+                                           width=self.button_size, state="disabled", border=0, background='white')
         self.zoom_out_button_fast.bind("<ButtonPress>", lambda evt: self.zoom_out(self.zoom_speed_fast))
         self.zoom_out_button_fast.bind("<ButtonRelease>", self.stop_move)
         self.zoom_out_button_fast.grid(row=4, column=1, padx=0, pady=0)
@@ -116,83 +164,348 @@ class CameraControl:
         self.message = Label(self.frame, text="", anchor="center", background='white')
         self.message.grid(row=5, column=2, columnspan=8)
 
+        self.preview_label = None
+        if self.preview_url:
+            self.preview_label = Label(self.frame, text="", anchor="center", background='white')
+            self.preview_label.grid(row=0, column=0, rowspan=5, padx=5)
+
     def start_camera(self):
+        self.start_preview()
         try:
             self.set_message('Connecting to camera')
-            self.connect_to_camera()
-            self.setup_presets()
-            self.enable_all()
-            self.set_message('')
-            self.enabled = True
+            presets = self.connect()
+            self.camera_started(presets)
             return True
-        except ONVIFError:
-            self.set_message(f'Error: Cannot connect to {self.name}')
-            return False
         except Exception as err:
-            self.set_message(f'Error: {err}')
+            self.camera_failed(err)
             return False
 
-    def setup_presets(self):
+    def start_camera_async(self, executor, ui_queue):
+        """
+        Run the ONVIF handshake on the executor and finish on the Tk thread, so each camera is enabled as soon as
+        its own connection completes.
+        """
+        self.ui_queue = ui_queue
+        self.start_preview()
+        self.set_message('Connecting to camera')
+        future = executor.submit(self.connect)
+        future.add_done_callback(lambda f: ui_queue.post(self.start_camera_done, f))
+        return future
+
+    def start_camera_done(self, future):
+        if self.closed:
+            # Removed while connecting, release the connection the worker made
+            if self.ovnif:
+                self.ovnif.close()
+            return
+        try:
+            self.camera_started(future.result())
+        except Exception as err:
+            self.camera_failed(err)
+
+    def connect(self):
+        # Network only, safe to run off the Tk thread
+        self.connect_to_camera()
+        return self.ovnif.preset_list()
+
+    def camera_started(self, presets):
+        if self.closed:
+            return
+        self.setup_presets(presets)
+        self.enable_all()
+        self.set_message('')
+        self.enabled = True
+        self.connected = True
+        if self.health is None:
+            self.health = get_connection_supervisor().add(self.name, self.probe, self.reconnect, self.health_changed)
+        self.ovnif.add_preset_listener(self.presets_changed)
+        self.ovnif.status.add_listener(self.status_changed)
+        self.ovnif.start_events(**status_settings(self.general))
+        if self.ovnif.from_cache:
+            self.dispatcher.submit(self.revalidate)
+
+    def revalidate(self):
+        # Runs on the dispatcher thread, ahead of any moves queued after it
+        if self.ovnif.revalidate():
+            self.ovnif.preset_list(refresh=True)
+
+    def presets_changed(self, presets):
+        # Called from whichever thread changed the presets
+        if self.ui_queue:
+            self.ui_queue.post(self.setup_presets, presets)
+
+    def status_changed(self, status):
+        # Called from the dispatcher or the camera's event thread
+        if self.ui_queue and status['preset'] != self.current_preset:
+            self.ui_queue.post(self.show_preset, status['preset'])
+
+    def show_preset(self, token):
+        # The preset the camera is at is shown pressed in
+        self.current_preset = token
+        for preset_button, preset_token in zip(self.preset_buttons, self.preset_tokens):
+            preset_button.configure(relief='sunken' if token is not None and preset_token == token else 'raised')
+
+    def camera_failed(self, err):
+        from onvif.exceptions import ONVIFError
+        if isinstance(err, ONVIFError):
+            self.set_message(f'Error: Cannot connect to {self.name}')
+        else:
+            self.set_message(f'Error: {err}')
+        if self.health is None and not self.closed and self.ui_queue:
+            # Keep trying in the background
+            self.health = get_connection_supervisor().add(self.name, self.probe, self.reconnect, self.health_changed,
+                                                          up=False)
+
+    def probe(self):
+        # Supervisor thread
+        self.ovnif.probe(self.health_timeout)
+
+    def reconnect(self):
+        # Supervisor thread, the camera is down or never connected
+        if self.connected:
+            self.ovnif.probe(self.health_timeout)
+            return
+        if self.ovnif:
+            self.ovnif.close()
+        presets = self.connect()
+        self.ui_queue.post(self.camera_started, presets)
+
+    def health_changed(self, up, error):
+        # Supervisor thread
+        if self.ui_queue:
+            self.ui_queue.post(self.camera_up if up else self.camera_down, error)
+
+    def camera_down(self, error):
+        if self.closed or not self.connected:
+            return
+        self.enabled = False
+        self.dispatcher.cancel_moves()
+        self.disable_all()
+        self.set_message(f'Error: {self.name} is not responding, reconnecting')
+
+    def camera_up(self, error):
+        if self.closed or not self.connected:
+            return
+        self.enable_all()
+        self.set_message('')
+
+    def start_preview(self):
+        if not self.preview_url or self.preview:
+            return
+        if self.preview_wall:
+            self.preview = self.preview_wall.add(self.preview_url, height=self.preview_height)
+        else:
+            self.preview = PreviewStream(self.preview_url, height=self.preview_height)
+        self.preview.start()
+        self.root.after(int(1000 / self.preview_fps), self.preview_tick)
+
+    def preview_tick(self):
+        if self.closed:
+            return
+        # Only draw when Tk is idle, and never queue more than one draw
+        if not self.preview_pending:
+            self.preview_pending = True
+            self.root.after_idle(self.show_preview)
+        self.root.after(int(1000 / self.preview_fps), self.preview_tick)
+
+    def show_preview(self):
+        self.preview_pending = False
+        if self.closed:
+            return
+        frame_id, image, frame_time = self.preview.latest()
+        if image is None:
+            if self.preview.error:
+                self.preview_label.configure(text=self.preview.error)
+            return
+
+        from PIL import ImageTk
+        if self.preview_photo and (self.preview_photo.width(), self.preview_photo.height()) == image.size:
+            self.preview_photo.paste(image)
+        else:
+            self.preview_photo = ImageTk.PhotoImage(image=image)
+            self.preview_label.configure(image=self.preview_photo, text='')
+
+    def focus_preview(self):
+        # On the preview wall the camera being driven gets the full frame rate
+        if self.preview:
+            self.preview.focus()
+        if self.on_focus:
+            self.on_focus(self)
+        self.touched()
+
+    def touched(self):
+        # The operator is using this camera, its tours hold off
+        if self.on_activity:
+            self.on_activity(self)
+
+    def set_focused(self, focused):
+        # The camera the joystick drives is outlined
+        self.frame.configure(highlightbackground='#0063b1' if focused else 'white')
+
+    def command_failed(self, err):
+        # Called from the dispatcher thread
+        get_connection_supervisor().check_now(self.health)
+        if self.ui_queue:
+            self.ui_queue.post(self.set_message, f'Error: {err}')
+
+    def setup_presets(self, presets=None):
         start_column = 8  # first column to start drawing the preset buttons
         presets_per_column = 5  # number of presets per column
 
-        presets = self.ovnif.preset_list()
-        self.preset_buttons = []
-        i = 0
-        max_presets = 10
-        for i in range(max_presets):
-            preset = presets[i]
-            column = floor(i / presets_per_column)
-            row = i % presets_per_column
-            preset_button = Button(self.frame, text=preset['Name'],
-                                   command=lambda id=i: self.preset_click(id))
-            preset_button.grid(row=row, column=start_column + column, padx=5, pady=5, sticky="ew")
-            self.preset_buttons.append(preset_button)
-            i += 1
+        if presets is None:
+            presets = self.ovnif.preset_list()
+        presets = presets[:self.max_presets]
+        # Buttons are kept and only changed where their preset did, the rest are in the preset window
+        for preset_button in self.preset_buttons[len(presets):]:
+            preset_button.destroy()
+        del self.preset_buttons[len(presets):]
+        tokens = self.preset_tokens
+        self.preset_tokens = [preset['token'] for preset in presets]
+        for i, preset in enumerate(presets):
+            created = i == len(self.preset_buttons)
+            if created:
+                column, row = divmod(i, presets_per_column)
+                preset_button = Button(self.frame, state="normal" if self.enabled else "disabled")
+                preset_button.grid(row=row, column=start_column + column, padx=5, pady=5, sticky="ew")
+                self.preset_buttons.append(preset_button)
+            preset_button = self.preset_buttons[i]
+            if created or tokens[i] != preset['token']:
+                preset_button.configure(command=lambda token=preset['token']: self.preset_click(token))
+                self.show_thumbnail(preset_button, preset['token'])
+            name = preset['Name'] or preset['token']
+            if preset_button.cget('text') != name:
+                preset_button.configure(text=name)
+        self.show_preset(self.current_preset)
+        self.load_thumbnails()
+
+    def load_thumbnails(self):
+        # Read from the thumbnail cache in the background, cameras are never asked for these
+        missing = [token for token in self.preset_tokens if token not in self.thumbnails]
+        if self.thumbnail_width and missing and self.ui_queue:
+            get_thumbnail_cache().fetch(self.thumbnail_key, missing, self.thumbnail_width,
+                                        lambda images: self.ui_queue.post(self.thumbnails_loaded, images))
+
+    def thumbnails_loaded(self, images):
+        if self.closed or not images:
+            return
+        from PIL import ImageTk
+        for token, image in images.items():
+            self.thumbnails[token] = ImageTk.PhotoImage(image=image)
+        for preset_button, token in zip(self.preset_buttons, self.preset_tokens):
+            if token in images:
+                self.show_thumbnail(preset_button, token)
+
+    def show_thumbnail(self, preset_button, token):
+        photo = self.thumbnails.get(token)
+        preset_button.configure(image=photo or '', compound='top' if photo else 'none')
+
+    def capture_thumbnail(self, token):
+        """Take the preset's thumbnail from what the camera sees now, e.g. just after saving it"""
+        if self.thumbnail_width and self.enabled and self.ui_queue:
+            get_thumbnail_cache().capture(self.thumbnail_key, token, self.ovnif.snapshot, self.thumbnail_width,
+                                          lambda *result: self.ui_queue.post(self.thumbnail_captured, *result))
+
+    def thumbnail_captured(self, token, image, err):
+        if self.closed:
+            return
+        if err is not None:
+            self.set_message(f'Error: no snapshot from {self.name}: {err}')
+            return
+        self.thumbnails.pop(token, None)
+        self.thumbnails_loaded({token: image})
 
     def preset_click(self, preset_id):
-        self.ovnif.preset_goto(preset_id)
+        self.touched()
+        self.dispatcher.submit(self.ovnif.preset_goto, preset_id)
+
+    def tour_goto(self, token, speed=None):
+        # Tour scheduler thread, only queues the move
+        if not self.enabled:
+            raise RuntimeError(f'{self.name} is not connected')
+        self.dispatcher.submit(self.ovnif.preset_goto, token, speed)
 
     def preset_add(self, preset_name, preset_id):
-        self.ovnif.preset_add(preset_name, preset_id)
+        return self.ovnif.preset_add(preset_name, preset_id)
 
     def preset_remove(self, preset_id):
         self.ovnif.preset_remove(preset_id)
+        get_thumbnail_cache().remove(self.thumbnail_key, preset_id)
+        self.thumbnails.pop(preset_id, None)
 
     def get_frame(self):
         return self.frame
 
     def connect_to_camera(self):
-        self.ovnif = ONVIFControl(host=self.host, port=self.port, username=self.username, password=self.password)
+        # Imported here, on the startup worker, so the window shows before zeep and requests have loaded
+        if self.daemon_url:
+            from lib.DaemonClient import DaemonControl
+            # The daemon owns the camera connection, the GUI is one of its clients
+            self.ovnif = DaemonControl(self.daemon_url, self.section or self.name, name=self.name,
+                                       timeout=self.connection['timeout'],
+                                       read_timeout=self.connection['read_timeout'],
+                                       preset_ttl=self.connection['preset_ttl'])
+            self.ovnif.setup()
+            return
+        from lib.ONVIFControl import ONVIFControl
+        self.ovnif = ONVIFControl(**self.connection)
         self.ovnif.setup()
 
+    def keepalive(self):
+        # Called from the dispatcher thread when no command has been sent for a while
+        if self.enabled:
+            self.ovnif.keepalive()
+
     def move_left(self, speed):
+        self.focus_preview()
         if self.enabled:
-            self.ovnif.move(-1 * round(speed / 100, 1), 0)
+            self.dispatcher.move(self.ovnif.move, -1 * round(speed / 100, 1), 0, self.move_timeout)
 
     def move_right(self, speed):
+        self.focus_preview()
         if self.enabled:
-            self.ovnif.move(round(speed / 100, 1), 0)
+            self.dispatcher.move(self.ovnif.move, round(speed / 100, 1), 0, self.move_timeout)
 
     def move_up(self, speed):
+        self.focus_preview()
         if self.enabled:
-            self.ovnif.move(0, round(speed / 100, 1))
+            self.dispatcher.move(self.ovnif.move, 0, round(speed / 100, 1), self.move_timeout)
 
     def move_down(self, speed):
+        self.focus_preview()
         if self.enabled:
-            self.ovnif.move(0, -1 * round(speed / 100, 1))
+            self.dispatcher.move(self.ovnif.move, 0, -1 * round(speed / 100, 1), self.move_timeout)
 
-    def stop_move(self, speed):
+    def set_velocity(self, x, y, z):
+        """Pan, tilt and zoom at -1 to 1 of the camera's own velocity range on each axis"""
+        self.focus_preview()
         if self.enabled:
-            self.ovnif.stop()
+            self.dispatcher.move(self.ovnif.velocity, self.scale(x, self.ovnif.XMIN, self.ovnif.XMAX),
+                                 self.scale(y, self.ovnif.YMIN, self.ovnif.YMAX),
+                                 self.scale(z, self.ovnif.ZMIN, self.ovnif.ZMAX), self.move_timeout)
+
+    @staticmethod
+    def scale(value, low, high):
+        return value * high if value > 0 else -value * low
+
+    def stop_move(self, speed):
+        if not self.enabled:
+            return
+        self.touched()
+        if self.move_stop or not self.move_timeout:
+            self.dispatcher.stop(self.ovnif.stop)
+        else:
+            # Bounded moves stop by themselves once they are no longer renewed
+            self.dispatcher.cancel_moves()
 
     def zoom_in(self, speed):
+        self.focus_preview()
         if self.enabled:
-            self.ovnif.zoom(round(speed / 100, 1))
+            self.dispatcher.move(self.ovnif.zoom, round(speed / 100, 1), self.move_timeout)
 
     def zoom_out(self, speed):
+        self.focus_preview()
         if self.enabled:
-            self.ovnif.zoom(round(-1 * speed / 100, 1))
+            self.dispatcher.move(self.ovnif.zoom, round(-1 * speed / 100, 1), self.move_timeout)
 
     def enable_all(self):
         self.up_button.configure(state="normal")
@@ -207,10 +520,45 @@ class CameraControl:
         self.zoom_in_button_fast.configure(state="normal")
         self.zoom_out_button.configure(state="normal")
         self.zoom_out_button_fast.configure(state="normal")
+        for preset_button in self.preset_buttons:
+            preset_button.configure(state="normal")
         self.enabled = True
 
+    def disable_all(self):
+        for button in (self.up_button, self.up_button_fast, self.down_button, self.down_button_fast, self.left_button,
+                       self.left_button_fast, self.right_button, self.right_button_fast, self.zoom_in_button,
+                       self.zoom_in_button_fast, self.zoom_out_button, self.zoom_out_button_fast,
+                       *self.preset_buttons):
+            button.configure(state="disabled")
+        self.enabled = False
+
     def set_message(self, message):
         self.message.configure(text=message)
         self.root.update()
+
+    def is_configured(self, config, general):
+        return self.config == dict(config) and self.camera_settings(self.general) == self.camera_settings(general)
+
+    @staticmethod
+    def camera_settings(general):
+        return {key: general[key] for key in CAMERA_SETTINGS if key in general}
+
     def close(self):
-        pass
\ No newline at end of file
+        self.closed = True
+        self.enabled = False
+        get_connection_supervisor().remove(self.health)
+        self.dispatcher.close()
+        if self.preview:
+            self.preview.stop()
+        if self.ovnif:
+            self.ovnif.remove_preset_listener(self.presets_changed)
+            self.ovnif.status.remove_listener(self.status_changed)
+            self.ovnif.close()
+
+    def destroy(self):
+        # Destroying the frame destroys every widget in it, the images are shared through the asset cache
+        self.close()
+        self.frame.destroy()
+        self.preset_buttons = []
+        self.thumbnails = {}
+        self.preview_photo = None
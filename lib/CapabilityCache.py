@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import time
+from lib.pyinstaller_helper import user_path
+
+
+class CapabilityCache:
+    """
+    Camera service addresses, profile tokens and velocity ranges saved between runs so a camera can be controlled
+    before it has answered any setup calls. Entries are keyed by host and port and carry the device serial and
+    firmware, which are compared against the camera to decide if the entry is still valid.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.entries = None
+
+    @staticmethod
+    def key(host, port):
+        return f'{host}:{port}'
+
+    def load(self):
+        if self.entries is not None:
+            return
+        try:
+            with open(self.filename, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, host, port):
+        with self.lock:
+            self.load()
+            return self.entries.get(self.key(host, port))
+
+    def put(self, host, port, entry):
+        with self.lock:
+            self.load()
+            self.entries[self.key(host, port)] = dict(entry, saved=int(time.time()))
+            self.save()
+
+    def remove(self, host, port):
+        with self.lock:
+            self.load()
+            if self.entries.pop(self.key(host, port), None) is not None:
+                self.save()
+
+    def save(self):
+        temp_filename = f'{self.filename}.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump(self.entries, f, separators=(',', ':'))
+        os.replace(temp_filename, self.filename)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_capability_cache():
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = CapabilityCache(user_path('Camera Control', 'capabilities.json'))
+        return _shared_cache
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from collections import deque
+from lib.LatencyStats import QUEUE, get_latency_stats
+
+logger = logging.getLogger(__name__)
+
+MOVE = 'move'
+STOP = 'stop'
+COMMAND = 'command'
+RENEW = 'renew'
+
+# Renewals are sent at least this long, or three round trips, before the camera's move timeout runs out
+RENEW_MARGIN = 0.15
+
+
+class CommandDispatcher:
+    """
+    Sends camera commands from a background worker so the Tk loop never waits on a SOAP round trip.
+
+    Moves are coalesced, only the most recent velocity waiting in the queue is sent. A stop removes any pending
+    moves and jumps to the front of the queue. Other commands are sent in order. When the queue is full new
+    commands are dropped and counted.
+
+    If on_idle is given it is called from the worker after idle_interval seconds without a command, which is used to
+    keep the camera's HTTP connection open between moves.
+
+    The time each command waits in the queue is recorded in latency_stats under the dispatcher's name.
+
+    With a move_timeout, moves are bounded: the move function is expected to send them with that ONVIF Timeout and
+    the dispatcher sends the latest move again shortly before it runs out, for as long as no stop or newer move
+    arrives. A lost stop then costs at most move_timeout seconds of travel.
+    """
+
+    def __init__(self, name, max_queue=16, on_error=None, on_idle=None, idle_interval=None, latency_stats=None,
+                 move_timeout=None):
+        self.name = name
+        self.latency_stats = latency_stats or get_latency_stats()
+        self.max_queue = max_queue
+        self.on_error = on_error
+        self.on_idle = on_idle
+        self.idle_interval = idle_interval if on_idle and idle_interval else None
+        self.move_timeout = move_timeout or None
+        # (func, args, due) of the move to send again, generation changes whenever moves are superseded
+        self.renewal = None
+        self.generation = 0
+        self.move_rtt = 0
+        self.last_activity = time.monotonic()
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.sending = False
+        self.submitted = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.renewed = 0
+        self.thread = threading.Thread(target=self.run, name=f'dispatcher-{name}', daemon=True)
+        self.thread.start()
+
+    @property
+    def queue_depth(self):
+        with self.condition:
+            return len(self.pending)
+
+    def stats(self):
+        with self.condition:
+            return {'queue_depth': len(self.pending),
+                    'submitted': self.submitted,
+                    'sent': self.sent,
+                    'coalesced': self.coalesced,
+                    'dropped': self.dropped,
+                    'errors': self.errors,
+                    'renewed': self.renewed,
+                    }
+
+    def move(self, func, *args):
+        with self.condition:
+            self.submitted += 1
+            self.renewal = None
+            self.generation += 1
+            if self.pending and self.pending[-1][0] == MOVE:
+                # A newer velocity supersedes one that hasn't been sent yet
+                self.pending[-1] = (MOVE, func, args, time.perf_counter())
+                self.coalesced += 1
+            else:
+                self._append((MOVE, func, args, time.perf_counter()))
+            self.condition.notify_all()
+
+    def stop(self, func, *args):
+        with self.condition:
+            self.submitted += 1
+            self._cancel_moves()
+            if not self.pending or self.pending[0][0] != STOP:
+                self.pending.appendleft((STOP, func, args, time.perf_counter()))
+            else:
+                self.coalesced += 1
+            self.condition.notify_all()
+
+    def cancel_moves(self):
+        """
+        Drop waiting moves and stop renewing the last one, a bounded move then ends when its timeout runs out.
+        No move is sent after this returns, one already being sent still reaches the camera.
+        """
+        with self.condition:
+            self._cancel_moves()
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Drop waiting moves and wait up to timeout seconds for the commands already queued or being sent, so that a
+        command sent to the camera directly afterwards reaches it last. Returns False if they didn't finish in time.
+        """
+        with self.condition:
+            self._cancel_moves()
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: not self.running or not (self.pending or self.sending), timeout)
+
+    def _cancel_moves(self):
+        self.renewal = None
+        self.generation += 1
+        moves = [command for command in self.pending if command[0] == MOVE]
+        self.coalesced += len(moves)
+        remaining = [command for command in self.pending if command[0] != MOVE]
+        self.pending.clear()
+        self.pending.extend(remaining)
+
+    def renew_interval(self):
+        # Leave room for a renewal that takes a few times the usual round trip
+        margin = max(RENEW_MARGIN, 3 * self.move_rtt)
+        return max(self.move_timeout - margin, self.move_timeout / 4)
+
+    def next_wakeup(self, now):
+        waits = []
+        if self.idle_interval:
+            waits.append(self.idle_interval - (now - self.last_activity))
+        if self.renewal:
+            waits.append(self.renewal[2] - now)
+        return max(0, min(waits)) if waits else None
+
+    def submit(self, func, *args):
+        with self.condition:
+            self.submitted += 1
+            self._append((COMMAND, func, args, time.perf_counter()))
+            self.condition.notify_all()
+
+    def _append(self, command):
+        if len(self.pending) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.pending.append(command)
+
+    def run(self):
+        while True:
+            with self.condition:
+                # Back from sending, flush() may be waiting for this
+                self.sending = False
+                self.condition.notify_all()
+                while self.running and not self.pending:
+                    now = time.monotonic()
+                    if self.renewal and now >= self.renewal[2]:
+                        break
+                    if self.idle_interval and now - self.last_activity >= self.idle_interval:
+                        break
+                    self.condition.wait(self.next_wakeup(now))
+                if not self.running:
+                    return
+                generation = self.generation
+                if self.pending:
+                    kind, func, args, queued = self.pending.popleft()
+                elif self.renewal and time.monotonic() >= self.renewal[2]:
+                    func, args, due = self.renewal
+                    self.renewal = None
+                    # Recorded as how late the renewal went out
+                    kind, queued = RENEW, time.perf_counter() - (time.monotonic() - due)
+                else:
+                    self.last_activity = time.monotonic()
+                    kind, func, args, queued = None, self.on_idle, (), None
+                self.sending = True
+
+            if kind is None:
+                try:
+                    func()
+                except Exception:
+                    logger.debug(f'{self.name}: idle callback failed', exc_info=True)
+                continue
+
+            operation = getattr(func, '__name__', kind) if kind == COMMAND else kind
+            self.latency_stats.record(self.name, QUEUE, operation, time.perf_counter() - queued)
+            try:
+                start = time.monotonic()
+                func(*args)
+                with self.condition:
+                    self.sent += 1
+                    self.last_activity = time.monotonic()
+                    if kind == RENEW:
+                        self.renewed += 1
+                    if kind in (MOVE, RENEW) and self.move_timeout:
+                        elapsed = self.last_activity - start
+                        self.move_rtt = 0.8 * self.move_rtt + 0.2 * elapsed if self.move_rtt else elapsed
+                        self.schedule_renewal(func, args, generation, start)
+            except Exception as err:
+                with self.condition:
+                    self.errors += 1
+                    if kind in (MOVE, RENEW) and self.move_timeout:
+                        # Still held, try again since the camera has probably stopped by now
+                        self.schedule_renewal(func, args, generation, start)
+                if self.on_error:
+                    self.on_error(err)
+                else:
+                    logger.exception(f'{self.name}: {kind} failed')
+
+    def schedule_renewal(self, func, args, generation, start):
+        if generation != self.generation:
+            # Stopped or superseded while this move was being sent
+            return
+        self.renewal = (func, args, start + self.renew_interval())
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.pending.clear()
+            self.condition.notify_all()
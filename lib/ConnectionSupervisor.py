@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Supervised:
+    """One camera watched by the ConnectionSupervisor"""
+
+    def __init__(self, name, probe, recover, on_change, up):
+        self.name = name
+        self.probe = probe
+        self.recover = recover
+        self.on_change = on_change
+        self.up = up
+        self.failures = 0
+        self.attempts = 0
+        self.due = 0
+        self.busy = False
+        self.removed = False
+        self.error = None
+        self.checks = 0
+
+    def stats(self):
+        return {'up': self.up, 'failures': self.failures, 'attempts': self.attempts, 'checks': self.checks,
+                'error': str(self.error) if self.error else None}
+
+
+class ConnectionSupervisor:
+    """
+    Watches every camera connection in the process from one scheduling thread. A camera that is up is probed every
+    interval seconds, probe() should be a single cheap request with a tight timeout. A failed probe is retried
+    after backoff seconds and the camera is reported down once failures probes in a row have failed, so one lost
+    packet doesn't disable a camera mid-show.
+
+    While a camera is down recover() is tried with exponential backoff from backoff up to max_backoff seconds. The
+    delays are jittered so cameras that dropped together, when a switch restarts, don't all retry in step.
+    on_change(up, error) is called on every change from a worker thread. Probes and recoveries run on worker
+    threads, the scheduling thread never waits on a camera.
+    """
+
+    def __init__(self, interval=5, failures=2, backoff=1, max_backoff=60, workers=4):
+        self.interval = interval
+        self.failures = max(1, failures)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.workers = workers
+        self.condition = threading.Condition()
+        self.heap = []
+        self.watched = []
+        self.counter = itertools.count()
+        self.random = random.Random()
+        self.executor = None
+        self.thread = None
+
+    def configure(self, interval=5, failures=2, backoff=1, max_backoff=60):
+        with self.condition:
+            self.interval = interval
+            self.failures = max(1, failures)
+            self.backoff = backoff
+            self.max_backoff = max_backoff
+            self.condition.notify()
+
+    def add(self, name, probe, recover, on_change, up=True):
+        """Start watching a camera, returns the handle for remove() and check_now()"""
+        supervised = Supervised(name, probe, recover, on_change, up)
+        with self.condition:
+            if self.thread is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='supervisor')
+                self.thread = threading.Thread(target=self.run, name='supervisor', daemon=True)
+                self.thread.start()
+            self.watched.append(supervised)
+            self.schedule(supervised, self.jittered(self.interval) if up else self.retry_delay(0))
+        return supervised
+
+    def remove(self, supervised):
+        if supervised is not None:
+            with self.condition:
+                supervised.removed = True
+                if supervised in self.watched:
+                    self.watched.remove(supervised)
+
+    def check_now(self, supervised):
+        """Probe straight away, e.g. after a command to the camera failed"""
+        if supervised is None:
+            return
+        with self.condition:
+            if not supervised.removed and not supervised.busy:
+                self.schedule(supervised, 0)
+
+    def schedule(self, supervised, delay):
+        supervised.due = time.monotonic() + delay
+        heapq.heappush(self.heap, (supervised.due, next(self.counter), supervised))
+        self.condition.notify()
+
+    def jittered(self, delay):
+        return delay * self.random.uniform(0.9, 1.1)
+
+    def retry_delay(self, attempt):
+        # Equal jitter, at least half the exponential delay
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return ceiling / 2 + self.random.uniform(0, ceiling / 2)
+
+    def stats(self):
+        with self.condition:
+            return {supervised.name: supervised.stats() for supervised in self.watched}
+
+    def run(self):
+        with self.condition:
+            while True:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                due, count, supervised = self.heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                heapq.heappop(self.heap)
+                # Entries replaced by check_now() are skipped
+                if supervised.removed or supervised.busy or due != supervised.due:
+                    continue
+                supervised.busy = True
+                self.executor.submit(self.check, supervised)
+
+    def check(self, supervised):
+        error = None
+        try:
+            if supervised.up:
+                supervised.probe()
+            else:
+                supervised.recover()
+        except Exception as err:
+            error = err
+
+        with self.condition:
+            supervised.busy = False
+            supervised.checks += 1
+            supervised.error = error
+            was_up = supervised.up
+            if error is None:
+                supervised.up = True
+                supervised.failures = 0
+                supervised.attempts = 0
+                delay = self.jittered(self.interval)
+            elif supervised.up:
+                supervised.failures += 1
+                if supervised.failures < self.failures:
+                    delay = self.backoff
+                else:
+                    supervised.up = False
+                    delay = self.retry_delay(0)
+            else:
+                supervised.attempts += 1
+                delay = self.retry_delay(supervised.attempts)
+            if supervised.removed:
+                return
+            self.schedule(supervised, delay)
+            changed = supervised.up != was_up
+
+        if changed:
+            if supervised.up:
+                logger.info(f'{supervised.name}: connection restored')
+            else:
+                logger.warning(f'{supervised.name}: connection lost: {error}')
+            supervised.on_change(supervised.up, error)
+
+
+_shared_supervisor = ConnectionSupervisor()
+
+
+def get_connection_supervisor():
+    return _shared_supervisor
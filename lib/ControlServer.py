@@ -0,0 +1,616 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+from zeep.helpers import serialize_object
+from lib.CommandDispatcher import CommandDispatcher
+from lib.ConnectionSupervisor import get_connection_supervisor
+from lib.LatencyStats import get_latency_stats
+from lib.ONVIFControl import ONVIFControl
+from lib.SceneRecall import SceneRecall
+from lib.Settings import camera_connection, status_settings, supervisor_settings
+from lib.TourScheduler import TourScheduler
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_BODY = 1024 * 1024
+MAX_WRITE_BUFFER = 1024 * 1024
+
+STATUS_TEXT = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def to_json(value):
+    # Preset positions are zeep objects
+    return json.dumps(value, default=lambda obj: serialize_object(obj, dict))
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class DaemonCamera:
+    """
+    One camera kept connected by the daemon. Commands go through a CommandDispatcher as they do in the GUI, so
+    moves are coalesced and a burst of messages never queues more than one pending velocity per camera.
+    """
+
+    def __init__(self, section, config, general, on_event, on_activity=None):
+        self.id = section
+        self.connection = camera_connection(config, general)
+        self.status_settings = status_settings(general)
+        self.name = self.connection['name']
+        self.on_event = on_event
+        self.on_activity = on_activity
+        queue_size = 16 if 'command_queue_size' not in general else int(general['command_queue_size'])
+        keepalive_interval = 5 if 'keepalive_interval' not in general else float(general['keepalive_interval'])
+        self.health_timeout = 1 if 'health_timeout' not in general else float(general['health_timeout'])
+        self.health = None
+        self.ovnif = None
+        self.state = 'connecting'
+        self.error = None
+        self.dispatcher = CommandDispatcher(self.name, max_queue=queue_size, on_error=self.command_failed,
+                                            on_idle=self.keepalive, idle_interval=keepalive_interval)
+
+    def connect(self):
+        # Blocking, runs on the daemon's executor
+        self.state = 'connecting'
+        try:
+            ovnif = ONVIFControl(**self.connection)
+            ovnif.setup()
+            ovnif.preset_list()
+        except Exception as err:
+            self.state = 'failed'
+            self.error = str(err)
+            self.on_event({'event': 'state', 'camera': self.id, 'state': self.state, 'error': self.error})
+            return False
+
+        self.ovnif = ovnif
+        self.ovnif.add_preset_listener(self.presets_changed)
+        self.ovnif.status.add_listener(self.status_changed)
+        self.ovnif.start_events(**self.status_settings)
+        if self.ovnif.from_cache:
+            self.dispatcher.submit(self.revalidate)
+        if self.health is None:
+            self.health = get_connection_supervisor().add(self.name, self.probe, self.probe, self.health_changed)
+        self.state = 'ready'
+        self.error = None
+        self.on_event({'event': 'state', 'camera': self.id, 'state': self.state})
+        return True
+
+    def revalidate(self):
+        if self.ovnif.revalidate():
+            self.ovnif.preset_list(refresh=True)
+
+    def keepalive(self):
+        if self.ovnif and self.state == 'ready':
+            self.ovnif.keepalive()
+
+    def probe(self):
+        self.ovnif.probe(self.health_timeout)
+
+    def health_changed(self, up, error):
+        # Called from a supervisor thread. Offline cameras refuse commands until they answer again.
+        if self.state == 'closed':
+            return
+        self.state = 'ready' if up else 'offline'
+        self.error = None if up else str(error)
+        if not up:
+            self.dispatcher.cancel_moves()
+        self.on_event({'event': 'state', 'camera': self.id, 'state': self.state, 'error': self.error})
+
+    def presets_changed(self, presets):
+        self.on_event({'event': 'presets', 'camera': self.id, 'presets': presets})
+
+    def status_changed(self, status):
+        self.on_event(dict(status, event='status', camera=self.id))
+
+    def command_failed(self, err):
+        get_connection_supervisor().check_now(self.health)
+        self.on_event({'event': 'error', 'camera': self.id, 'error': str(err)})
+
+    def info(self):
+        info = {'id': self.id, 'name': self.name, 'state': self.state, 'error': self.error}
+        if self.ovnif:
+            info['ranges'] = [self.ovnif.XMIN, self.ovnif.XMAX, self.ovnif.YMIN, self.ovnif.YMAX,
+                              self.ovnif.ZMIN, self.ovnif.ZMAX]
+            info['connection'] = self.ovnif.connection_stats()
+            info['status'] = self.ovnif.status.snapshot()
+        info['dispatcher'] = self.dispatcher.stats()
+        return info
+
+    def require_ready(self):
+        if self.state != 'ready':
+            raise ApiError(409, f'{self.name} is {self.state}')
+
+    def touched(self):
+        # A client moved the camera, its tours hold off
+        if self.on_activity:
+            self.on_activity(self.id)
+
+    def move(self, x, y, timeout=None):
+        self.require_ready()
+        self.touched()
+        x = min(max(x, self.ovnif.XMIN), self.ovnif.XMAX)
+        y = min(max(y, self.ovnif.YMIN), self.ovnif.YMAX)
+        self.dispatcher.move(self.ovnif.move, x, y, timeout)
+
+    def zoom(self, speed, timeout=None):
+        self.require_ready()
+        self.touched()
+        self.dispatcher.move(self.ovnif.zoom, min(max(speed, self.ovnif.ZMIN), self.ovnif.ZMAX), timeout)
+
+    def velocity(self, x, y, zoom, timeout=None):
+        self.require_ready()
+        self.touched()
+        x = min(max(x, self.ovnif.XMIN), self.ovnif.XMAX)
+        y = min(max(y, self.ovnif.YMIN), self.ovnif.YMAX)
+        zoom = min(max(zoom, self.ovnif.ZMIN), self.ovnif.ZMAX)
+        self.dispatcher.move(self.ovnif.velocity, x, y, zoom, timeout)
+
+    def stop(self):
+        self.require_ready()
+        self.touched()
+        self.dispatcher.stop(self.ovnif.stop)
+
+    def preset_goto(self, token, speed=None):
+        self.require_ready()
+        self.touched()
+        self.dispatcher.submit(self.ovnif.preset_goto, token, speed)
+
+    def tour_goto(self, token, speed=None):
+        # Tour scheduler thread
+        self.require_ready()
+        self.dispatcher.submit(self.ovnif.preset_goto, token, speed)
+
+    def close(self):
+        self.state = 'closed'
+        get_connection_supervisor().remove(self.health)
+        self.dispatcher.close()
+        if self.ovnif:
+            self.ovnif.remove_preset_listener(self.presets_changed)
+            self.ovnif.status.remove_listener(self.status_changed)
+            self.ovnif.close()
+
+
+class WebSocket:
+    """Server side of RFC 6455 on asyncio streams, text messages only"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    async def recv(self):
+        """Next text message, or None once the connection is closed"""
+        fragments = []
+        while not self.closed:
+            header = await self.reader.readexactly(2)
+            fin, opcode = header[0] & 0x80, header[0] & 0x0f
+            masked, length = header[1] & 0x80, header[1] & 0x7f
+            if length == 126:
+                length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+            if length > MAX_BODY:
+                await self.close(1009)
+                return None
+            mask = await self.reader.readexactly(4) if masked else None
+            payload = await self.reader.readexactly(length)
+            if mask:
+                payload = self.unmask(payload, mask)
+
+            if opcode == 0x8:
+                await self.close()
+                return None
+            if opcode == 0x9:
+                self.send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            fragments.append(payload)
+            if fin:
+                return b''.join(fragments).decode('utf-8')
+        return None
+
+    @staticmethod
+    def unmask(payload, mask):
+        # XOR a whole message at once rather than byte by byte
+        repeated = (mask * (len(payload) // 4 + 1))[:len(payload)]
+        return (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(len(payload), 'big')
+
+    def send_frame(self, opcode, payload):
+        if self.closed:
+            return
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        self.writer.write(header + payload)
+
+    def send(self, text):
+        # A client that stops reading is disconnected instead of buffering without limit
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.closed = True
+            self.writer.close()
+            return
+        self.send_frame(0x1, text.encode('utf-8'))
+
+    async def close(self, code=1000):
+        if self.closed:
+            return
+        self.send_frame(0x8, struct.pack('!H', code))
+        self.closed = True
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+class ControlServer:
+    """
+    Headless camera control over a local HTTP and WebSocket API.
+
+    HTTP, one request per command:
+        GET    /cameras                          camera list and state
+        GET    /cameras/<id>                     one camera
+        GET    /cameras/<id>/presets[?refresh=1] preset list
+        GET    /cameras/<id>/snapshot            JPEG of what the camera sees, over HTTP only
+        POST   /cameras/<id>/move                {"x": 0.5, "y": 0, "zoom": 0, "timeout": 1}, zoom is optional
+        POST   /cameras/<id>/zoom                {"speed": 0.5, "timeout": 1}
+        POST   /cameras/<id>/stop
+        POST   /cameras/<id>/goto                {"preset": "<token>", "speed": 0.5}, speed is optional
+        POST   /cameras/<id>/presets             {"name": "Stage", "token": "<token or empty>"}
+        DELETE /cameras/<id>/presets/<token>
+        GET    /stats                            latency statistics
+        GET    /scenes                           scenes from settings.ini
+        POST   /scenes/<id>                      recall a scene, answered with each camera's result
+        GET    /tours                            running tours, with how late their steps went out
+        POST   /tours/<id>/start                 start a tour from settings.ini
+        POST   /tours/<id>/stop
+
+    WebSocket at /ws, one JSON message per command with the same names, e.g.
+        {"id": 1, "op": "move", "camera": "Camera 1", "x": 0.5, "y": 0}
+        {"id": 2, "op": "scene", "scene": "Scene 1"}
+        {"id": 3, "op": "tour_start", "tour": "Tour 1"}
+    is answered with {"id": 1, "ok": true}. State, preset, status and error events are pushed to every socket, a
+    status event carries moving, position, preset (the preset the camera is at), target and source (events or
+    polling).
+
+    <id> is the settings.ini section name, e.g. Camera%201, Scene%201 or Tour%201. Speeds are ONVIF velocities, -1
+    to 1 on most cameras, a goto speed is 0 to 1 of the camera's fastest preset move. Movement commands are
+    acknowledged once queued, a camera error is reported as an error event. The optional timeout bounds a move to
+    that many seconds, clients holding a button send the move again before it runs out instead of relying on a stop
+    getting through. Moving a camera pauses its tours for tour_resume_delay seconds.
+    """
+
+    def __init__(self, settings, host='127.0.0.1', port=8765, workers=8, reconnect_interval=30):
+        self.settings = settings
+        self.host = host
+        self.port = port
+        self.reconnect_interval = reconnect_interval
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='daemon')
+        self.cameras = {}
+        self.scenes = {}
+        self.scene_deadline = 2
+        self.scene_recall = SceneRecall()
+        self.tours = TourScheduler()
+        self.tour_defs = {}
+        self.sockets = set()
+        self.clients = set()
+        self.loop = None
+        self.server = None
+        self.stopped = None
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.load_cameras()
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f'Listening on http://{self.host}:{self.port}')
+        try:
+            await self.stopped.wait()
+        finally:
+            self.server.close()
+            for task in list(self.clients):
+                task.cancel()
+            await asyncio.gather(*self.clients, return_exceptions=True)
+            await self.server.wait_closed()
+            for camera in self.cameras.values():
+                camera.close()
+            self.scene_recall.close()
+            self.tours.close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def load_cameras(self):
+        config = self.settings.load()
+        general = dict(self.settings.general)
+        self.scene_deadline = 2 if 'scene_deadline' not in general else float(general['scene_deadline'])
+        get_connection_supervisor().configure(**supervisor_settings(general))
+        self.scenes = {section: (name, presets) for section, name, presets in self.settings.scenes()}
+        self.tours.configure(30 if 'tour_resume_delay' not in general else float(general['tour_resume_delay']))
+        self.tour_defs = {tour['id']: tour for tour in self.settings.tours()}
+        for section in self.settings.camera_sections():
+            camera = DaemonCamera(section, config[section], general, self.post_event, self.tours.activity)
+            self.cameras[section] = camera
+            self.loop.create_task(self.keep_connected(camera))
+        for tour_id, tour in self.tour_defs.items():
+            if tour['autostart']:
+                # Steps before the camera has connected are counted as failed, the tour keeps its timing
+                self.start_tour(tour_id)
+
+    async def keep_connected(self, camera):
+        while camera.state != 'closed' and not await self.loop.run_in_executor(self.executor, camera.connect):
+            logger.warning(f'{camera.name}: {camera.error}, retrying in {self.reconnect_interval}s')
+            await asyncio.sleep(self.reconnect_interval)
+
+    def post_event(self, event):
+        # Called from dispatcher and executor threads
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.broadcast, event)
+
+    def broadcast(self, event):
+        message = to_json(event)
+        for socket in list(self.sockets):
+            socket.send(message)
+
+    def start_tour(self, tour_id):
+        if tour_id not in self.tour_defs:
+            raise ApiError(404, f'Unknown tour {tour_id}')
+        tour = self.tour_defs[tour_id]
+        camera = self.cameras[tour['camera']]
+        self.tours.start(tour_id, tour['name'], tour['camera'], tour['presets'], tour['dwell'], camera.tour_goto,
+                         tour['speed'])
+
+    def camera(self, camera_id):
+        camera = self.cameras.get(camera_id)
+        if camera is None:
+            raise ApiError(404, f'Unknown camera {camera_id}')
+        return camera
+
+    @staticmethod
+    def number(params, name, default=None):
+        value = params.get(name, default)
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ApiError(400, f'{name} must be a number')
+        # NaN survives clamping to the camera's range and would be sent to it as it is
+        if not math.isfinite(number):
+            raise ApiError(400, f'{name} must be a finite number')
+        return number
+
+    async def execute(self, op, camera_id=None, params=None):
+        """Run one API operation, shared by the HTTP and WebSocket front ends"""
+        params = params or {}
+        if op == 'cameras':
+            return [camera.info() for camera in self.cameras.values()]
+        if op == 'stats':
+            return get_latency_stats().snapshot()
+        if op == 'scenes':
+            return [{'id': section, 'name': name, 'presets': presets}
+                    for section, (name, presets) in self.scenes.items()]
+        if op == 'scene':
+            return await self.recall_scene(camera_id)
+        if op == 'tours':
+            return self.tours.stats()
+        if op == 'tour_start':
+            self.start_tour(camera_id)
+            return None
+        if op == 'tour_stop':
+            if not self.tours.stop(camera_id):
+                raise ApiError(409, f'{camera_id} is not running')
+            return None
+
+        camera = self.camera(camera_id)
+        if op == 'camera':
+            return camera.info()
+        if op == 'move' and 'zoom' in params:
+            camera.velocity(self.number(params, 'x', 0), self.number(params, 'y', 0), self.number(params, 'zoom'),
+                            self.number(params, 'timeout', 0))
+        elif op == 'move':
+            camera.move(self.number(params, 'x', 0), self.number(params, 'y', 0), self.number(params, 'timeout', 0))
+        elif op == 'zoom':
+            camera.zoom(self.number(params, 'speed'), self.number(params, 'timeout', 0))
+        elif op == 'stop':
+            camera.stop()
+        elif op == 'goto':
+            if not params.get('preset'):
+                raise ApiError(400, 'preset is required')
+            camera.preset_goto(str(params['preset']),
+                               self.number(params, 'speed') if params.get('speed') is not None else None)
+        elif op == 'presets':
+            camera.require_ready()
+            refresh = str(params.get('refresh', '')).lower() in ('1', 'true', 'yes')
+            return await self.loop.run_in_executor(self.executor, camera.ovnif.preset_list, refresh)
+        elif op == 'preset_add':
+            if not params.get('name'):
+                raise ApiError(400, 'name is required')
+            camera.require_ready()
+            return {'token': await self.loop.run_in_executor(self.executor, camera.ovnif.preset_add,
+                                                             str(params['name']), params.get('token') or '')}
+        elif op == 'snapshot':
+            camera.require_ready()
+            return await self.loop.run_in_executor(self.executor, camera.ovnif.snapshot)
+        elif op == 'preset_remove':
+            if not params.get('token'):
+                raise ApiError(400, 'token is required')
+            camera.require_ready()
+            await self.loop.run_in_executor(self.executor, camera.ovnif.preset_remove, str(params['token']))
+        else:
+            raise ApiError(404, f'Unknown operation {op}')
+        return None
+
+    async def recall_scene(self, scene_id):
+        if scene_id not in self.scenes:
+            raise ApiError(404, f'Unknown scene {scene_id}')
+        name, presets = self.scenes[scene_id]
+        targets = []
+        dispatchers = []
+        for section, token in presets.items():
+            camera = self.cameras.get(section)
+            if camera is not None:
+                camera.touched()
+                targets.append((camera.id, camera.ovnif if camera.state == 'ready' else None, token))
+                dispatchers.append(camera.dispatcher)
+        await self.loop.run_in_executor(self.executor, SceneRecall.flush, dispatchers, self.scene_deadline / 4)
+        results = await self.loop.run_in_executor(self.executor, self.scene_recall.recall, targets,
+                                                  self.scene_deadline)
+        return {'scene': scene_id, 'name': name, 'results': results}
+
+    @staticmethod
+    def route(method, path):
+        """Map an HTTP request to (operation, camera id, token)"""
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if parts == ['cameras'] and method == 'GET':
+            return 'cameras', None, None
+        if parts == ['stats'] and method == 'GET':
+            return 'stats', None, None
+        if parts == ['scenes'] and method == 'GET':
+            return 'scenes', None, None
+        if len(parts) == 2 and parts[0] == 'scenes' and method == 'POST':
+            return 'scene', parts[1], None
+        if parts == ['tours'] and method == 'GET':
+            return 'tours', None, None
+        if len(parts) == 3 and parts[0] == 'tours' and parts[2] in ('start', 'stop') and method == 'POST':
+            return f'tour_{parts[2]}', parts[1], None
+        if len(parts) < 2 or parts[0] != 'cameras':
+            raise ApiError(404, f'Not found: {path}')
+        camera_id, rest = parts[1], parts[2:]
+        if not rest and method == 'GET':
+            return 'camera', camera_id, None
+        if rest == ['presets']:
+            return ('presets' if method == 'GET' else 'preset_add'), camera_id, None
+        if rest == ['snapshot'] and method == 'GET':
+            return 'snapshot', camera_id, None
+        if len(rest) == 2 and rest[0] == 'presets' and method == 'DELETE':
+            return 'preset_remove', camera_id, rest[1]
+        if len(rest) == 1 and rest[0] in ('move', 'zoom', 'stop', 'goto') and method == 'POST':
+            return rest[0], camera_id, None
+        raise ApiError(405 if rest else 404, f'{method} {path} is not supported')
+
+    async def handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self.clients.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    await self.handle_websocket(reader, writer, headers)
+                    break
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    self.respond(writer, 413, {'error': 'Request too large'}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, result = await self.handle_http(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self.respond(writer, status, result, close=not keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutting down, end the connection quietly
+            pass
+        finally:
+            self.clients.discard(task)
+            writer.close()
+
+    async def handle_http(self, method, target, body):
+        url = urlsplit(target)
+        try:
+            op, camera_id, token = self.route(method, url.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if body:
+                try:
+                    params.update(json.loads(body))
+                except (ValueError, TypeError):
+                    raise ApiError(400, 'Body must be a JSON object')
+            if token is not None:
+                params['token'] = token
+            result = await self.execute(op, camera_id, params)
+            return (200, result) if result is not None else (202, {'queued': True})
+        except ApiError as err:
+            return err.status, {'error': str(err)}
+        except Exception as err:
+            logger.exception(f'{method} {target} failed')
+            return 500, {'error': str(err)}
+
+    @staticmethod
+    def respond(writer, status, result, close=False):
+        # Snapshots are the only result that isn't JSON
+        content_type = 'image/jpeg' if isinstance(result, bytes) else 'application/json'
+        body = result if isinstance(result, bytes) else to_json(result).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\n'
+                     f'Content-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     f'Connection: {"close" if close else "keep-alive"}\r\n\r\n'.encode('latin-1') + body)
+
+    async def handle_websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\n'
+                      'Upgrade: websocket\r\n'
+                      'Connection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode('latin-1'))
+        socket = WebSocket(reader, writer)
+        self.sockets.add(socket)
+        try:
+            while True:
+                message = await socket.recv()
+                if message is None:
+                    break
+                socket.send(to_json(await self.handle_message(message)))
+                await writer.drain()
+        finally:
+            self.sockets.discard(socket)
+
+    async def handle_message(self, message):
+        request_id = None
+        try:
+            request = json.loads(message)
+            if not isinstance(request, dict):
+                raise ApiError(400, 'Message must be a JSON object')
+            request_id = request.get('id')
+            if request.get('op') == 'snapshot':
+                raise ApiError(400, 'Snapshots are only sent over HTTP')
+            target = request.get('camera', request.get('scene', request.get('tour')))
+            result = await self.execute(request.get('op'), target, request)
+            return {'id': request_id, 'ok': True, 'result': result}
+        except ApiError as err:
+            return {'id': request_id, 'ok': False, 'error': str(err)}
+        except ValueError:
+            return {'id': request_id, 'ok': False, 'error': 'Message must be JSON'}
+        except Exception as err:
+            logger.exception('WebSocket message failed')
+            return {'id': request_id, 'ok': False, 'error': str(err)}
+
@@ -0,0 +1,142 @@
+import threading
+import time
+from urllib.parse import quote
+import requests
+from lib.LatencyStats import get_latency_stats, timed
+from lib.PTZStatus import PTZStatus
+
+
+class DaemonControl:
+    """
+    Stands in for ONVIFControl when the GUI is a client of the control daemon. The camera is addressed by its
+    settings.ini section, the daemon owns the camera connection and the GUI keeps one keep-alive HTTP connection
+    to the daemon.
+    """
+
+    def __init__(self, url, section, name=None, timeout=5, read_timeout=5, preset_ttl=0, latency_stats=None):
+        self.url = f'{url.rstrip("/")}/cameras/{quote(section)}'
+        self.name = name or section
+        self.timeout = (timeout, read_timeout)
+        self.session = requests.Session()
+        self.latency_stats = latency_stats or get_latency_stats()
+        self.from_cache = False
+        self.preset_ttl = preset_ttl
+        self.presets = None
+        self.presets_time = 0
+        self.presets_lock = threading.RLock()
+        self.preset_listeners = []
+        self.XMAX = 1
+        self.XMIN = -1
+        self.YMAX = 1
+        self.YMIN = -1
+        self.ZMAX = 1
+        self.ZMIN = -1
+        self.status = PTZStatus()
+
+    def request(self, method, path='', **kwargs):
+        response = self.session.request(method, self.url + path, timeout=self.timeout, **kwargs)
+        result = response.json() if response.content else None
+        if response.status_code >= 400:
+            raise Exception(result.get('error') if isinstance(result, dict) else f'Daemon error {response.status_code}')
+        return result
+
+    @timed('setup')
+    def setup(self):
+        info = self.request('GET')
+        if info['state'] != 'ready':
+            raise Exception(info.get('error') or f'{self.name} is {info["state"]} on the daemon')
+        self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.ZMIN, self.ZMAX = info['ranges']
+
+    def revalidate(self):
+        # The daemon revalidates its own connection
+        return False
+
+    def keepalive(self):
+        self.request('GET')
+
+    @timed('probe')
+    def probe(self, timeout=1):
+        # Healthy when the daemon answers and has the camera connected
+        response = self.session.get(self.url, timeout=timeout)
+        response.raise_for_status()
+        info = response.json()
+        if info['state'] != 'ready':
+            raise Exception(info.get('error') or f'{self.name} is {info["state"]} on the daemon')
+
+    def connection_stats(self):
+        return self.request('GET').get('connection', {})
+
+    def start_events(self, **kwargs):
+        # The daemon follows the camera's status
+        pass
+
+    def close(self):
+        self.session.close()
+
+    @timed('move')
+    def move(self, x_speed, y_speed, timeout=None):
+        self.request('POST', '/move', json={'x': x_speed, 'y': y_speed, 'timeout': timeout or 0})
+
+    @timed('velocity')
+    def velocity(self, x_speed, y_speed, zoom_speed, timeout=None):
+        self.request('POST', '/move', json={'x': x_speed, 'y': y_speed, 'zoom': zoom_speed, 'timeout': timeout or 0})
+
+    @timed('stop')
+    def stop(self):
+        self.request('POST', '/stop')
+
+    @timed('zoom')
+    def zoom(self, speed, timeout=None):
+        self.request('POST', '/zoom', json={'speed': speed, 'timeout': timeout or 0})
+
+    @timed('snapshot')
+    def snapshot(self):
+        response = self.session.get(f'{self.url}/snapshot', timeout=self.timeout)
+        if response.status_code >= 400:
+            raise Exception(response.json().get('error', f'Daemon error {response.status_code}'))
+        return response.content
+
+    @timed('preset_goto')
+    def preset_goto(self, preset_id, speed=None):
+        params = {'preset': preset_id}
+        if speed is not None:
+            params['speed'] = speed
+        self.request('POST', '/goto', json=params)
+
+    def preset_list(self, refresh=False):
+        with self.presets_lock:
+            expired = self.preset_ttl and time.monotonic() - self.presets_time > self.preset_ttl
+            if self.presets is None or refresh or expired:
+                presets = self.request('GET', '/presets', params={'refresh': 1} if refresh else None)
+                changed = presets != self.presets
+                self.presets = presets
+                self.presets_time = time.monotonic()
+                if changed:
+                    self.notify_presets()
+            return list(self.presets)
+
+    def add_preset_listener(self, callback):
+        with self.presets_lock:
+            if callback not in self.preset_listeners:
+                self.preset_listeners.append(callback)
+
+    def remove_preset_listener(self, callback):
+        with self.presets_lock:
+            if callback in self.preset_listeners:
+                self.preset_listeners.remove(callback)
+
+    def notify_presets(self):
+        presets = list(self.presets)
+        for callback in list(self.preset_listeners):
+            callback(presets)
+
+    @timed('preset_add')
+    def preset_add(self, name, preset_token):
+        token = self.request('POST', '/presets', json={'name': name, 'token': preset_token})['token']
+        self.preset_list(refresh=True)
+        return token
+
+    @timed('preset_remove')
+    def preset_remove(self, preset_token):
+        self.request('DELETE', f'/presets/{quote(preset_token, safe="")}')
+        self.preset_list(refresh=True)
@@ -0,0 +1,218 @@
+import argparse
+import ipaddress
+import logging
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+from lxml import etree
+from zeep.transports import Transport
+from lib.WSDLCache import CachedONVIFCamera
+
+logger = logging.getLogger(__name__)
+
+MULTICAST_GROUP = '239.255.255.250'
+DISCOVERY_PORT = 3702
+
+NAMESPACES = {'s': 'http://www.w3.org/2003/05/soap-envelope',
+              'a': 'http://schemas.xmlsoap.org/ws/2004/08/addressing',
+              'd': 'http://schemas.xmlsoap.org/ws/2005/04/discovery',
+              }
+
+PROBE = """<?xml version="1.0" encoding="UTF-8"?>
+<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"
+ xmlns:a="http://schemas.xmlsoap.org/ws/2004/08/addressing"
+ xmlns:d="http://schemas.xmlsoap.org/ws/2005/04/discovery"
+ xmlns:dn="http://www.onvif.org/ver10/network/wsdl">
+<s:Header><a:Action s:mustUnderstand="1">http://schemas.xmlsoap.org/ws/2005/04/discovery/Probe</a:Action>
+<a:MessageID>{message_id}</a:MessageID>
+<a:ReplyTo><a:Address>http://schemas.xmlsoap.org/ws/2004/08/addressing/role/anonymous</a:Address></a:ReplyTo>
+<a:To s:mustUnderstand="1">urn:schemas-xmlsoap-org:ws:2005:04:discovery</a:To></s:Header>
+<s:Body><d:Probe><d:Types>dn:NetworkVideoTransmitter</d:Types></d:Probe></s:Body></s:Envelope>"""
+
+
+def parse_probe_matches(data):
+    """Returns [(xaddr, name)] from a ProbeMatches message"""
+    try:
+        envelope = etree.fromstring(data)
+    except etree.XMLSyntaxError:
+        return []
+    matches = []
+    for match in envelope.iterfind('s:Body/d:ProbeMatches/d:ProbeMatch', NAMESPACES):
+        xaddrs = (match.findtext('d:XAddrs', '', NAMESPACES) or '').split()
+        scopes = (match.findtext('d:Scopes', '', NAMESPACES) or '').split()
+        name = None
+        for scope in scopes:
+            if scope.startswith('onvif://www.onvif.org/name/'):
+                name = unquote(scope.rsplit('/', 1)[1]).replace('_', ' ')
+        # Cameras list one address per interface, prefer IPv4
+        xaddrs.sort(key=lambda xaddr: '[' in xaddr)
+        if xaddrs:
+            matches.append((xaddrs[0], name))
+    return matches
+
+
+class Discovery:
+    """
+    Finds ONVIF cameras with a WS-Discovery Probe, multicast on the local network and optionally sent to every
+    address of a subnet for networks that block multicast. An optional TCP sweep finds cameras that don't answer
+    probes at all. Every candidate is then checked with GetDeviceInformation and GetCapabilities, all of it
+    concurrently on at most workers threads with timeout seconds per request.
+    """
+
+    def __init__(self, username='admin', password='', workers=64, timeout=1, wait=2, discovery_port=DISCOVERY_PORT,
+                 multicast_group=MULTICAST_GROUP, sweep_ports=(80,), interface=None):
+        self.username = username
+        self.password = password
+        self.workers = workers
+        self.timeout = timeout
+        self.wait = wait
+        self.discovery_port = discovery_port
+        self.multicast_group = multicast_group
+        self.sweep_ports = sweep_ports
+        self.interface = interface
+
+    def scan(self, subnet=None, multicast=True, sweep=False):
+        """
+        Returns a result per camera found:
+        {'host', 'port', 'xaddr', 'name', 'source', 'onvif', 'manufacturer', 'model', 'serial', 'ptz', 'error'}
+        """
+        candidates = {}
+        targets = []
+        if multicast:
+            targets.append(self.multicast_group)
+        hosts = [str(host) for host in ipaddress.ip_network(subnet, strict=False).hosts()] if subnet else []
+        targets.extend(hosts)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='discovery') as executor:
+            sweeps = []
+            if sweep and hosts:
+                sweeps = [executor.submit(self.connect, host, port) for host in hosts for port in self.sweep_ports]
+            for xaddr, name in self.probe(targets):
+                self.add_candidate(candidates, xaddr, name, 'probe')
+            for future in sweeps:
+                address = future.result()
+                if address:
+                    self.add_candidate(candidates, f'http://{address[0]}:{address[1]}/onvif/device_service', None,
+                                       'sweep')
+
+            results = list(executor.map(self.verify, candidates.values()))
+        return sorted(results, key=lambda result: (self.sort_key(result['host']), result['port']))
+
+    @staticmethod
+    def sort_key(host):
+        try:
+            return 0, int(ipaddress.ip_address(host))
+        except ValueError:
+            return 1, host
+
+    @staticmethod
+    def add_candidate(candidates, xaddr, name, source):
+        url = urlsplit(xaddr)
+        if not url.hostname:
+            return
+        key = (url.hostname, url.port or 80)
+        if key not in candidates:
+            candidates[key] = {'host': url.hostname, 'port': url.port or 80, 'xaddr': xaddr, 'name': name,
+                               'source': source}
+        elif name and not candidates[key]['name']:
+            candidates[key]['name'] = name
+
+    def probe(self, targets):
+        """Send a Probe to every target from one socket and collect the matches until wait seconds have passed"""
+        if not targets:
+            return []
+        message_id = f'uuid:{uuid.uuid4()}'
+        probe = PROBE.format(message_id=message_id).encode('utf-8')
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            if self.interface:
+                # Computers with several network adapters only send multicast out of one unless told otherwise
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+            sock.bind(('', 0))
+            for target in targets:
+                try:
+                    sock.sendto(probe, (target, self.discovery_port))
+                except OSError as err:
+                    logger.debug(f'Probe to {target} failed: {err}')
+
+            matches = []
+            deadline = time.monotonic() + self.wait
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, _ = sock.recvfrom(65535)
+                except socket.timeout:
+                    break
+                except OSError:
+                    continue
+                if message_id.encode() in data:
+                    matches.extend(parse_probe_matches(data))
+            return matches
+        finally:
+            sock.close()
+
+    def connect(self, host, port):
+        try:
+            with socket.create_connection((host, port), timeout=self.timeout):
+                return host, port
+        except OSError:
+            return None
+
+    def verify(self, candidate):
+        result = dict(candidate, onvif=False, manufacturer=None, model=None, serial=None, ptz=False, error=None)
+        transport = Transport(timeout=self.timeout, operation_timeout=self.timeout)
+        try:
+            camera = CachedONVIFCamera(candidate['host'], candidate['port'], self.username, self.password,
+                                       xaddrs={}, transport=transport)
+            try:
+                # Answered without credentials by every ONVIF device
+                camera.devicemgmt.GetSystemDateAndTime()
+            except Exception as err:
+                result['error'] = f'Not an ONVIF device: {err}'
+                return result
+
+            result['onvif'] = True
+            try:
+                info = camera.devicemgmt.GetDeviceInformation()
+                result.update(manufacturer=info.Manufacturer, model=info.Model, serial=info.SerialNumber)
+                capabilities = camera.devicemgmt.GetCapabilities({'Category': 'All'})
+                result['ptz'] = capabilities.PTZ is not None
+            except Exception as err:
+                result['error'] = f'Check the username and password: {err}'
+            return result
+        finally:
+            transport.session.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find ONVIF cameras on the network')
+    parser.add_argument('--subnet', help='also probe every address in this subnet, e.g. 192.168.1.0/24')
+    parser.add_argument('--sweep', action='store_true', help='also try a TCP connection to every address in subnet')
+    parser.add_argument('--no-multicast', action='store_true')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--port', type=int, default=DISCOVERY_PORT, help='WS-Discovery port')
+    parser.add_argument('--interface', help='IP address of the network adapter to send multicast probes from')
+    parser.add_argument('--write', action='store_true', help='add the cameras found to settings.ini')
+    args = parser.parse_args()
+
+    from lib.Settings import Settings
+
+    start = time.perf_counter()
+    discovery = Discovery(args.username, args.password, discovery_port=args.port, interface=args.interface)
+    found = discovery.scan(args.subnet, multicast=not args.no_multicast, sweep=args.sweep)
+    print(f'{len(found)} devices in {time.perf_counter() - start:.1f}s')
+    for camera in found:
+        print(f"{camera['host']}:{camera['port']}  {camera['name'] or ''}  {camera['manufacturer'] or ''} "
+              f"{camera['model'] or ''}  {'PTZ' if camera['ptz'] else ''}  {camera['error'] or ''}")
+    if args.write:
+        settings = Settings()
+        settings.load()
+        added = settings.add_cameras(found, args.username, args.password)
+        print(f'Added {", ".join(added) or "nothing"} to {settings.filename}')
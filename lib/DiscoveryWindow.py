@@ -0,0 +1,122 @@
+import os
+import threading
+from lib.pyinstaller_helper import resource_path
+from tkinter import BooleanVar, Button, Checkbutton, Entry, Frame, Label, Toplevel
+from tkinter.ttk import Treeview
+
+COLUMNS = [('host', 'Address', 120),
+           ('port', 'Port', 60),
+           ('name', 'Name', 140),
+           ('model', 'Model', 140),
+           ('ptz', 'PTZ', 50),
+           ('status', 'Status', 220),
+           ]
+
+
+class DiscoveryWindow(Toplevel):
+    """Scan the network for ONVIF cameras and add the ones selected to settings.ini"""
+
+    def __init__(self, master, settings, ui_queue, added_cb):
+        super().__init__(master=master)
+        self.settings = settings
+        self.ui_queue = ui_queue
+        self.added_cb = added_cb
+        self.results = []
+        self.scanning = False
+
+        self.title("Find cameras")
+        self.configure(background='white')
+        self.iconbitmap(resource_path(os.path.join('assets', 'favicon.ico')))
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        text = """Cameras on this network are found automatically. If yours are on a network that blocks
+multicast, enter their subnet (e.g. 192.168.1.0/24) to probe every address in it."""
+        self.intro = Label(self, text=text, background="white", anchor="w", justify="left")
+        self.intro.grid(row=0, column=0, padx=5, pady=5, sticky='W')
+
+        self.form = Frame(self, background='white')
+        self.form.grid(row=1, column=0, padx=5, pady=5, sticky='W')
+        Label(self.form, text="Subnet", background="white").grid(row=0, column=0, sticky='W')
+        self.subnet = Entry(self.form, width=20)
+        self.subnet.grid(row=0, column=1, padx=5)
+        Label(self.form, text="Username", background="white").grid(row=0, column=2, sticky='W')
+        self.username = Entry(self.form, width=12)
+        self.username.insert(0, 'admin')
+        self.username.grid(row=0, column=3, padx=5)
+        Label(self.form, text="Password", background="white").grid(row=0, column=4, sticky='W')
+        self.password = Entry(self.form, width=12, show='*')
+        self.password.grid(row=0, column=5, padx=5)
+        self.sweep = BooleanVar(value=False)
+        Checkbutton(self.form, text="Also try every address on port 80", variable=self.sweep,
+                    background='white').grid(row=1, column=0, columnspan=4, sticky='W')
+        self.scan_button = Button(self.form, text="Scan", command=self.scan)
+        self.scan_button.grid(row=1, column=5, padx=5, sticky='E')
+
+        self.table = Treeview(self, columns=[column for column, _, _ in COLUMNS], show='headings', height=12)
+        for column, heading, width in COLUMNS:
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=width, anchor='w')
+        self.table.grid(row=2, column=0, padx=5, pady=5, sticky='NSEW')
+        self.grid_rowconfigure(2, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.add_button = Button(self, text="Add selected cameras to settings", command=self.add, state='disabled')
+        self.add_button.grid(row=3, column=0, padx=5, pady=5, sticky='W')
+
+        self.message = Label(self, text="", anchor="w", background="white")
+        self.message.grid(row=4, column=0, padx=5, sticky='W')
+
+    def scan(self):
+        if self.scanning:
+            return
+        subnet = self.subnet.get().strip() or None
+        self.scanning = True
+        self.scan_button.configure(state='disabled')
+        self.message.configure(text='Scanning...')
+        args = (self.username.get(), self.password.get(), subnet, self.sweep.get())
+        threading.Thread(target=self.run_scan, args=args, name='discovery', daemon=True).start()
+
+    def run_scan(self, username, password, subnet, sweep):
+        try:
+            # zeep is only loaded once the first scan starts, off the Tk thread
+            from lib.Discovery import Discovery
+            discovery = Discovery(username, password)
+            results = discovery.scan(subnet, sweep=sweep)
+            self.ui_queue.post(self.scan_done, results, None)
+        except Exception as err:
+            self.ui_queue.post(self.scan_done, [], err)
+
+    def scan_done(self, results, err):
+        self.scanning = False
+        if not self.winfo_exists():
+            return
+        self.scan_button.configure(state='normal')
+        self.results = results
+        self.table.delete(*self.table.get_children())
+        for idx, result in enumerate(results):
+            status = result['error'] or ('Ready' if result['ptz'] else 'No PTZ')
+            values = [result['host'], result['port'], result['name'] or '', result['model'] or '',
+                      'Yes' if result['ptz'] else 'No', status]
+            self.table.insert('', 'end', iid=str(idx), values=values)
+            if result['onvif'] and result['ptz']:
+                self.table.selection_add(str(idx))
+        self.add_button.configure(state='normal' if results else 'disabled')
+        if err:
+            self.message.configure(text=f'Error: {err}')
+        else:
+            self.message.configure(text=f'Found {len(results)} devices')
+
+    def add(self):
+        selected = [self.results[int(iid)] for iid in self.table.selection()]
+        try:
+            self.settings.load()
+            added = self.settings.add_cameras(selected, self.username.get(), self.password.get())
+        except Exception as err:
+            self.message.configure(text=f'Error: {err}')
+            return
+        self.message.configure(text=f'Added {", ".join(added)}' if added else 'Those cameras are already set up')
+        if added and self.added_cb:
+            self.added_cb()
+
+    def close(self):
+        self.destroy()
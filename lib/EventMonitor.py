@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
+from zeep.wsdl.utils import etree_to_string
+from lib.TransportPool import PooledTransport
+from lib.WSDLCache import CachedONVIFCamera
+
+logger = logging.getLogger(__name__)
+
+EVENTS_NS = 'http://www.onvif.org/ver10/events/wsdl'
+PULLPOINT_NS = f'{EVENTS_NS}/PullPointSubscription'
+SUBSCRIPTION_MANAGER = f'{{{EVENTS_NS}}}SubscriptionManagerBinding'
+WSNT = 'http://docs.oasis-open.org/wsn/b-2'
+PRESET_TOPIC = 'PTZController/PTZPresets/'
+
+EVENTS = 'events'
+POLLING = 'polling'
+
+
+class EventMonitor:
+    """
+    Follows a camera's PTZ status on one background thread. Cameras that offer PullPoint subscriptions are
+    long-polled with PullMessages: the request waits at the camera for up to pull_timeout seconds and returns as
+    soon as a preset is invoked, reached, aborted or left, so an idle camera costs one request per pull_timeout.
+    Position is read with GetStatus every poll_interval seconds only while the camera is moving.
+
+    With events off, or for cameras without event support, status is polled with GetStatus instead: every
+    poll_interval seconds while moving and every idle_interval seconds otherwise (0 stops polling while idle). A
+    subscription that can't be made is tried again, backing off to every resubscribe_interval seconds, and status
+    is polled in the meantime.
+    """
+
+    def __init__(self, control, status, events=True, pull_timeout=10, poll_interval=0.5, idle_interval=5,
+                 subscription_time=60, resubscribe_interval=60):
+        self.control = control
+        self.status = status
+        self.name = control.name
+        self.pull_timeout = pull_timeout
+        self.poll_interval = poll_interval
+        self.idle_interval = idle_interval
+        self.subscription_time = subscription_time
+        self.resubscribe_interval = resubscribe_interval
+        self.events = events and EVENTS_NS in control.xaddrs
+        self.transport = None
+        self.pullpoint = None
+        self.manager = None
+        self.expires = 0
+        self.retry_time = 0
+        self.failures = 0
+        self.refresh_pending = True
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.error = None
+        self.pulls = 0
+        self.polls = 0
+        self.received = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f'events-{self.name}', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # The thread unsubscribes once a PullMessages in progress returns
+        self.running = False
+        self.wakeup.set()
+
+    def wake(self, refresh=False):
+        """Commands call this so status is read again without waiting out idle_interval"""
+        if refresh:
+            self.refresh_pending = True
+        self.wakeup.set()
+
+    def stats(self):
+        return {'source': self.status.source, 'pulls': self.pulls, 'polls': self.polls, 'events': self.received,
+                'error': self.error}
+
+    def run(self):
+        if not self.events:
+            self.status.update(source=POLLING)
+        while self.running:
+            try:
+                if self.events and self.pullpoint is None and time.monotonic() >= self.retry_time:
+                    self.subscribe()
+                if self.pullpoint:
+                    self.pull()
+                else:
+                    self.wait()
+                if self.running and (self.pullpoint is None or self.status.moving or self.refresh_pending):
+                    self.poll()
+                self.error = None
+            except Exception as err:
+                if not self.running:
+                    break
+                if str(err) != self.error:
+                    logger.warning(f'{self.name}: status update failed: {err}')
+                self.error = str(err)
+                if self.pullpoint:
+                    # The subscription is lost with the connection on most cameras, start over
+                    self.unsubscribed()
+                self.wakeup.wait(self.poll_interval if self.status.moving else max(self.idle_interval, 1))
+                self.wakeup.clear()
+
+        if self.manager:
+            try:
+                self.manager.Unsubscribe()
+            except Exception:
+                pass
+        if self.transport:
+            self.transport.session.close()
+
+    def wait(self):
+        interval = self.poll_interval if self.status.moving or self.refresh_pending else self.idle_interval
+        if interval:
+            self.wakeup.wait(interval)
+        else:
+            self.wakeup.wait()
+        self.wakeup.clear()
+
+    def poll(self):
+        since = time.monotonic()
+        status = self.control.ptz_status()
+        self.polls += 1
+        self.refresh_pending = False
+        self.status.observe(since, status['moving'], status['position'])
+
+    # PullPoint subscription
+
+    def subscribe(self):
+        if self.transport is None:
+            # Long polls get connections of their own so they never hold up a move
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.transport = PooledTransport(session, self.control.timeout,
+                                             self.pull_timeout + self.control.read_timeout)
+        try:
+            camera = CachedONVIFCamera(self.control.host, self.control.port, self.control.username,
+                                       self.control.password, transport=self.transport, xaddrs=self.control.xaddrs)
+            response = camera.create_events_service().CreatePullPointSubscription(
+                {'InitialTerminationTime': f'PT{self.subscription_time}S'})
+            address = response.SubscriptionReference.Address._value_1
+            camera.xaddrs[PULLPOINT_NS] = address
+            self.pullpoint = camera.create_pullpoint_service()
+            self.manager = self.pullpoint.zeep_client.create_service(SUBSCRIPTION_MANAGER, address)
+        except Exception as err:
+            # Cameras without events fail every time, a lost request only once
+            delay = min(self.resubscribe_interval, max(self.idle_interval, 1) * 2 ** self.failures)
+            self.failures += 1
+            self.retry_time = time.monotonic() + delay
+            self.status.update(source=POLLING)
+            logger.info(f'{self.name}: no PullPoint events, polling status instead: {err}')
+            return False
+        self.failures = 0
+        self.expires = time.monotonic() + self.remaining(response)
+        self.status.update(source=EVENTS)
+        return True
+
+    def unsubscribed(self):
+        self.pullpoint = None
+        self.manager = None
+        self.retry_time = time.monotonic() + self.idle_interval
+        self.status.update(source=POLLING)
+
+    @staticmethod
+    def remaining(response):
+        if response.TerminationTime and response.CurrentTime:
+            return (response.TerminationTime - response.CurrentTime).total_seconds()
+        return 0
+
+    def renew(self):
+        response = self.manager.Renew(TerminationTime=f'PT{self.subscription_time}S')
+        self.expires = time.monotonic() + (self.remaining(response) or self.subscription_time)
+
+    def pull(self):
+        timeout = self.poll_interval if self.status.moving or self.refresh_pending else self.pull_timeout
+        if self.expires - time.monotonic() < timeout + self.control.read_timeout:
+            self.renew()
+
+        # zeep loses the Topic text, a mixed content element, so the response is read here instead
+        service = self.pullpoint
+        client = service.zeep_client
+        binding = service.ws_client._binding
+        options = service.ws_client._binding_options
+        request = {'Timeout': f'PT{timeout:g}S', 'MessageLimit': 32}
+        envelope, headers = binding._create('PullMessages', (), request, client=client, options=options)
+        response = client.transport.post(options['address'], etree_to_string(envelope), headers)
+        if response.status_code != 200:
+            # Raises the SOAP fault
+            binding.process_reply(client, binding.get('PullMessages'), response)
+        self.pulls += 1
+        document = etree.fromstring(response.content, etree.XMLParser(resolve_entities=False, no_network=True))
+        for message in document.iter(f'{{{WSNT}}}NotificationMessage'):
+            topic = (message.findtext(f'{{{WSNT}}}Topic') or '').strip().split(':', 1)[-1]
+            items = {item.get('Name'): item.get('Value')
+                     for item in message.iterfind(f'{{{WSNT}}}Message/{{*}}Message/{{*}}Data/{{*}}SimpleItem')}
+            self.received += 1
+            self.event(topic, items)
+
+    def event(self, topic, items):
+        if not topic.startswith(PRESET_TOPIC):
+            return
+        event = topic[len(PRESET_TOPIC):]
+        token = items.get('PresetToken')
+        if event == 'Invoked':
+            self.status.command(moving=True, preset=None, target=token)
+        elif event == 'Reached':
+            self.status.command(moving=False, preset=token, target=None)
+            self.refresh_pending = True
+            if token is not None and not any(preset['token'] == token for preset in self.control.presets or []):
+                # Saved from somewhere else
+                self.control.preset_list(refresh=True)
+        elif event == 'Aborted':
+            self.status.update(preset=None, target=None)
+        elif event == 'Left':
+            self.status.update(preset=None)
@@ -0,0 +1,81 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class Gamepad:
+    """
+    Reads the first game controller or joystick connected, polled from the Tk loop every poll_interval
+    milliseconds. on_axes(pan, tilt, zoom) is called with stick positions from -1 to 1 on every poll while a
+    controller is connected and on_button(button) when a button is pressed. Controllers can be plugged in and out
+    while running. Needs the pygame package.
+    """
+
+    def __init__(self, root, on_axes, on_button=None, axes=(0, 1, 3), invert=(False, True, True), poll_interval=10):
+        self.root = root
+        self.on_axes = on_axes
+        self.on_button = on_button
+        self.axes = axes
+        self.invert = invert
+        self.poll_interval = poll_interval
+        self.pygame = None
+        self.joystick = None
+        self.running = False
+        self.error = None
+
+    def start(self):
+        try:
+            # pygame only delivers controller events with a video driver, the dummy one opens no windows
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+            import pygame
+            pygame.display.init()
+            pygame.joystick.init()
+        except ImportError as err:
+            self.error = f'Joystick unavailable: {err.name} is not installed'
+            return False
+        except Exception as err:
+            self.error = f'Joystick unavailable: {err}'
+            return False
+        self.pygame = pygame
+        self.running = True
+        self.root.after(self.poll_interval, self.poll)
+        return True
+
+    @property
+    def name(self):
+        return self.joystick.get_name() if self.joystick else None
+
+    def poll(self):
+        if not self.running:
+            return
+        pygame = self.pygame
+        try:
+            for event in pygame.event.get():
+                if event.type == pygame.JOYDEVICEADDED and self.joystick is None:
+                    self.joystick = pygame.joystick.Joystick(event.device_index)
+                    logger.info(f'Using controller {self.joystick.get_name()}')
+                elif event.type == pygame.JOYDEVICEREMOVED and self.joystick and \
+                        event.instance_id == self.joystick.get_instance_id():
+                    self.joystick = None
+                    self.on_axes(0, 0, 0)
+                elif event.type == pygame.JOYBUTTONDOWN and self.on_button and self.joystick and \
+                        event.instance_id == self.joystick.get_instance_id():
+                    self.on_button(event.button)
+
+            if self.joystick:
+                count = self.joystick.get_numaxes()
+                values = [self.joystick.get_axis(axis) if 0 <= axis < count else 0 for axis in self.axes]
+                self.on_axes(*[-value if invert else value for value, invert in zip(values, self.invert)])
+        except Exception:
+            logger.exception('Reading the controller failed')
+        self.root.after(self.poll_interval, self.poll)
+
+    def stop(self):
+        self.running = False
+        if self.pygame:
+            self.pygame.joystick.quit()
+            self.pygame.display.quit()
+            self.pygame = None
+            self.joystick = None
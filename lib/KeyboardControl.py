@@ -0,0 +1,132 @@
+PAN = 'pan'
+TILT = 'tilt'
+ZOOM = 'zoom'
+FAST = 'fast'
+
+KEYS = {'Left': (PAN, -1), 'a': (PAN, -1),
+        'Right': (PAN, 1), 'd': (PAN, 1),
+        'Up': (TILT, 1), 'w': (TILT, 1),
+        'Down': (TILT, -1), 's': (TILT, -1),
+        'plus': (ZOOM, 1), 'equal': (ZOOM, 1), 'KP_Add': (ZOOM, 1),
+        'minus': (ZOOM, -1), 'underscore': (ZOOM, -1), 'KP_Subtract': (ZOOM, -1),
+        'Shift_L': (FAST, 0), 'Shift_R': (FAST, 0),
+        }
+
+# Number keys recall the camera's preset buttons, 1 is the first and 0 the tenth
+PRESET_KEYS = {str((idx + 1) % 10): idx for idx in range(10)}
+
+
+class KeyboardControl:
+    """
+    Drives the focused camera from the keyboard: arrows or WASD move, + and - zoom, holding shift uses the fast
+    speeds and number keys recall presets.
+
+    Key auto-repeat is filtered so a held key is one press and one release whatever the platform does. Windows and
+    macOS repeat the press only, those are ignored while the key is held. X11 sends a release and a press for each
+    repeat, so releases wait release_delay milliseconds and are dropped if the same key is pressed again before then.
+    The camera is only sent a command when the combined velocity of the keys held changes.
+    """
+
+    def __init__(self, root, get_camera, release_delay=40):
+        self.root = root
+        self.get_camera = get_camera
+        self.release_delay = release_delay
+        self.held = set()
+        self.pending_releases = {}
+        self.camera = None
+        self.velocity = (0, 0, 0)
+        self.events = 0
+        self.commands = 0
+        root.bind('<KeyPress>', self.key_press)
+        root.bind('<KeyRelease>', self.key_release)
+        root.bind('<FocusOut>', self.focus_out)
+
+    def stats(self):
+        return {'events': self.events, 'commands': self.commands}
+
+    @staticmethod
+    def key(event):
+        return event.keysym.lower() if len(event.keysym) == 1 else event.keysym
+
+    def key_press(self, event):
+        self.events += 1
+        key = self.key(event)
+        if key not in KEYS and key not in PRESET_KEYS:
+            return
+        pending = self.pending_releases.pop(key, None)
+        if pending is not None:
+            # X11 auto-repeat, the key never went up
+            self.root.after_cancel(pending)
+            return
+        if key in self.held:
+            return
+        self.held.add(key)
+        if key in PRESET_KEYS:
+            self.recall_preset(PRESET_KEYS[key])
+        else:
+            self.update()
+
+    def key_release(self, event):
+        self.events += 1
+        key = self.key(event)
+        if key in self.held and key not in self.pending_releases:
+            self.pending_releases[key] = self.root.after(self.release_delay, self.released, key)
+
+    def released(self, key):
+        self.pending_releases.pop(key, None)
+        self.held.discard(key)
+        if key in KEYS:
+            self.update()
+
+    def focus_out(self, event):
+        # Key releases go elsewhere once another window has focus, stop rather than run on
+        self.root.after_idle(self.check_focus)
+
+    def check_focus(self):
+        try:
+            focused = self.root.focus_get()
+        except KeyError:
+            focused = None
+        if focused is None or focused.winfo_toplevel() is not self.root:
+            self.release_all()
+
+    def release_all(self):
+        for pending in self.pending_releases.values():
+            self.root.after_cancel(pending)
+        self.pending_releases = {}
+        self.held = set()
+        self.update()
+
+    def recall_preset(self, idx):
+        camera = self.get_camera()
+        if camera and camera.enabled and idx < len(camera.preset_tokens):
+            camera.focus_preview()
+            camera.preset_click(camera.preset_tokens[idx])
+
+    def update(self):
+        camera = self.get_camera()
+        if camera is not self.camera:
+            # Focus moved to another camera, the old one stops and the new one starts from still
+            if self.camera and any(self.velocity):
+                self.camera.stop_move(None)
+            self.camera = camera
+            self.velocity = (0, 0, 0)
+        if camera is None:
+            return
+
+        axes = {PAN: 0, TILT: 0, ZOOM: 0, FAST: 0}
+        for key in self.held:
+            if key in KEYS:
+                axis, direction = KEYS[key]
+                axes[axis] = min(max(axes[axis] + direction, -1), 1) if axis != FAST else 1
+        move_speed = camera.move_speed_fast if axes[FAST] else camera.move_speed_slow
+        zoom_speed = camera.zoom_speed_fast if axes[FAST] else camera.zoom_speed_slow
+        velocity = (axes[PAN] * move_speed / 100, axes[TILT] * move_speed / 100, axes[ZOOM] * zoom_speed / 100)
+        if velocity == self.velocity:
+            return
+        self.velocity = velocity
+        self.commands += 1
+        if any(velocity):
+            camera.set_velocity(*velocity)
+        else:
+            camera.stop_move(None)
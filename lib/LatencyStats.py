@@ -0,0 +1,175 @@
+import csv
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+
+# Histogram bucket bounds in seconds, 0.1 ms to about 2 minutes in steps of 2^(1/8) (~9%)
+BUCKETS = [0.0001 * 2 ** (idx / 8) for idx in range(162)]
+
+CALL = 'call'
+SOAP = 'soap'
+QUEUE = 'queue'
+UI = 'ui'
+TOUR = 'tour'
+
+LAYERS = {CALL: 'ONVIFControl method, SOAP round trip plus encoding and decoding',
+          SOAP: 'Request sent to reply parsed, network plus camera',
+          QUEUE: 'Waiting in the command queue behind other commands',
+          UI: 'Tk loop, callback delay and stalls',
+          TOUR: 'Preset tour steps, how late each step went out after it was due',
+          }
+
+
+def is_timeout(err):
+    # onvif wraps transport errors in ONVIFError with only the message kept
+    return 'timed out' in str(err).lower() or isinstance(err, TimeoutError)
+
+
+class OperationStats:
+    """Latency histogram and error counts for one operation"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, elapsed, err=None):
+        self.buckets[bisect_left(BUCKETS, elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        if err is not None:
+            self.errors += 1
+            if is_timeout(err):
+                self.timeouts += 1
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, in seconds"""
+        if not self.count:
+            return None
+        target = p / 100 * self.count
+        seen = 0
+        for idx, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                return min(BUCKETS[idx] if idx < len(BUCKETS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {'count': self.count,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'mean_ms': self.total / self.count * 1000 if self.count else None,
+                'p50_ms': self.milliseconds(self.percentile(50)),
+                'p95_ms': self.milliseconds(self.percentile(95)),
+                'p99_ms': self.milliseconds(self.percentile(99)),
+                'max_ms': self.max * 1000,
+                }
+
+    @staticmethod
+    def milliseconds(seconds):
+        return None if seconds is None else seconds * 1000
+
+
+class LatencyStats:
+    """
+    Latency of every camera operation, kept per camera, layer and operation. Recording is a lock and a bisect so it
+    can stay on all the time.
+
+    Layers separate where the time went. A slow soap time on GetSystemDateAndTime is the network, a slow soap time
+    on one operation only is the camera, a slow call with a fast soap time is encoding on our side and slow queue
+    or ui times are our own backlog.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+        self.started = time.time()
+
+    def record(self, camera, layer, operation, elapsed, err=None):
+        key = (camera, layer, operation)
+        with self.lock:
+            stats = self.operations.get(key)
+            if stats is None:
+                stats = self.operations[key] = OperationStats()
+            stats.record(elapsed, err)
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(camera=camera, layer=layer, operation=operation, **stats.summary())
+                    for (camera, layer, operation), stats in sorted(self.operations.items())]
+
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+            self.started = time.time()
+
+    def export_json(self, filename):
+        data = {'started': self.started, 'exported': time.time(), 'operations': self.snapshot()}
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def export_csv(self, filename):
+        rows = self.snapshot()
+        with open(filename, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['camera', 'layer', 'operation', 'count', 'errors', 'timeouts',
+                                                   'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def timed(operation):
+    """Record a method's latency under self.name in self.latency_stats"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception as err:
+                self.latency_stats.record(self.name, CALL, operation, time.perf_counter() - start, err)
+                raise
+            self.latency_stats.record(self.name, CALL, operation, time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorator
+
+
+class LatencyPlugin:
+    """
+    zeep plugin timing each SOAP operation from the request leaving zeep to the reply being parsed.
+    Requests that fail in the transport never reach ingress, those show up as errors on the call layer.
+    zeep only calls egress and ingress, not subclassing zeep.Plugin keeps zeep out of the GUI's startup imports.
+    """
+
+    def __init__(self, latency_stats, camera):
+        self.latency_stats = latency_stats
+        self.camera = camera
+        self.local = threading.local()
+
+    def egress(self, envelope, http_headers, operation, binding_options):
+        self.local.start = time.perf_counter()
+        return envelope, http_headers
+
+    def restart(self):
+        # For requests serialised ahead of time and sent later
+        self.local.start = time.perf_counter()
+
+    def ingress(self, envelope, http_headers, operation):
+        start = getattr(self.local, 'start', None)
+        if start is not None:
+            self.local.start = None
+            self.latency_stats.record(self.camera, SOAP, operation.name, time.perf_counter() - start)
+        return envelope, http_headers
+
+
+_shared_stats = LatencyStats()
+
+
+def get_latency_stats():
+    return _shared_stats
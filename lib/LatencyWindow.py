@@ -0,0 +1,102 @@
+import os
+from lib.pyinstaller_helper import resource_path
+from lib.LatencyStats import LAYERS, get_latency_stats
+from tkinter import Button, Label, Toplevel, Frame, filedialog
+from tkinter.ttk import Treeview
+
+COLUMNS = [('camera', 'Camera', 120),
+           ('layer', 'Layer', 60),
+           ('operation', 'Operation', 140),
+           ('count', 'Count', 60),
+           ('errors', 'Errors', 60),
+           ('timeouts', 'Timeouts', 60),
+           ('p50_ms', 'p50 ms', 70),
+           ('p95_ms', 'p95 ms', 70),
+           ('p99_ms', 'p99 ms', 70),
+           ('max_ms', 'Max ms', 70),
+           ]
+
+
+class LatencyWindow(Toplevel):
+    """Live table of LatencyStats, refreshed every second while open"""
+
+    def __init__(self, master, latency_stats=None, interval=1000):
+        super().__init__(master=master)
+        self.latency_stats = latency_stats or get_latency_stats()
+        self.interval = interval
+        self.after_id = None
+
+        self.title("Latency")
+        self.configure(background='white')
+        self.iconbitmap(resource_path(os.path.join('assets', 'favicon.ico')))
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        text = '\n'.join(f'{layer}: {description}' for layer, description in LAYERS.items())
+        self.intro = Label(self, text=text, background="white", anchor="w", justify="left")
+        self.intro.grid(row=0, column=0, padx=5, pady=5, sticky='W')
+
+        self.table = Treeview(self, columns=[column for column, _, _ in COLUMNS], show='headings', height=20)
+        for column, heading, width in COLUMNS:
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=width, anchor='w' if column in ('camera', 'layer', 'operation') else 'e')
+        self.table.grid(row=1, column=0, padx=5, pady=5, sticky='NSEW')
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.button_frame = Frame(self, background='white')
+        self.button_frame.grid(row=2, column=0, padx=5, pady=5, sticky='W')
+        Button(self.button_frame, text="Export JSON", command=self.export_json).grid(row=0, column=0, padx=5)
+        Button(self.button_frame, text="Export CSV", command=self.export_csv).grid(row=0, column=1, padx=5)
+        Button(self.button_frame, text="Reset", command=self.reset).grid(row=0, column=2, padx=5)
+
+        self.message = Label(self, text="", anchor="w", background="white")
+        self.message.grid(row=3, column=0, padx=5, sticky='W')
+
+        self.refresh()
+
+    def refresh(self):
+        rows = {(row['camera'], row['layer'], row['operation']): row for row in self.latency_stats.snapshot()}
+        existing = set(self.table.get_children())
+        for key, row in rows.items():
+            iid = '\x1f'.join(key)
+            values = [self.format(row[column]) for column, _, _ in COLUMNS]
+            if iid in existing:
+                self.table.item(iid, values=values)
+                existing.discard(iid)
+            else:
+                self.table.insert('', 'end', iid=iid, values=values)
+        if existing:
+            self.table.delete(*existing)
+        self.after_id = self.after(self.interval, self.refresh)
+
+    @staticmethod
+    def format(value):
+        if isinstance(value, float):
+            return f'{value:.1f}'
+        return '' if value is None else value
+
+    def export_json(self):
+        self.export('.json', self.latency_stats.export_json)
+
+    def export_csv(self):
+        self.export('.csv', self.latency_stats.export_csv)
+
+    def export(self, extension, save):
+        filename = filedialog.asksaveasfilename(parent=self, defaultextension=extension,
+                                                filetypes=[(extension[1:].upper(), f'*{extension}')])
+        if not filename:
+            return
+        try:
+            save(filename)
+            self.message.configure(text=f'Saved {filename}')
+        except OSError as err:
+            self.message.configure(text=f'Error saving: {err}')
+
+    def reset(self):
+        self.latency_stats.reset()
+        self.table.delete(*self.table.get_children())
+
+    def close(self):
+        if self.after_id:
+            self.after_cancel(self.after_id)
+        self.destroy()
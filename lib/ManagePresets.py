@@ -1,7 +1,8 @@
 import os
 from lib.pyinstaller_helper import resource_path
-from tkinter import Button, PhotoImage, Label, Toplevel, Entry, Frame, END
-from onvif.exceptions import ONVIFError
+from lib.AssetCache import get_asset_cache
+from lib.PresetList import PresetList
+from tkinter import Button, Label, Toplevel, Entry, Frame, StringVar, END
 
 
 class ManagePresets(Toplevel):
@@ -18,19 +19,19 @@ class ManagePresets(Toplevel):
         self.message = Label(self, text="", anchor="center", background="white")
         self.message.grid(row=0, column=0)
 
-        self.preset_frame = None
-        self.preset_labels = []
-        self.selected_preset_idx = -1
+        self.selected_token = None
         self.presets = []
-        self.preset_edit_buttons = []
+        self.current_preset = None
 
-        self.preset_save_image = PhotoImage(file=resource_path(os.path.join('assets', 'save.png')))
-        self.preset_edit_image = PhotoImage(file=resource_path(os.path.join('assets', 'edit.png')))
+        self.preset_save_image = get_asset_cache().photo('save.png', self.camera.ui_scale)
+        self.preset_edit_image = get_asset_cache().photo('edit.png', self.camera.ui_scale)
 
-        text = """Camera Controller can use 10 presets.
-To change a preset click the edit button
+        text = """To change a preset click the edit button
 then enter a new name. Clicking save will
-save the preset at the current camera location."""
+save the preset at the current camera location.
+Click New to add a preset, click a name to go there.
+Snapshot retakes the selected preset's picture
+from what the camera sees now."""
         self.intro = Label(self, text=text, background="white", anchor="w", justify="left")
         self.intro.grid(row=0, column=0, padx=0.1, pady=0.1, sticky='W')
 
@@ -44,12 +45,47 @@ save the preset at the current camera location."""
                                   width=20,
                                   background='white', border=0, command=self.save, state='disabled')
         self.save_button.grid(row=0,column=1, padx=5, pady=5)
+        self.new_button = Button(self.add_frame, text="New", background='white', command=self.new)
+        self.new_button.grid(row=0, column=2, padx=5, pady=5)
+        self.snapshot_button = Button(self.add_frame, text="Snapshot", background='white', command=self.snapshot,
+                                      state='disabled')
+        self.snapshot_button.grid(row=0, column=3, padx=5, pady=5)
+
+        self.filter_frame = Frame(self, background='white')
+        self.filter_frame.grid(row=2, column=0, padx=0.1, pady=0.1, sticky='W')
+        Label(self.filter_frame, text="Filter", background="white").grid(row=0, column=0, padx=5, pady=5)
+        self.filter_text = StringVar(self)
+        self.filter_text.trace_add('write', lambda *args: self.preset_list.set_filter(self.filter_text.get()))
+        self.filter_entry = Entry(self.filter_frame, background='white', textvariable=self.filter_text, width=30)
+        self.filter_entry.grid(row=0, column=1, padx=5, pady=5)
+
+        # Rows are reused while scrolling, opening the window costs the same however many presets the camera has
+        self.preset_list = PresetList(self, edit_image=self.preset_edit_image, on_edit=self.edit,
+                                      on_select=self.goto)
+        self.preset_list.grid(row=3, column=0, padx=0.1, pady=0.1, sticky='W')
 
         if not self.camera.enabled:
             self.name.configure(state='disabled')
+            self.new_button.configure(state='disabled')
+        else:
+            self.camera.ovnif.add_preset_listener(self.presets_changed)
+            self.camera.ovnif.status.add_listener(self.status_changed)
 
         self.reload()
 
+    def presets_changed(self, presets):
+        # Called from whichever thread changed the presets
+        self.camera.ui_queue.post(self.reload)
+
+    def status_changed(self, status):
+        if status['preset'] != self.current_preset:
+            self.camera.ui_queue.post(self.show_current)
+
+    def show_current(self):
+        token = self.camera.ovnif.status.snapshot()['preset'] if self.camera.ovnif else None
+        self.current_preset = token
+        self.preset_list.set_current(token)
+
     def name_validate(self, P):
         if P == '':
             self.save_button.configure(state='disabled')
@@ -59,58 +95,59 @@ save the preset at the current camera location."""
         return True
 
     def reload(self):
+        # Called again after every add and remove, only the rows that show a changed preset are redrawn
         try:
             if self.camera.enabled is False:
                 raise Exception("Camera not started")
 
             self.presets = self.camera.ovnif.preset_list()
-            if self.preset_frame:
-                self.preset_frame.destroy()
-                self.preset_labels = []
-                self.preset_edit_buttons = []
-
-            self.preset_frame = Frame(self, background='white')
-            self.preset_frame.grid(row=2, column=0, padx=0.1, pady=0.1, sticky='W')
-            start_row_offset = 2
-            max_presets = 10
-            for idx in range(max_presets):
-                row = idx + start_row_offset
-                name = self.presets[idx]['Name'] if idx <= len(self.presets) else f"Preset {idx + 1}"
-
-                preset_edit_button = Button(self.preset_frame, image=self.preset_edit_image, height=20,
-                                            width=20,
-                                            background='white', border=0,
-                                            command=lambda idx=idx: self.edit(idx))
-                preset_edit_button.grid(row=row, column=0, padx=0, pady=0)
-
-                preset_label = Label(self.preset_frame, text=name, background="white", anchor="w", width=15)
-                preset_label.grid(row=row, column=1, padx=0, pady=0, sticky="w")
-
-                self.preset_labels.append(preset_label)
-                self.preset_edit_buttons.append(preset_edit_button)
+            self.preset_list.set_presets(self.presets)
+            self.show_current()
 
         except Exception:
             self.set_message('Camera not started')
 
-    def edit(self, idx):
-        self.selected_preset_idx = idx
-        name = self.presets[idx]['Name'] if idx <= len(self.presets) else f"Preset {idx + 1}"
+    def edit(self, preset):
+        self.selected_token = preset['token']
+        self.snapshot_button.configure(state='normal' if self.camera.enabled else 'disabled')
         self.name.delete(0, END)
-        self.name.insert(0, name)
+        self.name.insert(0, preset['Name'] or preset['token'])
+
+    def new(self):
+        self.selected_token = None
+        self.snapshot_button.configure(state='disabled')
+        self.name.delete(0, END)
+        self.name.insert(0, f"Preset {len(self.presets) + 1}")
+
+    def goto(self, preset):
+        if self.camera.enabled:
+            self.camera.preset_click(preset['token'])
 
     def save(self):
+        from onvif.exceptions import ONVIFError
         try:
             name = self.name.get()
-            token = self.presets[self.selected_preset_idx]['token'] if self.selected_preset_idx <= len(self.presets) else f""
-            self.camera.preset_add(name, token)
-            self.reload()
+            # An empty token makes the camera add a new preset
+            self.selected_token = self.camera.preset_add(name, self.selected_token or '')
         except ONVIFError as err:
             self.set_message(f"Error adding preset: {err}")
+            return
+        # The camera is where the preset was just saved, its picture is taken in the background
+        self.snapshot()
+
+    def snapshot(self):
+        if self.selected_token:
+            self.camera.capture_thumbnail(self.selected_token)
+            self.snapshot_button.configure(state='normal')
 
     def set_message(self, message):
         self.message.configure(text=message)
         self.update()
 
     def close(self):
-        self.close_cb()
+        if self.camera.ovnif:
+            self.camera.ovnif.remove_preset_listener(self.presets_changed)
+            self.camera.ovnif.status.remove_listener(self.status_changed)
+        if self.close_cb:
+            self.close_cb()
         self.destroy()
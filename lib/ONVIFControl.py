@@ -1,28 +1,97 @@
-from onvif import ONVIFCamera
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.auth import HTTPBasicAuth, HTTPDigestAuth
+from zeep.wsdl.utils import etree_to_string
+from lib.CapabilityCache import get_capability_cache
+from lib.EnvelopeTemplate import DURATION, FLOAT, EnvelopeTemplate
+from lib.EventMonitor import PULLPOINT_NS, EventMonitor
+from lib.LatencyStats import CALL, LatencyPlugin, get_latency_stats, timed
+from lib.PTZStatus import PTZStatus
+from lib.TransportPool import get_transport_pool
+from lib.WSDLCache import CachedONVIFCamera
+
+logger = logging.getLogger(__name__)
+
+TT = 'http://www.onvif.org/ver10/schema'
+TPTZ = 'http://www.onvif.org/ver20/ptz/wsdl'
+
+# GetSystemDateAndTime needs no credentials, cameras answer it before login
+PROBE = (b'<?xml version="1.0" encoding="UTF-8"?>'
+         b'<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body>'
+         b'<GetSystemDateAndTime xmlns="http://www.onvif.org/ver10/device/wsdl"/></s:Body></s:Envelope>')
 
 
 class ONVIFControl:
 
-    def __init__(self, host, port, username, password):
+    def __init__(self, host, port, username, password, timeout=5, read_timeout=5, pool_size=2, preset_ttl=0,
+                 capability_cache=None, name=None, latency_stats=None):
         self.host = host
         self.port = port
+        self.name = name or f'{host}:{port}'
         self.username = username
         self.password = password
+        self.timeout = timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.transport = None
+        self.devicemgmt = None
+        self.media = None
         self.ptz = None
         self.imaging = None
+        self.device = None
+        self.xaddrs = {}
+        self.profile_token = None
+        self.video_token = None
+        self.from_cache = False
+        self.capability_cache = capability_cache or get_capability_cache()
+        self.latency_stats = latency_stats or get_latency_stats()
+        self.latency_plugin = LatencyPlugin(self.latency_stats, self.name)
+        self.preset_ttl = preset_ttl
+        self.presets = None
+        self.presets_time = 0
+        self.presets_lock = threading.RLock()
+        self.preset_listeners = []
         self.XMAX = 1
         self.XMIN = -1
         self.YMAX = 1
         self.YMIN = -1
         self.ZMAX = 1
         self.ZMIN = -1
+        # Shortest and longest ContinuousMove Timeout the camera accepts, in seconds
+        self.timeout_range = None
+        self.status = PTZStatus()
+        self.event_monitor = None
+        # Precompiled ContinuousMove and Stop requests, keyed by (operation, with timeout)
+        self.templates = {}
+        self.snapshot_uri = None
 
+    @timed('setup')
     def setup(self):
-        mycam = ONVIFCamera(self.host, self.port, self.username, self.password)
-        media = mycam.create_media_service()
-        self.ptz = mycam.create_ptz_service()
-        self.imaging = mycam.create_imaging_service()
-        media_profile = media.GetProfiles()[0]
+        if self.transport is None:
+            self.transport = get_transport_pool().acquire(self.host, self.port, pool_size=self.pool_size,
+                                                          connect_timeout=self.timeout,
+                                                          read_timeout=self.read_timeout)
+
+        # Start from the capabilities saved on a previous run, revalidate() checks them against the camera
+        cached = self.capability_cache.get(self.host, self.port)
+        if cached:
+            try:
+                self.load_capabilities(cached)
+                self.from_cache = True
+                return
+            except Exception:
+                self.capability_cache.remove(self.host, self.port)
+
+        self.refresh()
+
+    def refresh(self):
+        mycam = CachedONVIFCamera(self.host, self.port, self.username, self.password, transport=self.transport,
+                                  plugins=[self.latency_plugin])
+        self.create_services(mycam)
+        media_profile = self.media.GetProfiles()[0]
         request = self.ptz.create_type('GetConfigurationOptions')
         request.ConfigurationToken = media_profile.PTZConfiguration.token
         self.video_token = media_profile.VideoSourceConfiguration.SourceToken
@@ -35,57 +104,356 @@ class ONVIFControl:
         self.YMIN = ptz_configuration_options.Spaces.ContinuousPanTiltVelocitySpace[0].YRange.Min
         self.ZMIN = ptz_configuration_options.Spaces.ContinuousZoomVelocitySpace[0].XRange.Min
         self.ZMAX = ptz_configuration_options.Spaces.ContinuousZoomVelocitySpace[0].XRange.Max
+        timeout_range = ptz_configuration_options.PTZTimeout
+        self.timeout_range = None
+        if timeout_range and timeout_range.Min is not None and timeout_range.Max is not None:
+            self.timeout_range = [timeout_range.Min.total_seconds(), timeout_range.Max.total_seconds()]
+        self.device = self.device_information()
+        self.xaddrs = {ns: xaddr for ns, xaddr in mycam.xaddrs.items() if ns != PULLPOINT_NS}
+        self.from_cache = False
+        self.capability_cache.put(self.host, self.port, self.capabilities())
+        self.compile_templates()
+        self.prewarm()
 
-    def move(self, x_speed, y_speed):
-        request = {'ProfileToken': self.profile_token,
-                   'Velocity': {'PanTilt': {'x': x_speed, 'y': y_speed}},
-                   }
+    def create_services(self, mycam):
+        self.devicemgmt = mycam.devicemgmt
+        self.media = mycam.create_media_service()
+        self.ptz = mycam.create_ptz_service()
+        self.imaging = mycam.create_imaging_service()
+
+    def capabilities(self):
+        return {'device': self.device,
+                'xaddrs': self.xaddrs,
+                'profile_token': self.profile_token,
+                'video_token': self.video_token,
+                'ranges': [self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.ZMIN, self.ZMAX],
+                'timeout_range': self.timeout_range,
+                }
+
+    def load_capabilities(self, capabilities):
+        mycam = CachedONVIFCamera(self.host, self.port, self.username, self.password, transport=self.transport,
+                                  xaddrs=capabilities['xaddrs'], plugins=[self.latency_plugin])
+        self.create_services(mycam)
+        self.device = capabilities['device']
+        self.xaddrs = capabilities['xaddrs']
+        self.profile_token = capabilities['profile_token']
+        self.video_token = capabilities['video_token']
+        self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.ZMIN, self.ZMAX = capabilities['ranges']
+        self.timeout_range = capabilities.get('timeout_range')
+        self.compile_templates()
+
+    def compile_templates(self):
+        """
+        Serialise the move, zoom, velocity and stop requests for this profile once, each command then only fills in
+        its speeds, timeout and security token. Commands go through zeep as before if this fails.
+        """
+        pan_tilt = {'x': (f'{{{TT}}}PanTilt', 'x', FLOAT), 'y': (f'{{{TT}}}PanTilt', 'y', FLOAT)}
+        zoom = {'zoom': (f'{{{TT}}}Zoom', 'x', FLOAT)}
+        timeout = {'timeout': (f'{{{TPTZ}}}Timeout', None, DURATION)}
+        velocities = {'move': ({'PanTilt': {'x': 0.5, 'y': 0.5}}, pan_tilt),
+                      'zoom': ({'Zoom': {'x': 0.5}}, zoom),
+                      'velocity': ({'PanTilt': {'x': 0.5, 'y': 0.5}, 'Zoom': {'x': 0.5}}, dict(pan_tilt, **zoom)),
+                      }
+        templates = {}
+        try:
+            for name, (velocity, fields) in velocities.items():
+                request = {'ProfileToken': self.profile_token, 'Velocity': velocity}
+                templates[name, False] = EnvelopeTemplate(self.ptz, 'ContinuousMove', request, fields)
+                request = dict(request, Timeout=datetime.timedelta(seconds=1))
+                templates[name, True] = EnvelopeTemplate(self.ptz, 'ContinuousMove', request, dict(fields, **timeout))
+            templates['stop', False] = EnvelopeTemplate(self.ptz, 'Stop', {'ProfileToken': self.profile_token})
+        except Exception as err:
+            logger.warning(f'{self.name}: sending commands through zeep, the requests could not be precompiled: {err}')
+            templates = {}
+        self.templates = templates
+
+    def send_template(self, template, values):
+        self.latency_plugin.restart()
+        template.send(values)
+
+    def device_information(self):
+        info = self.devicemgmt.GetDeviceInformation()
+        return {'manufacturer': info.Manufacturer,
+                'model': info.Model,
+                'firmware': info.FirmwareVersion,
+                'serial': info.SerialNumber,
+                }
+
+    @timed('revalidate')
+    def revalidate(self):
+        """
+        Check cached capabilities against the camera with a single GetDeviceInformation call, refreshing them if the
+        camera has been replaced or its firmware changed. Returns True if the capabilities were refreshed.
+        """
+        if not self.from_cache:
+            return False
+        if self.device_information() == self.device:
+            self.from_cache = False
+            self.transport.mark_warm()
+            return False
+        self.refresh()
+        return True
+
+    def prewarm(self):
+        # Open the pooled connections now so move/stop/zoom never wait on a TCP handshake
+        # Failures are ignored here, the camera has just answered the setup calls
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            for future in [executor.submit(self.keepalive) for _ in range(self.pool_size)]:
+                future.exception()
+        self.transport.mark_warm()
+
+    @timed('keepalive')
+    def keepalive(self):
+        # GetSystemDateAndTime is cheap and answered by every ONVIF device
+        self.devicemgmt.GetSystemDateAndTime()
+
+    @timed('probe')
+    def probe(self, timeout=1):
+        """
+        Health check for the ConnectionSupervisor. A fixed GetSystemDateAndTime request is posted on the pooled
+        connections with its own short timeout, without zeep building or parsing anything.
+        """
+        response = self.transport.session.post(self.devicemgmt.xaddr, data=PROBE, timeout=timeout,
+                                               headers={'Content-Type': 'application/soap+xml; charset=utf-8'})
+        response.raise_for_status()
+        if b'SystemDateAndTime' not in response.content:
+            raise Exception(f'{self.name} sent an unexpected answer')
+
+    @timed('snapshot')
+    def snapshot(self):
+        """JPEG of what the camera sees now, from the media service's snapshot URI"""
+        if self.snapshot_uri is None:
+            self.snapshot_uri = self.media.GetSnapshotUri({'ProfileToken': self.profile_token}).Uri
+        timeout = (self.timeout, self.read_timeout)
+        response = self.transport.session.get(self.snapshot_uri, timeout=timeout,
+                                              auth=HTTPDigestAuth(self.username, self.password))
+        if response.status_code == 401:
+            # Cameras that only take basic authentication for snapshots
+            response = self.transport.session.get(self.snapshot_uri, timeout=timeout,
+                                                  auth=HTTPBasicAuth(self.username, self.password))
+        response.raise_for_status()
+        return response.content
+
+    def connection_stats(self):
+        return self.transport.stats() if self.transport else {}
+
+    def start_events(self, events=True, pull_timeout=10, poll_interval=0.5, idle_interval=5):
+        """Follow the camera's status in self.status, from PullPoint events or by polling without them"""
+        if self.event_monitor is None:
+            self.event_monitor = EventMonitor(self, self.status, events=events, pull_timeout=pull_timeout,
+                                              poll_interval=poll_interval, idle_interval=idle_interval)
+            self.event_monitor.start()
+
+    def event_stats(self):
+        return self.event_monitor.stats() if self.event_monitor else {}
 
-        self.ptz.ContinuousMove(request)
+    def commanded(self, **status):
+        self.status.command(**status)
+        if self.event_monitor:
+            self.event_monitor.wake(refresh=True)
 
+    @timed('status')
+    def ptz_status(self):
+        status = self.ptz.GetStatus({'ProfileToken': self.profile_token})
+        move_status = status.MoveStatus
+        moving = bool(move_status) and 'MOVING' in (move_status.PanTilt, move_status.Zoom)
+        position = None
+        if status.Position:
+            pan_tilt = status.Position.PanTilt
+            zoom = status.Position.Zoom
+            position = (pan_tilt.x if pan_tilt else None, pan_tilt.y if pan_tilt else None, zoom.x if zoom else None)
+        return {'moving': moving, 'position': position}
+
+    def close(self):
+        if self.event_monitor is not None:
+            self.event_monitor.stop()
+            self.event_monitor = None
+        if self.transport is not None:
+            get_transport_pool().release(self.host, self.port)
+            self.transport = None
+
+    @timed('move')
+    def move(self, x_speed, y_speed, timeout=None):
+        """With a timeout the camera stops by itself after that many seconds unless the move is sent again"""
+        self.continuous_move('move', {'PanTilt': {'x': x_speed, 'y': y_speed}}, {'x': x_speed, 'y': y_speed},
+                             timeout)
+
+    @timed('stop')
     def stop(self):
-        self.ptz.Stop({'ProfileToken': self.profile_token})
+        template = self.templates.get(('stop', False))
+        if template:
+            self.send_template(template, {})
+        else:
+            self.ptz.Stop({'ProfileToken': self.profile_token})
+        self.commanded(moving=False, target=None)
 
-    def zoom(self, speed):
-        request = {'ProfileToken': self.profile_token,
-                   'Velocity': {'Zoom': {'x': speed}},
-                   }
-        self.ptz.ContinuousMove(request)
+    @timed('zoom')
+    def zoom(self, speed, timeout=None):
+        self.continuous_move('zoom', {'Zoom': {'x': speed}}, {'zoom': speed}, timeout)
+
+    @timed('velocity')
+    def velocity(self, x_speed, y_speed, zoom_speed, timeout=None):
+        """Pan, tilt and zoom in one request, for analog input that moves all three at once"""
+        self.continuous_move('velocity', {'PanTilt': {'x': x_speed, 'y': y_speed}, 'Zoom': {'x': zoom_speed}},
+                             {'x': x_speed, 'y': y_speed, 'zoom': zoom_speed}, timeout)
+
+    def continuous_move(self, name, velocity, values, timeout):
+        if timeout:
+            values['timeout'] = self.move_timeout(timeout)
+        template = self.templates.get((name, bool(timeout)))
+        if template:
+            self.send_template(template, values)
+        else:
+            request = {'ProfileToken': self.profile_token, 'Velocity': velocity}
+            if timeout:
+                request['Timeout'] = values['timeout']
+            self.ptz.ContinuousMove(request)
+        self.commanded(moving=True, preset=None, target=None)
 
+    def move_timeout(self, timeout):
+        if self.timeout_range:
+            timeout = min(max(timeout, self.timeout_range[0]), self.timeout_range[1])
+        return datetime.timedelta(seconds=timeout)
+
+    @timed('focus')
     def focus(self, speed):
         request = {'VideoSourceToken': self.video_token,
                    'Focus': {'Continuous': {'Speed': speed}},
                    }
         self.imaging.Move(request)
 
+    @timed('auto_focus')
     def auto_focus(self):
         request = {'VideoSourceToken': self.video_token,
                    'ImagingSettings': {'Focus': {'AutoFocusMode': 'AUTO'}},
                    }
         self.imaging.SetImagingSettings(request)
 
+    @timed('manual_focus')
     def manual_focus(self):
         request = {'VideoSourceToken': self.video_token,
                    'ImagingSettings': {'Focus': {'AutoFocusMode': 'MANUAL'}},
                    }
         self.imaging.SetImagingSettings(request)
 
-    def preset_list(self):
+    def preset_list(self, refresh=False):
+        """
+        Presets are fetched once and then served from memory. They are fetched again when refresh is set or when
+        they are older than preset_ttl seconds (0 keeps them until changed through this class).
+        """
+        with self.presets_lock:
+            expired = self.preset_ttl and time.monotonic() - self.presets_time > self.preset_ttl
+            if self.presets is None or refresh or expired:
+                presets = self.fetch_presets()
+                changed = presets != self.presets
+                self.presets = presets
+                self.presets_time = time.monotonic()
+                if changed:
+                    self.notify_presets()
+            return list(self.presets)
+
+    @timed('preset_list')
+    def fetch_presets(self):
         request = {'ProfileToken': self.profile_token}
-        return self.ptz.GetPresets(request)
+        return [{'token': preset['token'], 'Name': preset['Name'], 'PTZPosition': preset['PTZPosition']}
+                for preset in self.ptz.GetPresets(request)]
+
+    def add_preset_listener(self, callback):
+        """callback(presets) is called whenever the preset list changes, from the thread that changed it"""
+        with self.presets_lock:
+            if callback not in self.preset_listeners:
+                self.preset_listeners.append(callback)
 
-    def preset_goto(self, preset_id):
+    def remove_preset_listener(self, callback):
+        with self.presets_lock:
+            if callback in self.preset_listeners:
+                self.preset_listeners.remove(callback)
+
+    def notify_presets(self):
+        presets = list(self.presets)
+        for callback in list(self.preset_listeners):
+            callback(presets)
+
+    @timed('preset_goto')
+    def preset_goto(self, preset_id, speed=None):
+        """speed is 0 to 1 of the camera's fastest preset move, None leaves it to the camera"""
         request = {'ProfileToken': self.profile_token,
                    'PresetToken': preset_id,
                    }
+        if speed is not None:
+            request['Speed'] = {'PanTilt': {'x': speed, 'y': speed}, 'Zoom': {'x': speed}}
         self.ptz.GotoPreset(request)
+        self.commanded(moving=True, preset=None, target=str(preset_id))
 
+    def prepare_preset_goto(self, preset_id):
+        """
+        Build and serialise a GotoPreset request now and return a function that only sends it. Used when several
+        cameras must receive a command at the same moment, the send is then just the HTTP round trip.
+        """
+        request = {'ProfileToken': self.profile_token,
+                   'PresetToken': preset_id,
+                   }
+        send = self.prepare(self.ptz, 'GotoPreset', request, 'preset_goto')
+
+        def goto():
+            result = send()
+            self.commanded(moving=True, preset=None, target=str(preset_id))
+            return result
+        return goto
+
+    def prepare(self, service, operation, request, name):
+        client = service.zeep_client
+        binding = service.ws_client._binding
+        options = service.ws_client._binding_options
+        envelope, headers = binding._create(operation, (), request, client=client, options=options)
+        message = etree_to_string(envelope)
+
+        def send():
+            start = time.perf_counter()
+            self.latency_plugin.restart()
+            try:
+                response = client.transport.post(options['address'], message, headers)
+                result = binding.process_reply(client, binding.get(operation), response)
+            except Exception as err:
+                self.latency_stats.record(self.name, CALL, name, time.perf_counter() - start, err)
+                raise
+            self.latency_stats.record(self.name, CALL, name, time.perf_counter() - start)
+            return result
+        return send
+
+    @timed('preset_add')
     def preset_add(self, name, preset_token):
         request = {'ProfileToken': self.profile_token,
                    'PresetName': name,
                    'PresetToken': preset_token,
                    }
-        self.ptz.SetPreset(request)
+        token = self.ptz.SetPreset(request) or preset_token
+
+        with self.presets_lock:
+            if self.presets is None:
+                return token
+            for idx, preset in enumerate(self.presets):
+                if preset['token'] == token:
+                    # SetPreset saved the camera's current position over the old one, which isn't known here
+                    self.presets[idx] = dict(preset, Name=name, PTZPosition=None)
+                    break
+            else:
+                self.presets.append({'token': token, 'Name': name, 'PTZPosition': None})
+            self.notify_presets()
+        return token
+
+    @timed('preset_remove')
+    def preset_remove(self, preset_token):
+        request = {'ProfileToken': self.profile_token,
+                   'PresetToken': preset_token,
+                   }
+        self.ptz.RemovePreset(request)
+
+        with self.presets_lock:
+            if self.presets is None:
+                return
+            self.presets = [preset for preset in self.presets if preset['token'] != preset_token]
+            self.notify_presets()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,564 @@
+import argparse
+import datetime
+import io
+import logging
+import random
+import socket
+import struct
+import threading
+import time
+import uuid
+import isodate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lxml import etree
+from lib.WSDLCache import get_wsdl_cache
+
+logger = logging.getLogger(__name__)
+
+SOAP_ENV = 'http://www.w3.org/2003/05/soap-envelope'
+
+# path: (wsdl file, binding)
+SERVICES = {
+    '/onvif/device_service': ('devicemgmt.wsdl', '{http://www.onvif.org/ver10/device/wsdl}DeviceBinding'),
+    '/onvif/media_service': ('media.wsdl', '{http://www.onvif.org/ver10/media/wsdl}MediaBinding'),
+    '/onvif/ptz_service': ('ptz.wsdl', '{http://www.onvif.org/ver20/ptz/wsdl}PTZBinding'),
+    '/onvif/imaging_service': ('imaging.wsdl', '{http://www.onvif.org/ver20/imaging/wsdl}ImagingBinding'),
+    '/onvif/event_service': ('events.wsdl', '{http://www.onvif.org/ver10/events/wsdl}EventBinding'),
+}
+
+# JPEG snapshots, see GetSnapshotUri
+SNAPSHOT_PATH = '/onvif/snapshot'
+
+# PullPoint subscriptions are created at PULLPOINT_PATH<id> and answer both of these bindings
+PULLPOINT_PATH = '/onvif/pullpoint/'
+PULLPOINT_BINDINGS = ('{http://www.onvif.org/ver10/events/wsdl}PullPointSubscriptionBinding',
+                      '{http://www.onvif.org/ver10/events/wsdl}SubscriptionManagerBinding')
+TT = 'http://www.onvif.org/ver10/schema'
+WSNT = 'http://docs.oasis-open.org/wsn/b-2'
+TOPIC_DIALECT = 'http://www.onvif.org/ver10/tev/topicExpression/ConcreteSet'
+
+FAULT = f"""<?xml version="1.0" encoding="UTF-8"?>
+<env:Envelope xmlns:env="{SOAP_ENV}" xmlns:ter="http://www.onvif.org/ver10/error">
+<env:Body><env:Fault><env:Code><env:Value>env:Sender</env:Value>
+<env:Subcode><env:Value>ter:{{code}}</env:Value></env:Subcode></env:Code>
+<env:Reason><env:Text xml:lang="en">{{reason}}</env:Text></env:Reason></env:Fault></env:Body></env:Envelope>"""
+
+PROBE_MATCHES = """<?xml version="1.0" encoding="UTF-8"?>
+<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"
+ xmlns:a="http://schemas.xmlsoap.org/ws/2004/08/addressing"
+ xmlns:d="http://schemas.xmlsoap.org/ws/2005/04/discovery"
+ xmlns:dn="http://www.onvif.org/ver10/network/wsdl">
+<s:Header><a:MessageID>uuid:{message_id}</a:MessageID><a:RelatesTo>{relates_to}</a:RelatesTo>
+<a:To>http://schemas.xmlsoap.org/ws/2004/08/addressing/role/anonymous</a:To>
+<a:Action>http://schemas.xmlsoap.org/ws/2005/04/discovery/ProbeMatches</a:Action></s:Header>
+<s:Body><d:ProbeMatches><d:ProbeMatch>
+<a:EndpointReference><a:Address>urn:uuid:{endpoint}</a:Address></a:EndpointReference>
+<d:Types>dn:NetworkVideoTransmitter</d:Types>
+<d:Scopes>onvif://www.onvif.org/type/ptz onvif://www.onvif.org/name/{name}</d:Scopes>
+<d:XAddrs>{xaddr}</d:XAddrs><d:MetadataVersion>1</d:MetadataVersion>
+</d:ProbeMatch></d:ProbeMatches></s:Body></s:Envelope>"""
+
+
+class SimulatedCamera:
+    """
+    A stand-in ONVIF PTZ camera on a local port. Requests are parsed and responses built from the bundled WSDLs, so
+    what the simulator accepts and returns follows the same schema a real camera does.
+
+    latency and jitter (seconds) are added to every response, and loss is the probability that a request is dropped
+    without a response. The camera keeps a pan/tilt/zoom position that follows the velocities it is sent, including
+    the Timeout on ContinuousMove, so overshoot can be measured.
+
+    With discovery_port set the camera also answers WS-Discovery probes sent to that UDP port, and with multicast
+    set it joins the WS-Discovery multicast group as well.
+
+    With events set the camera offers PullPoint subscriptions and raises the PTZPresets events. Going to a preset
+    takes preset_travel seconds, between the Invoked and Reached events, longer when GotoPreset asks for less than
+    full speed.
+
+    Snapshots, needing Pillow, are plain 1080p JPEGs in a colour that follows the position.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=0, loss=0, presets=10, serial='SIM0001',
+                 firmware='1.0', wsdl_cache=None, discovery_port=None, multicast=False, name='Simulator',
+                 events=True, preset_travel=0.5):
+        self.host = host
+        self.name = name
+        self.endpoint = uuid.uuid4()
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.serial = serial
+        self.firmware = firmware
+        self.wsdl_cache = wsdl_cache or get_wsdl_cache()
+        self.lock = threading.RLock()
+        self.random = random.Random()
+        self.position = [0.0, 0.0, 0.0]
+        self.velocity = [0.0, 0.0, 0.0]
+        self.move_time = time.monotonic()
+        self.move_deadline = None
+        self.presets = {str(idx + 1): {'Name': f'Preset {idx + 1}', 'position': [0.0, 0.0, 0.0]}
+                        for idx in range(presets)}
+        self.next_preset = presets + 1
+        self.preset_travel = preset_travel
+        self.current_preset = None
+        self.preset_arrival = None
+        self.requests = {}
+        self.dropped = 0
+        self.events = events
+        self.bindings = {path: [self.wsdl_cache.document(wsdl_file).bindings[binding]]
+                         for path, (wsdl_file, binding) in SERVICES.items()
+                         if events or wsdl_file != 'events.wsdl'}
+        self.pullpoint_bindings = [self.wsdl_cache.document('events.wsdl').bindings[binding]
+                                   for binding in PULLPOINT_BINDINGS]
+        self.subscriptions = {}
+        self.next_subscription = 1
+        self.events_changed = threading.Condition(self.lock)
+        self.local = threading.local()
+
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+        self.discovery_socket = None
+        if discovery_port is not None:
+            self.discovery_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if multicast:
+                self.discovery_socket.bind(('', discovery_port))
+                membership = struct.pack('4s4s', socket.inet_aton('239.255.255.250'), socket.inet_aton(host))
+                self.discovery_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            else:
+                self.discovery_socket.bind((host, discovery_port))
+
+    def handler_class(self):
+        camera = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body are written separately, don't let Nagle hold the body back
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                response = camera.handle(self.path, body)
+                if response is None:
+                    self.close_connection = True
+                    return
+                status, content = response
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                if self.path != SNAPSHOT_PATH:
+                    self.send_error(404)
+                    return
+                content = camera.snapshot()
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @property
+    def address(self):
+        return f'http://{self.host}:{self.port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f'simulator-{self.port}', daemon=True)
+        self.thread.start()
+        if self.discovery_socket:
+            threading.Thread(target=self.answer_probes, name=f'simulator-discovery-{self.port}', daemon=True).start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            # Let pending PullMessages return rather than hold their connections open
+            self.subscriptions = {}
+            self.events_changed.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        if self.discovery_socket:
+            self.discovery_socket.close()
+
+    def answer_probes(self):
+        while True:
+            try:
+                data, address = self.discovery_socket.recvfrom(65535)
+            except OSError:
+                return
+            try:
+                envelope = etree.fromstring(data)
+                message_id = envelope.findtext('{*}Header/{*}MessageID')
+                if envelope.find('{*}Body/{*}Probe') is None or not message_id:
+                    continue
+            except etree.XMLSyntaxError:
+                continue
+            reply = PROBE_MATCHES.format(message_id=uuid.uuid4(), relates_to=message_id, endpoint=self.endpoint,
+                                         name=self.name.replace(' ', '_'),
+                                         xaddr=f'{self.address}/onvif/device_service')
+            try:
+                self.discovery_socket.sendto(reply.encode('utf-8'), address)
+            except OSError:
+                pass
+
+    def handle(self, path, body):
+        if self.loss and self.random.random() < self.loss:
+            with self.lock:
+                self.dropped += 1
+            return None
+
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        bindings = self.bindings.get(path)
+        if bindings is None and self.events and path.startswith(PULLPOINT_PATH):
+            bindings = self.pullpoint_bindings
+        if bindings is None:
+            return 404, b''
+
+        try:
+            envelope = etree.fromstring(body)
+            request = envelope.find(f'{{{SOAP_ENV}}}Body')[0]
+            name = etree.QName(request).localname
+            operation = self.operation(bindings, name)
+        except Exception:
+            return 400, self.fault('InvalidArgs', 'Malformed request')
+
+        handler = getattr(self, f'on_{name}', None)
+        if handler is None:
+            return 400, self.fault('ActionNotSupported', f'{name} is not supported by the simulator')
+
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+            self.local.path = path
+            self.local.topics = []
+            try:
+                result = handler(operation.input.deserialize(envelope))
+            except KeyError as err:
+                return 400, self.fault('InvalidArgVal', f'Unknown token {err}')
+
+        message = operation.output.serialize(**(result or {}))
+        # zeep can't write the mixed content of a notification Topic, the topic text is filled in here
+        for element, topic in zip(message.content.iter(f'{{{WSNT}}}Topic'), self.local.topics):
+            element.text = topic
+        return 200, etree.tostring(message.content, xml_declaration=True, encoding='utf-8')
+
+    @staticmethod
+    def operation(bindings, name):
+        for binding in bindings:
+            if name in binding._operations:
+                return binding.get(name)
+        raise ValueError(f'Unknown operation {name}')
+
+    @staticmethod
+    def fault(code, reason):
+        return FAULT.format(code=code, reason=reason).encode()
+
+    # Motion model
+
+    def update_position(self):
+        now = time.monotonic()
+        until = min(now, self.move_deadline) if self.move_deadline else now
+        elapsed = max(0, until - self.move_time)
+        limits = [(-1, 1), (-1, 1), (0, 1)]
+        for axis in range(3):
+            low, high = limits[axis]
+            self.position[axis] = min(high, max(low, self.position[axis] + self.velocity[axis] * elapsed))
+        self.move_time = now
+        if self.move_deadline and now >= self.move_deadline:
+            self.velocity = [0.0, 0.0, 0.0]
+            self.move_deadline = None
+
+    def moving(self):
+        with self.lock:
+            self.update_position()
+            return any(self.velocity)
+
+    def ptz_position(self):
+        with self.lock:
+            self.update_position()
+            return list(self.position)
+
+    def leave_preset(self):
+        if self.preset_arrival:
+            self.emit('Aborted', self.preset_arrival[0])
+        elif self.current_preset:
+            self.emit('Left', self.current_preset)
+        self.preset_arrival = None
+        self.current_preset = None
+
+    def arrive(self, arrival):
+        with self.lock:
+            if self.preset_arrival is not arrival:
+                return
+            self.preset_arrival = None
+            self.current_preset = arrival[0]
+            self.emit('Reached', self.current_preset)
+
+    # Events
+
+    def emit(self, event, token):
+        now = time.monotonic()
+        self.subscriptions = {id: subscription for id, subscription in self.subscriptions.items()
+                              if subscription['expires'] > now}
+        for subscription in self.subscriptions.values():
+            subscription['messages'].append((event, token, datetime.datetime.utcnow()))
+        self.events_changed.notify_all()
+
+    @staticmethod
+    def notification(event, token, utc_time):
+        message = etree.Element(f'{{{TT}}}Message', nsmap={'tt': TT},
+                                UtcTime=utc_time.isoformat(timespec='milliseconds') + 'Z', PropertyOperation='Changed')
+        source = etree.SubElement(message, f'{{{TT}}}Source')
+        etree.SubElement(source, f'{{{TT}}}SimpleItem', Name='PTZConfigurationToken', Value='ptz_config')
+        data = etree.SubElement(message, f'{{{TT}}}Data')
+        etree.SubElement(data, f'{{{TT}}}SimpleItem', Name='PresetToken', Value=token)
+        return {'Topic': {'Dialect': TOPIC_DIALECT}, 'Message': {'_value_1': message}}
+
+    @staticmethod
+    def termination(value, default):
+        if isinstance(value, str):
+            # AbsoluteOrRelativeTimeType is a union, zeep leaves it as text
+            try:
+                value = isodate.parse_duration(value)
+            except isodate.ISO8601Error:
+                value = isodate.parse_datetime(value)
+        if isinstance(value, datetime.timedelta):
+            return value.total_seconds()
+        if isinstance(value, datetime.datetime):
+            return (value.replace(tzinfo=None) - datetime.datetime.utcnow()).total_seconds()
+        return default
+
+    def subscription(self):
+        id = self.local.path[len(PULLPOINT_PATH):]
+        subscription = self.subscriptions[id]
+        if subscription['expires'] <= time.monotonic():
+            del self.subscriptions[id]
+            raise KeyError(id)
+        return id, subscription
+
+    def subscription_times(self, subscription):
+        now = datetime.datetime.utcnow()
+        return {'CurrentTime': now,
+                'TerminationTime': now + datetime.timedelta(seconds=subscription['expires'] - time.monotonic())}
+
+    # Device service
+
+    def on_GetSystemDateAndTime(self, request):
+        now = datetime.datetime.utcnow()
+        return {'SystemDateAndTime': {
+            'DateTimeType': 'Manual',
+            'DaylightSavings': False,
+            'UTCDateTime': {'Date': {'Year': now.year, 'Month': now.month, 'Day': now.day},
+                            'Time': {'Hour': now.hour, 'Minute': now.minute, 'Second': now.second}},
+        }}
+
+    def on_GetDeviceInformation(self, request):
+        return {'Manufacturer': 'ptz-controls', 'Model': 'Simulator', 'FirmwareVersion': self.firmware,
+                'SerialNumber': self.serial, 'HardwareId': 'simulator'}
+
+    def on_GetCapabilities(self, request):
+        return {'Capabilities': {
+            'Device': {'XAddr': f'{self.address}/onvif/device_service',
+                       'Network': {}, 'System': {'DiscoveryResolve': False, 'DiscoveryBye': False,
+                                                 'RemoteDiscovery': False, 'SystemBackup': False,
+                                                 'SystemLogging': False, 'FirmwareUpgrade': False,
+                                                 'SupportedVersions': [{'Major': 2, 'Minor': 0}]},
+                       'IO': {}, 'Security': {'TLS1.1': False, 'TLS1.2': False, 'OnboardKeyGeneration': False,
+                                              'AccessPolicyConfig': False, 'X.509Token': False,
+                                              'SAMLToken': False, 'KerberosToken': False, 'RELToken': False}},
+            'Media': {'XAddr': f'{self.address}/onvif/media_service',
+                      'StreamingCapabilities': {'RTPMulticast': False, 'RTP_TCP': True, 'RTP_RTSP_TCP': True}},
+            'PTZ': {'XAddr': f'{self.address}/onvif/ptz_service'},
+            'Imaging': {'XAddr': f'{self.address}/onvif/imaging_service'},
+            'Events': {'XAddr': f'{self.address}/onvif/event_service', 'WSSubscriptionPolicySupport': False,
+                       'WSPullPointSupport': True,
+                       'WSPausableSubscriptionManagerInterfaceSupport': False} if self.events else None,
+        }}
+
+    # Media service
+
+    def on_GetProfiles(self, request):
+        return {'Profiles': [{
+            'token': 'profile_1', 'Name': 'Simulator', 'fixed': True,
+            'VideoSourceConfiguration': {'token': 'video_source_config', 'Name': 'Video', 'UseCount': 1,
+                                         'SourceToken': 'video_source',
+                                         'Bounds': {'x': 0, 'y': 0, 'width': 1920, 'height': 1080}},
+            'PTZConfiguration': {'token': 'ptz_config', 'Name': 'PTZ', 'UseCount': 1, 'NodeToken': 'ptz_node'},
+        }]}
+
+    def on_GetSnapshotUri(self, request):
+        return {'MediaUri': {'Uri': f'{self.address}{SNAPSHOT_PATH}', 'InvalidAfterConnect': False,
+                             'InvalidAfterReboot': False, 'Timeout': datetime.timedelta(0)}}
+
+    def snapshot(self):
+        """A 1920x1080 JPEG coloured by the camera's position, so each preset has a picture of its own"""
+        from PIL import Image
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.requests['snapshot'] = self.requests.get('snapshot', 0) + 1
+            self.update_position()
+            pan, tilt, zoom = self.position
+        colour = (round((pan + 1) * 127), round((tilt + 1) * 127), round(zoom * 255))
+        buffer = io.BytesIO()
+        Image.new('RGB', (1920, 1080), colour).save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    # PTZ service
+
+    def on_GetConfigurationOptions(self, request):
+        velocity = 'http://www.onvif.org/ver10/tptz/PanTiltSpaces/VelocityGenericSpace'
+        zoom = 'http://www.onvif.org/ver10/tptz/ZoomSpaces/VelocityGenericSpace'
+        return {'PTZConfigurationOptions': {
+            'Spaces': {
+                'ContinuousPanTiltVelocitySpace': [{'URI': velocity, 'XRange': {'Min': -1, 'Max': 1},
+                                                    'YRange': {'Min': -1, 'Max': 1}}],
+                'ContinuousZoomVelocitySpace': [{'URI': zoom, 'XRange': {'Min': -1, 'Max': 1}}],
+            },
+            'PTZTimeout': {'Min': datetime.timedelta(seconds=0.1), 'Max': datetime.timedelta(seconds=60)},
+        }}
+
+    def on_ContinuousMove(self, request):
+        self.update_position()
+        self.leave_preset()
+        velocity = request.Velocity
+        pan_tilt = velocity.PanTilt
+        zoom = velocity.Zoom
+        self.velocity = [pan_tilt.x if pan_tilt else 0.0, pan_tilt.y if pan_tilt else 0.0,
+                         zoom.x if zoom else 0.0]
+        timeout = request.Timeout
+        self.move_deadline = time.monotonic() + timeout.total_seconds() if timeout else None
+
+    def on_Stop(self, request):
+        self.update_position()
+        if self.preset_arrival:
+            self.leave_preset()
+        self.velocity = [0.0, 0.0, 0.0]
+        self.move_deadline = None
+
+    def on_GetStatus(self, request):
+        self.update_position()
+        pan, tilt, zoom = self.position
+        pan_tilt_moving = self.velocity[0] or self.velocity[1] or self.preset_arrival
+        return {'PTZStatus': {
+            'Position': {'PanTilt': {'x': pan, 'y': tilt}, 'Zoom': {'x': zoom}},
+            'MoveStatus': {'PanTilt': 'MOVING' if pan_tilt_moving else 'IDLE',
+                           'Zoom': 'MOVING' if self.velocity[2] else 'IDLE'},
+            'UtcTime': datetime.datetime.utcnow(),
+        }}
+
+    def on_GetPresets(self, request):
+        return {'Preset': [{'token': token, 'Name': preset['Name'],
+                            'PTZPosition': {'PanTilt': {'x': preset['position'][0], 'y': preset['position'][1]},
+                                            'Zoom': {'x': preset['position'][2]}}}
+                           for token, preset in self.presets.items()]}
+
+    def on_SetPreset(self, request):
+        self.update_position()
+        token = request.PresetToken
+        if not token:
+            token = str(self.next_preset)
+            self.next_preset += 1
+        self.presets[token] = {'Name': request.PresetName or f'Preset {token}', 'position': list(self.position)}
+        return {'PresetToken': token}
+
+    def on_RemovePreset(self, request):
+        del self.presets[request.PresetToken]
+
+    def on_GotoPreset(self, request):
+        self.update_position()
+        token = str(request.PresetToken)
+        self.position = list(self.presets[token]['position'])
+        self.velocity = [0.0, 0.0, 0.0]
+        self.move_deadline = None
+        self.leave_preset()
+        travel = self.preset_travel
+        if request.Speed is not None and request.Speed.PanTilt is not None:
+            travel /= max(request.Speed.PanTilt.x, 0.1)
+        self.preset_arrival = (token, time.monotonic() + travel)
+        self.emit('Invoked', token)
+        timer = threading.Timer(travel, self.arrive, (self.preset_arrival,))
+        timer.daemon = True
+        timer.start()
+
+    # Event service
+
+    def on_CreatePullPointSubscription(self, request):
+        id = str(self.next_subscription)
+        self.next_subscription += 1
+        subscription = {'messages': [],
+                        'expires': time.monotonic() + self.termination(request.InitialTerminationTime, 60)}
+        self.subscriptions[id] = subscription
+        return dict(self.subscription_times(subscription),
+                    SubscriptionReference={'Address': {'_value_1': f'{self.address}{PULLPOINT_PATH}{id}'}})
+
+    def on_PullMessages(self, request):
+        id, subscription = self.subscription()
+        deadline = time.monotonic() + min(request.Timeout.total_seconds(), 60)
+        while not subscription['messages'] and id in self.subscriptions:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Releases the camera lock while waiting
+            self.events_changed.wait(remaining)
+        messages = subscription['messages'][:request.MessageLimit]
+        del subscription['messages'][:len(messages)]
+        self.local.topics = [f'tns1:PTZController/PTZPresets/{event}' for event, token, utc_time in messages]
+        return dict(self.subscription_times(subscription),
+                    NotificationMessage=[self.notification(*message) for message in messages])
+
+    def on_Renew(self, request):
+        id, subscription = self.subscription()
+        subscription['expires'] = time.monotonic() + self.termination(request.TerminationTime, 60)
+        return self.subscription_times(subscription)
+
+    def on_Unsubscribe(self, request):
+        id, subscription = self.subscription()
+        del self.subscriptions[id]
+        self.events_changed.notify_all()
+
+    # Imaging service
+
+    def on_Move(self, request):
+        pass
+
+    def on_SetImagingSettings(self, request):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run simulated ONVIF PTZ cameras on this computer')
+    parser.add_argument('--cameras', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8000, help='port of the first camera')
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0, help='+/- milliseconds of random latency')
+    parser.add_argument('--loss', type=float, default=0, help='fraction of requests dropped, 0 to 1')
+    parser.add_argument('--discovery', action='store_true', help='answer multicast WS-Discovery probes on port 3702')
+    args = parser.parse_args()
+
+    cameras = [SimulatedCamera(port=args.port + idx, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                               loss=args.loss, serial=f'SIM{idx + 1:04}', name=f'Simulator {idx + 1}',
+                               discovery_port=3702 if args.discovery else None, multicast=args.discovery).start()
+               for idx in range(args.cameras)]
+    for idx, camera in enumerate(cameras):
+        print(f'[Camera {idx + 1}]\nname = Simulator {idx + 1}\nhost = {camera.host}\nport = {camera.port}\n')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for camera in cameras:
+            camera.stop()
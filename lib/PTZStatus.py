@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class PTZStatus:
+    """
+    What is known about a camera's pan/tilt/zoom: whether it is moving, its position, the preset it is at and the
+    preset it is on its way to. Commands update it as they are sent and the camera's EventMonitor as the camera
+    reports back. Listeners are called with a snapshot on every change, from the thread that made it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.moving = False
+        self.position = None
+        self.preset = None
+        self.target = None
+        self.source = None
+        self.commanded = 0
+        self.listeners = []
+
+    def snapshot(self):
+        with self.lock:
+            return {'moving': self.moving, 'position': self.position, 'preset': self.preset, 'target': self.target,
+                    'source': self.source}
+
+    def add_listener(self, callback):
+        with self.lock:
+            if callback not in self.listeners:
+                self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self.lock:
+            if callback in self.listeners:
+                self.listeners.remove(callback)
+
+    def update(self, **values):
+        with self.lock:
+            changed = False
+            for key, value in values.items():
+                if getattr(self, key) != value:
+                    setattr(self, key, value)
+                    changed = True
+            if not changed:
+                return False
+            snapshot = {'moving': self.moving, 'position': self.position, 'preset': self.preset,
+                        'target': self.target, 'source': self.source}
+            listeners = list(self.listeners)
+        for callback in listeners:
+            callback(snapshot)
+        return True
+
+    def command(self, **values):
+        """A command was sent, it wins over camera status read before it"""
+        with self.lock:
+            self.commanded = time.monotonic()
+        return self.update(**values)
+
+    def observe(self, since, moving, position):
+        """Status read from the camera, a request started at since"""
+        with self.lock:
+            stale = self.commanded > since
+            target = self.target
+        if stale:
+            return self.update(position=position)
+        if moving or target is None:
+            return self.update(moving=moving, position=position)
+        # Without events, arriving at a preset is only seen as the camera going idle
+        return self.update(moving=False, position=position, preset=target, target=None)
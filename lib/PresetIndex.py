@@ -0,0 +1,37 @@
+import re
+
+WORD = re.compile(r'\w+')
+
+
+class PresetIndex:
+    """
+    A camera's presets in order with a filter index built once per preset list. Every prefix of every word in a
+    preset's name and token maps to the positions of the presets that have it, so filtering is one set lookup per
+    word typed rather than a scan of every name. "sta le" finds "Stage left".
+    """
+
+    def __init__(self, presets=()):
+        self.presets = []
+        self.prefixes = {}
+        self.update(presets)
+
+    def __len__(self):
+        return len(self.presets)
+
+    def update(self, presets):
+        self.presets = list(presets)
+        self.prefixes = {}
+        for position, preset in enumerate(self.presets):
+            for word in WORD.findall(f"{preset['Name'] or ''} {preset['token']}".lower()):
+                for end in range(1, len(word) + 1):
+                    self.prefixes.setdefault(word[:end], set()).add(position)
+
+    def filter(self, text):
+        """Positions of the presets matching every word of text, in camera order"""
+        matches = None
+        for term in WORD.findall(text.lower()):
+            found = self.prefixes.get(term, set())
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        return list(range(len(self.presets))) if matches is None else sorted(matches)
@@ -0,0 +1,99 @@
+from lib.PresetIndex import PresetIndex
+from tkinter import Button, Frame, Label, Scrollbar
+
+
+class PresetList(Frame):
+    """
+    Scrolling list of a camera's presets that only has widgets for the rows on screen. Scrolling, filtering and
+    preset changes reuse the same rows, and a row is only configured when what it shows has changed, so the list
+    costs the same with 10 presets or 256.
+
+    on_edit(preset) is called from a row's edit button and on_select(preset) when its name is clicked.
+    """
+
+    def __init__(self, master, rows=12, edit_image=None, on_edit=None, on_select=None):
+        super().__init__(master=master, background='white')
+        self.rows = rows
+        self.on_edit = on_edit
+        self.on_select = on_select
+        self.index = PresetIndex()
+        self.filter_text = ''
+        self.matches = []
+        self.top = 0
+        self.current = None
+        self.row_widgets = []
+        self.shown = [None] * rows
+
+        for row in range(rows):
+            edit_button = Button(self, image=edit_image, height=20, width=20, background='white', border=0,
+                                 command=lambda row=row: self.row_clicked(row, self.on_edit))
+            edit_button.grid(row=row, column=0, padx=0, pady=0)
+            edit_button.grid_remove()
+            label = Label(self, text='', background='white', anchor='w', width=25)
+            label.grid(row=row, column=1, padx=0, pady=0, sticky='w')
+            label.bind('<Button-1>', lambda evt, row=row: self.row_clicked(row, self.on_select))
+            self.row_widgets.append((edit_button, label))
+            for widget in (edit_button, label):
+                self.bind_wheel(widget)
+
+        self.scrollbar = Scrollbar(self, orient='vertical', command=self.scroll_command)
+        self.scrollbar.grid(row=0, column=2, rowspan=rows, sticky='ns')
+        self.bind_wheel(self)
+
+    def bind_wheel(self, widget):
+        # Windows and macOS send MouseWheel, X11 buttons 4 and 5
+        widget.bind('<MouseWheel>', lambda evt: self.scroll_to(self.top - (1 if evt.delta > 0 else -1) * 3))
+        widget.bind('<Button-4>', lambda evt: self.scroll_to(self.top - 3))
+        widget.bind('<Button-5>', lambda evt: self.scroll_to(self.top + 3))
+
+    def set_presets(self, presets):
+        self.index.update(presets)
+        self.matches = self.index.filter(self.filter_text)
+        self.scroll_to(self.top)
+
+    def set_filter(self, text):
+        self.filter_text = text
+        self.matches = self.index.filter(text)
+        self.scroll_to(0)
+
+    def set_current(self, token):
+        # The preset the camera is at is shown in blue
+        self.current = token
+        self.render()
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, len(self.matches) - self.rows))
+        self.render()
+
+    def scroll_command(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.scroll_to(round(float(amount) * len(self.matches)))
+        elif action == 'scroll':
+            self.scroll_to(self.top + int(amount) * (self.rows if unit == 'pages' else 1))
+
+    def row_clicked(self, row, callback):
+        if callback and self.shown[row] is not None:
+            callback(self.index.presets[self.matches[self.top + row]])
+
+    def render(self):
+        for row, (edit_button, label) in enumerate(self.row_widgets):
+            shown = None
+            if self.top + row < len(self.matches):
+                preset = self.index.presets[self.matches[self.top + row]]
+                current = self.current is not None and preset['token'] == self.current
+                shown = (preset['token'], preset['Name'] or preset['token'], '#0063b1' if current else 'black')
+            if shown == self.shown[row]:
+                continue
+            if shown is None:
+                edit_button.grid_remove()
+                label.configure(text='')
+            else:
+                if self.shown[row] is None:
+                    edit_button.grid()
+                label.configure(text=shown[1], foreground=shown[2])
+            self.shown[row] = shown
+
+        if self.matches:
+            self.scrollbar.set(self.top / len(self.matches), min(1, (self.top + self.rows) / len(self.matches)))
+        else:
+            self.scrollbar.set(0, 1)
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewStream:
+    """
+    Reads an RTSP stream on a background thread and keeps only the newest frame, already converted to RGB and
+    scaled down to the preview height. The reader never waits for the UI, frames the UI has not collected are
+    replaced by newer ones so the preview never falls behind the camera.
+
+    Requires opencv-python and pillow, which are optional dependencies.
+    """
+
+    def __init__(self, url, height=200, reconnect_delay=2):
+        self.url = url
+        self.height = height
+        self.reconnect_delay = reconnect_delay
+        self.lock = threading.Lock()
+        self.image = None
+        self.frame_id = 0
+        self.frame_time = 0
+        self.frames = 0
+        self.dropped = 0
+        self.error = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f'preview-{self.url}', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def focus(self):
+        # A single stream always runs at the full frame rate
+        pass
+
+    def latest(self):
+        """Returns (frame_id, PIL image, capture time) of the newest frame and empties the slot"""
+        with self.lock:
+            image = self.image
+            self.image = None
+            return self.frame_id, image, self.frame_time
+
+    def run(self):
+        try:
+            import cv2
+            from PIL import Image
+        except ImportError as err:
+            self.error = f'Preview unavailable: {err.name} is not installed'
+            self.running = False
+            return
+
+        while self.running:
+            capture = cv2.VideoCapture(self.url)
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            if not capture.isOpened():
+                self.error = 'Preview stream unavailable'
+                capture.release()
+                time.sleep(self.reconnect_delay)
+                continue
+
+            self.error = None
+            while self.running:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                captured = time.monotonic()
+
+                # Convert and scale here rather than on the Tk thread
+                height, width = frame.shape[:2]
+                size = (max(1, int(width * self.height / height)), self.height)
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+                with self.lock:
+                    if self.image is not None:
+                        self.dropped += 1
+                    self.image = image
+                    self.frame_id += 1
+                    self.frame_time = captured
+                    self.frames += 1
+
+            capture.release()
+            if self.running:
+                self.error = 'Preview stream lost, reconnecting'
+                time.sleep(self.reconnect_delay)
+
+    def stats(self):
+        with self.lock:
+            return {'frames': self.frames,
+                    'dropped': self.dropped,
+                    'age': time.monotonic() - self.frame_time if self.frame_time else None,
+                    }
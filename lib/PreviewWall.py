@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewTile:
+    """
+    One camera on the preview wall. Decoding stays on the tile's own reader thread: grab() reads and decodes every
+    frame to keep the stream drained, which can't be shared between streams, and retrieve() is only called when the
+    tile is due for a frame at its current frame rate. Only scaling and colour conversion of that frame go to the
+    wall's shared workers.
+
+    Frames are scaled into buffers that are allocated once. Three RGB buffers rotate between the worker writing,
+    the newest complete frame and the frame the UI is showing, so neither side waits on or copies the other.
+    """
+
+    def __init__(self, wall, url, height, reconnect_delay=2):
+        self.wall = wall
+        self.url = url
+        self.height = height
+        self.reconnect_delay = reconnect_delay
+        self.lock = threading.Lock()
+        self.fps = 1
+        self.next_due = 0
+        self.busy = False
+        self.capture_buffer = None
+        self.scaled = None
+        self.buffers = None
+        self.images = None
+        self.back, self.ready, self.front = 0, 1, 2
+        self.new_frame = False
+        self.frame_id = 0
+        self.frame_time = 0
+        self.frames = 0
+        self.skipped = 0
+        self.memory_bytes = 0
+        self.error = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f'preview-{self.url}', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wall.remove(self)
+
+    def focus(self):
+        self.wall.set_focus(self)
+
+    def latest(self):
+        """Returns (frame_id, PIL image, capture time), the image stays valid until the next call"""
+        with self.lock:
+            if not self.new_frame:
+                return self.frame_id, None, self.frame_time
+            self.ready, self.front = self.front, self.ready
+            self.new_frame = False
+            return self.frame_id, self.images[self.front], self.frame_time
+
+    def run(self):
+        try:
+            import cv2
+        except ImportError as err:
+            self.error = f'Preview unavailable: {err.name} is not installed'
+            self.running = False
+            return
+
+        while self.running:
+            capture = cv2.VideoCapture(self.url)
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            if not capture.isOpened():
+                self.error = 'Preview stream unavailable'
+                capture.release()
+                time.sleep(self.reconnect_delay)
+                continue
+
+            self.error = None
+            while self.running:
+                if not capture.grab():
+                    break
+                now = time.monotonic()
+                if self.busy or now < self.next_due:
+                    self.skipped += 1
+                    continue
+
+                ok, self.capture_buffer = capture.retrieve(self.capture_buffer)
+                if not ok:
+                    break
+                if self.buffers is None and not self.allocate(cv2):
+                    self.running = False
+                    break
+
+                self.busy = True
+                self.next_due = now + 1 / self.fps
+                self.wall.submit(self.process, cv2, now)
+
+            capture.release()
+            if self.running:
+                self.error = 'Preview stream lost, reconnecting'
+                time.sleep(self.reconnect_delay)
+
+    def allocate(self, cv2):
+        import numpy
+        from PIL import Image
+
+        height, width = self.capture_buffer.shape[:2]
+        size = (max(1, int(width * self.height / height)), self.height)
+        memory_bytes = self.capture_buffer.nbytes + size[0] * size[1] * 3 * 4
+        if not self.wall.reserve(self, memory_bytes):
+            # Capture stops and the tile leaves the wall, so its share of the frame rate goes to the others
+            self.error = 'Preview memory budget exceeded'
+            self.wall.remove(self)
+            return False
+
+        self.memory_bytes = memory_bytes
+        self.scaled = numpy.empty((size[1], size[0], 3), dtype=numpy.uint8)
+        self.buffers = [numpy.empty((size[1], size[0], 3), dtype=numpy.uint8) for _ in range(3)]
+        self.images = [Image.frombuffer('RGB', size, buffer, 'raw', 'RGB', 0, 1) for buffer in self.buffers]
+        return True
+
+    def process(self, cv2, captured):
+        # Runs on the wall's shared workers, cv2 releases the GIL while resizing and converting
+        try:
+            cv2.resize(self.capture_buffer, (self.scaled.shape[1], self.scaled.shape[0]), dst=self.scaled,
+                       interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self.scaled, cv2.COLOR_BGR2RGB, dst=self.buffers[self.back])
+            with self.lock:
+                self.back, self.ready = self.ready, self.back
+                self.new_frame = True
+                self.frame_id += 1
+                self.frame_time = captured
+                self.frames += 1
+        except Exception:
+            logger.exception(f'Preview processing failed for {self.url}')
+        finally:
+            self.busy = False
+
+    def stats(self):
+        return {'fps': self.fps,
+                'frames': self.frames,
+                'skipped': self.skipped,
+                'memory_bytes': self.memory_bytes,
+                'age': time.monotonic() - self.frame_time if self.frame_time else None,
+                }
+
+
+class PreviewWall:
+    """
+    Previews for many cameras sharing a fixed number of workers that scale and convert their frames, each camera
+    still decodes on its tile's reader thread.
+    The camera being driven gets focus_fps, the others share what is left of fps_budget up to background_fps each.
+    Tiles that would take the wall over memory_budget bytes of frame buffers are refused.
+    """
+
+    def __init__(self, workers=2, focus_fps=20, background_fps=2, fps_budget=60, memory_budget=256 * 1024 * 1024):
+        self.workers = workers
+        self.focus_fps = focus_fps
+        self.background_fps = background_fps
+        self.fps_budget = fps_budget
+        self.memory_budget = memory_budget
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='preview-wall')
+        self.lock = threading.Lock()
+        self.tiles = []
+        self.focused = None
+        self.memory_bytes = 0
+
+    def configure(self, focus_fps=None, background_fps=None, fps_budget=None, memory_budget=None):
+        self.focus_fps = focus_fps or self.focus_fps
+        self.background_fps = background_fps or self.background_fps
+        self.fps_budget = fps_budget or self.fps_budget
+        self.memory_budget = memory_budget or self.memory_budget
+        with self.lock:
+            self.rebalance()
+
+    def add(self, url, height=200):
+        tile = PreviewTile(self, url, height)
+        with self.lock:
+            self.tiles.append(tile)
+            self.rebalance()
+        return tile
+
+    def remove(self, tile):
+        with self.lock:
+            if tile not in self.tiles:
+                return
+            self.tiles.remove(tile)
+            self.memory_bytes -= tile.memory_bytes
+            if self.focused is tile:
+                self.focused = None
+            self.rebalance()
+
+    def set_focus(self, tile):
+        with self.lock:
+            if self.focused is tile:
+                return
+            self.focused = tile
+            self.rebalance()
+            # Show the newly focused camera straight away instead of after its background interval
+            tile.next_due = 0
+
+    def rebalance(self):
+        background = [tile for tile in self.tiles if tile is not self.focused]
+        remaining = self.fps_budget
+        if self.focused is not None:
+            self.focused.fps = min(self.focus_fps, self.fps_budget)
+            remaining -= self.focused.fps
+        if background:
+            fps = min(self.background_fps, max(remaining, 0) / len(background))
+            for tile in background:
+                # Never stop a tile completely, one frame every ten seconds at worst
+                tile.fps = max(fps, 0.1)
+
+    def reserve(self, tile, memory_bytes):
+        with self.lock:
+            if self.memory_bytes + memory_bytes > self.memory_budget:
+                return False
+            self.memory_bytes += memory_bytes
+            return True
+
+    def submit(self, func, *args):
+        self.executor.submit(func, *args)
+
+    def stats(self):
+        with self.lock:
+            return {'tiles': len(self.tiles),
+                    'workers': self.workers,
+                    'fps': sum(tile.fps for tile in self.tiles),
+                    'memory_bytes': self.memory_bytes,
+                    }
+
+    def close(self):
+        with self.lock:
+            tiles = list(self.tiles)
+        for tile in tiles:
+            tile.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class SceneRecall:
+    """
+    Sends GotoPreset to every camera in a scene at the same moment. Every camera's request is built first, in the
+    caller, and cameras that fail to build one are reported without being sent. The rest are handed to workers
+    that wait at a barrier, for a small part of the deadline at most, so the requests leave together rather than
+    one round trip apart.
+    """
+
+    def __init__(self, max_workers=32):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scene')
+
+    def recall(self, targets, deadline=2):
+        """
+        targets is a list of (camera name, ONVIFControl or None, preset token). Returns one result per camera,
+        {'camera', 'ok', 'error', 'latency', 'offset'}, where latency is the camera's round trip and offset is how
+        long after the first request this camera's request was sent. Cameras that have not answered within
+        deadline seconds are reported as failed, their requests are left to finish in the background.
+        """
+        start = time.perf_counter()
+        results = {}
+        ready = []
+        for name, control, token in targets:
+            if control is None:
+                results[name] = {'camera': name, 'ok': False, 'error': 'Not connected', 'latency': None,
+                                 'offset': None}
+                continue
+            # Serialise every request up front so that only the HTTP requests are left to race, a camera that
+            # can't build its request is reported here and never holds the others at the barrier
+            try:
+                prepare = getattr(control, 'prepare_preset_goto', None)
+                send = prepare(token) if prepare else lambda control=control, token=token: control.preset_goto(token)
+            except Exception as err:
+                results[name] = {'camera': name, 'ok': False, 'error': str(err), 'latency': None, 'offset': None}
+                continue
+            ready.append((name, send))
+
+        # More cameras than workers can't all wait at the barrier, those are sent as workers free up. The barrier
+        # only waits for workers to start, so it gets a small part of the deadline
+        parties = min(len(ready), self.max_workers)
+        barrier = threading.Barrier(parties) if ready else None
+        barrier_timeout = min(0.25, deadline / 4)
+        sent = {}
+
+        def goto(name, send, synchronised):
+            if synchronised:
+                try:
+                    barrier.wait(timeout=barrier_timeout)
+                except threading.BrokenBarrierError:
+                    pass
+            sent[name] = time.perf_counter()
+            send()
+            return time.perf_counter() - sent[name]
+
+        futures = {self.executor.submit(goto, name, send, idx < parties): name
+                   for idx, (name, send) in enumerate(ready)}
+        wait(futures, timeout=max(0, deadline - (time.perf_counter() - start)))
+
+        first = min(sent.values()) if sent else None
+        for future, name in futures.items():
+            result = {'camera': name, 'ok': False, 'error': None, 'latency': None,
+                      'offset': sent[name] - first if name in sent else None}
+            if not future.done():
+                result['error'] = 'No reply before the deadline'
+            elif future.exception():
+                result['error'] = str(future.exception())
+            else:
+                result['ok'] = True
+                result['latency'] = future.result()
+            results[name] = result
+        return [results[name] for name, _, _ in targets]
+
+    @staticmethod
+    def flush(dispatchers, timeout):
+        """
+        Drop the moves waiting on each camera's CommandDispatcher and wait, up to timeout seconds in all, for what
+        they are already sending, so nothing queued before the scene reaches a camera after its preset.
+        """
+        end = time.monotonic() + timeout
+        for dispatcher in dispatchers:
+            dispatcher.cancel_moves()
+        for dispatcher in dispatchers:
+            dispatcher.flush(max(0, end - time.monotonic()))
+
+    @staticmethod
+    def summary(name, results):
+        succeeded = [result for result in results if result['ok']]
+        failed = [result['camera'] for result in results if not result['ok']]
+        message = f'Scene {name}: {len(succeeded)}/{len(results)} cameras'
+        if succeeded:
+            message += f' in {max(result["latency"] for result in succeeded) * 1000:.0f} ms'
+            message += f' (sent within {max(result["offset"] for result in succeeded) * 1000:.0f} ms)'
+        if failed:
+            message += f', failed: {", ".join(failed)}'
+        return message
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
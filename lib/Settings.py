@@ -0,0 +1,152 @@
+import io
+import os
+import re
+import shutil
+import configparser
+from lib.pyinstaller_helper import resource_path, user_path
+
+
+class Settings:
+    """settings.ini, shared by the GUI and the control daemon"""
+
+    def __init__(self, filename=None, app_name='Camera Control'):
+        self.filename = filename or user_path(app_name, 'settings.ini')
+        self.config = None
+
+    def default_settings(self):
+        src = os.path.join(resource_path('assets'), 'default_settings.ini')
+        shutil.copyfile(src, self.filename)
+
+    def load(self):
+        if not os.path.isfile(self.filename):
+            self.default_settings()
+
+        self.config = configparser.ConfigParser(comment_prefixes='/', allow_no_value=True)
+        self.config.read(self.filename)
+        return self.config
+
+    @property
+    def general(self):
+        if self.config is None or 'GENERAL' not in self.config:
+            return {}
+        return self.config['GENERAL']
+
+    def camera_sections(self):
+        cameras = []
+        for section in self.config.sections():
+            if re.search(r"^Camera \d+$", section):
+                cameras.append(section)
+        return cameras
+
+    def scenes(self):
+        """
+        [Scene N] sections as (section, name, {camera section: preset token}). Cameras are listed by their section
+        name, e.g. camera 1 = 3.
+        """
+        cameras = {section.lower(): section for section in self.camera_sections()}
+        scenes = []
+        for section in self.config.sections():
+            if not re.search(r"^Scene \d+$", section):
+                continue
+            presets = {}
+            for key, value in self.config[section].items():
+                if key in cameras and value:
+                    presets[cameras[key]] = value
+            scenes.append((section, self.config[section].get('name', section), presets))
+        return scenes
+
+    def tours(self):
+        """
+        [Tour N] sections as dicts of id (the section), name, camera (its section), presets (tokens in order), dwell
+        (seconds at each preset, one value for all or one per preset), speed (None for the camera's own) and
+        autostart. Tours without a known camera or without presets are left out.
+        """
+        cameras = {section.lower(): section for section in self.camera_sections()}
+        tours = []
+        for section in self.config.sections():
+            if not re.search(r"^Tour \d+$", section):
+                continue
+            config = self.config[section]
+            camera = cameras.get((config.get('camera') or '').strip().lower())
+            presets = [token.strip() for token in (config.get('presets') or '').split(',') if token.strip()]
+            if camera is None or not presets:
+                continue
+            dwell = [float(seconds) for seconds in (config.get('dwell') or '10').split(',') if seconds.strip()]
+            tours.append({'id': section,
+                          'name': config.get('name', section),
+                          'camera': camera,
+                          'presets': presets,
+                          'dwell': dwell or [10],
+                          'speed': float(config['speed']) if config.get('speed') else None,
+                          'autostart': (config.get('autostart') or '').lower() in ('yes', 'true', 'on', '1'),
+                          })
+        return tours
+
+    def add_cameras(self, cameras, username='', password=''):
+        """
+        Append a [Camera N] section for each discovered camera that isn't configured yet. The file is appended to
+        rather than rewritten so comments and layout are kept. Returns the sections added.
+        """
+        configured = {(self.config[section].get('host'), int(self.config[section].get('port', 80)))
+                      for section in self.camera_sections()}
+        numbers = [int(section.split()[1]) for section in self.camera_sections()]
+        number = max(numbers, default=0)
+        added = []
+        # The new sections are written by ConfigParser on their own, the values come from the network and the user
+        new_config = configparser.ConfigParser()
+        for camera in cameras:
+            if not camera.get('onvif') or (camera['host'], camera['port']) in configured:
+                continue
+            number += 1
+            section = f'Camera {number}'
+            name = camera.get('name') or camera.get('model') or section
+            new_config[section] = {'name': self.ini_value(name),
+                                   'host': self.ini_value(camera['host']),
+                                   'port': str(int(camera['port'])),
+                                   'username': self.ini_value(username),
+                                   'password': self.ini_value(password)}
+            added.append(section)
+
+        if added:
+            text = io.StringIO()
+            new_config.write(text)
+            with open(self.filename, 'a') as f:
+                f.write('\n' + text.getvalue())
+            self.load()
+        return added
+
+    @staticmethod
+    def ini_value(value):
+        # A line break would start a new key or section, and % is ConfigParser's interpolation character
+        return ' '.join(str(value).splitlines()).strip().replace('%', '%%')
+
+
+def status_settings(general):
+    """Keyword arguments for ONVIFControl.start_events from the GENERAL section"""
+    return {'events': 'events' not in general or general['events'].lower() in ('yes', 'true', 'on', '1'),
+            'pull_timeout': 10 if 'event_pull_timeout' not in general else float(general['event_pull_timeout']),
+            'poll_interval': 0.5 if 'status_poll_interval' not in general else float(general['status_poll_interval']),
+            'idle_interval': 5 if 'status_idle_interval' not in general else float(general['status_idle_interval']),
+            }
+
+
+def supervisor_settings(general):
+    """Keyword arguments for ConnectionSupervisor.configure from the GENERAL section"""
+    return {'interval': 5 if 'health_interval' not in general else float(general['health_interval']),
+            'failures': 2 if 'health_failures' not in general else int(general['health_failures']),
+            'max_backoff': 60 if 'reconnect_max_backoff' not in general else float(general['reconnect_max_backoff']),
+            }
+
+
+def camera_connection(config, general):
+    """Keyword arguments for ONVIFControl from a camera section and the GENERAL section"""
+    return {'host': '' if 'host' not in config else config['host'],
+            'port': 80 if 'port' not in config else int(config['port']),
+            'username': '' if 'username' not in config else config['username'],
+            'password': '' if 'password' not in config else config['password'],
+            'timeout': 5 if 'connect_timeout' not in general else float(general['connect_timeout']),
+            'read_timeout': 5 if 'read_timeout' not in general else float(general['read_timeout']),
+            'pool_size': 2 if 'http_pool_size' not in general else int(general['http_pool_size']),
+            'preset_ttl': 0 if 'preset_ttl' not in general else float(general['preset_ttl']),
+            'name': 'Camera' if 'name' not in config else config['name'],
+            }
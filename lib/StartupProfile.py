@@ -0,0 +1,51 @@
+import sys
+import threading
+import time
+from lib.pyinstaller_helper import user_path
+
+
+class StartupProfile:
+    """
+    Time from controls.py starting to each startup milestone. Enabled with --profile-startup, the report is printed
+    and written to startup_profile.txt next to settings.ini since windowed builds have no console.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+        self.lock = threading.Lock()
+        self.reported = False
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            self.phases.append((phase, now - self.start, now - self.last, threading.current_thread().name))
+            self.last = now
+
+    def report(self):
+        lines = [f'{"Phase":<32} {"Since start":>12} {"Step":>10}  Thread']
+        with self.lock:
+            for phase, elapsed, step, thread in self.phases:
+                lines.append(f'{phase:<32} {elapsed * 1000:>10.0f}ms {step * 1000:>8.0f}ms  {thread}')
+        return '\n'.join(lines)
+
+    def finish(self, app_name='Camera Control'):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        report = self.report()
+        if sys.stdout:
+            print(report)
+        with open(user_path(app_name, 'startup_profile.txt'), 'w') as f:
+            f.write(report + '\n')
+
+
+_shared_profile = StartupProfile('--profile-startup' in sys.argv)
+
+
+def get_startup_profile():
+    return _shared_profile
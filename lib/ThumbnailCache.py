@@ -0,0 +1,192 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from lib.pyinstaller_helper import user_path
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailCache:
+    """
+    Preset thumbnails, downscaled once from a camera snapshot and kept as JPEG files in cache_dir, keyed by camera
+    and preset token. The files are held to max_bytes by removing the least recently used, use is recorded in the
+    file's modification time so the order survives restarts. Decoded thumbnails are also kept in memory, up to
+    max_images, so showing the preset buttons again reads nothing from disk and nothing is ever asked of a camera.
+
+    Decoding and downscaling run on the cache's own worker threads, callbacks are called from those threads.
+    """
+
+    def __init__(self, cache_dir, max_bytes=20 * 1024 * 1024, max_images=512, workers=2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_images = max_images
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.files = None
+        self.images = OrderedDict()
+        self.executor = None
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_bytes=20 * 1024 * 1024):
+        with self.lock:
+            self.max_bytes = max_bytes
+            if self.files is not None:
+                self.evict()
+
+    @staticmethod
+    def filename(camera, token):
+        return hashlib.sha1(f'{camera}\n{token}'.encode('utf-8')).hexdigest() + '.jpg'
+
+    def load(self):
+        # Oldest first, the order files are evicted in
+        if self.files is not None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.jpg') and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self.files = OrderedDict((name, size) for _, name, size in sorted(entries))
+
+    def submit(self, func, *args):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbnails')
+            return self.executor.submit(func, *args)
+
+    def fetch(self, camera, tokens, width, callback):
+        """callback({token: PIL image}) with the thumbnails already cached for tokens, in the background"""
+        def run():
+            images = {}
+            for token in tokens:
+                image = self.get(camera, token, width)
+                if image is not None:
+                    images[token] = image
+            callback(images)
+        return self.submit(run)
+
+    def capture(self, camera, token, snapshot, width, callback):
+        """Take a snapshot with snapshot() and store its thumbnail, callback(token, PIL image, error)"""
+        def run():
+            try:
+                image = self.put(camera, token, snapshot(), width)
+            except Exception as err:
+                callback(token, None, err)
+                return
+            callback(token, image, None)
+        return self.submit(run)
+
+    def get(self, camera, token, width):
+        key = (camera, token)
+        name = self.filename(camera, token)
+        with self.lock:
+            self.load()
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+            if name in self.files:
+                self.files.move_to_end(name)
+            elif image is None:
+                self.misses += 1
+                return None
+        path = os.path.join(self.cache_dir, name)
+        if image is None:
+            from PIL import Image
+            try:
+                with Image.open(path) as file_image:
+                    image = self.scaled(file_image, width)
+            except OSError:
+                with self.lock:
+                    self.files.pop(name, None)
+                    self.misses += 1
+                return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self.lock:
+            self.hits += 1
+            self.remember(key, image)
+        return image
+
+    def put(self, camera, token, data, width):
+        """Downscale the JPEG snapshot data to width pixels and store it, returns the thumbnail"""
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as snapshot:
+            # JPEGs are decoded at a fraction of their size when only a thumbnail is wanted
+            snapshot.draft('RGB', (width, width))
+            image = self.scaled(snapshot, width)
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+
+        name = self.filename(camera, token)
+        path = os.path.join(self.cache_dir, name)
+        with self.lock:
+            self.load()
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(temp_path, path)
+        with self.lock:
+            self.files[name] = len(buffer.getvalue())
+            self.files.move_to_end(name)
+            self.remember((camera, token), image)
+            self.evict()
+        return image
+
+    def remove(self, camera, token):
+        name = self.filename(camera, token)
+        with self.lock:
+            self.images.pop((camera, token), None)
+            if self.files is not None:
+                self.files.pop(name, None)
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+    @staticmethod
+    def scaled(image, width):
+        image = image.convert('RGB')
+        if image.width > width:
+            image.thumbnail((width, width))
+        return image
+
+    def remember(self, key, image):
+        self.images[key] = image
+        self.images.move_to_end(key)
+        while len(self.images) > self.max_images:
+            self.images.popitem(last=False)
+
+    def evict(self):
+        total = sum(self.files.values())
+        while total > self.max_bytes and len(self.files) > 1:
+            name, size = self.files.popitem(last=False)
+            total -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {'files': len(self.files or {}), 'bytes': sum((self.files or {}).values()),
+                    'images': len(self.images), 'hits': self.hits, 'misses': self.misses}
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ThumbnailCache(user_path('Camera Control', 'thumbnails'))
+        return _shared_cache
@@ -0,0 +1,205 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from lib.LatencyStats import TOUR, OperationStats, get_latency_stats
+
+logger = logging.getLogger(__name__)
+
+# Shortest dwell accepted, a camera needs longer than this to get anywhere anyway
+MIN_DWELL = 1
+
+
+class Tour:
+    """One running preset tour, where it is in its sequence and how close to time its steps went out"""
+
+    def __init__(self, tour_id, name, camera, presets, dwell, speed, goto):
+        self.id = tour_id
+        self.name = name
+        self.camera = camera
+        self.presets = list(presets)
+        self.dwell = [max(MIN_DWELL, seconds) for seconds in dwell] or [MIN_DWELL]
+        self.speed = speed
+        self.goto = goto
+        self.index = 0
+        self.due = 0
+        self.paused_until = 0
+        self.running = True
+        self.steps = 0
+        self.pauses = 0
+        self.resyncs = 0
+        self.errors = 0
+        self.error = None
+        self.last_lateness = None
+        self.lateness = OperationStats()
+
+    def stats(self):
+        return {'id': self.id, 'name': self.name, 'camera': self.camera, 'running': self.running,
+                'paused': self.paused_until > time.monotonic(),
+                'preset': self.presets[self.index - 1] if self.steps else None,
+                'steps': self.steps, 'pauses': self.pauses, 'resyncs': self.resyncs, 'errors': self.errors,
+                'error': self.error,
+                'last_ms': None if self.last_lateness is None else self.last_lateness * 1000,
+                'lateness': self.lateness.summary()}
+
+
+class TourScheduler:
+    """
+    Runs every preset tour from one thread. Tours wait in a heap ordered by the time.monotonic() their next step is
+    due, the thread sleeps until the earliest one and hands its GotoPreset to goto(token, speed), which only queues
+    it on the camera's dispatcher, so a slow camera never holds up another tour.
+
+    Each step is due a dwell after the previous step was due rather than after it actually went out, so the time a
+    step is late never adds up and a tour keeps its timing over hours. How late each step went out is recorded per
+    tour and as the tour layer of the latency statistics.
+
+    activity(camera) is called whenever an operator uses a camera. Its tours hold their place in the sequence and
+    carry on resume_delay seconds after the last touch.
+    """
+
+    def __init__(self, resume_delay=30, latency_stats=None):
+        self.resume_delay = resume_delay
+        self.latency_stats = latency_stats or get_latency_stats()
+        self.condition = threading.Condition()
+        self.heap = []
+        self.tours = {}
+        self.counter = itertools.count()
+        self.thread = None
+        self.closed = False
+
+    def configure(self, resume_delay=30):
+        with self.condition:
+            self.resume_delay = resume_delay
+
+    def start(self, tour_id, name, camera, presets, dwell, goto, speed=None):
+        """Start a tour from its first preset, a tour already running under tour_id is replaced"""
+        if not presets:
+            raise ValueError(f'{name} has no presets')
+        tour = Tour(tour_id, name, camera, presets, dwell, speed, goto)
+        with self.condition:
+            if self.closed:
+                return None
+            if tour_id in self.tours:
+                self.tours[tour_id].running = False
+            self.tours[tour_id] = tour
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='tours', daemon=True)
+                self.thread.start()
+            self.schedule(tour, time.monotonic())
+        logger.info(f'{name}: tour started on {camera}')
+        return tour
+
+    def stop(self, tour_id):
+        with self.condition:
+            tour = self.tours.pop(tour_id, None)
+            if tour is not None:
+                tour.running = False
+        return tour is not None
+
+    def stop_all(self):
+        with self.condition:
+            for tour in self.tours.values():
+                tour.running = False
+            self.tours = {}
+
+    def running(self, tour_id):
+        with self.condition:
+            return tour_id in self.tours
+
+    def activity(self, camera):
+        """An operator used camera, pause its tours until they have left it alone for resume_delay seconds"""
+        with self.condition:
+            now = time.monotonic()
+            for tour in self.tours.values():
+                if tour.camera == camera:
+                    if tour.paused_until <= now:
+                        tour.pauses += 1
+                    tour.paused_until = now + self.resume_delay
+
+    def stats(self):
+        with self.condition:
+            return [tour.stats() for tour in self.tours.values()]
+
+    @staticmethod
+    def summary(stats):
+        messages = []
+        for tour in stats:
+            message = f'{tour["name"]}: {tour["steps"]} steps'
+            lateness = tour['lateness']
+            if tour['steps']:
+                message += f', late by {lateness["p95_ms"]:.1f} ms p95, {lateness["max_ms"]:.1f} ms max'
+            if tour['paused']:
+                message += ', paused'
+            if tour['error']:
+                message += f', failed: {tour["error"]}'
+            messages.append(message)
+        return '\n'.join(messages)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.stop_all()
+            self.condition.notify()
+
+    def schedule(self, tour, due):
+        tour.due = due
+        heapq.heappush(self.heap, (due, next(self.counter), tour))
+        self.condition.notify()
+
+    def next_step(self):
+        """Wait for the next step that is due, None once closed"""
+        with self.condition:
+            while not self.closed:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                due, count, tour = self.heap[0]
+                now = time.monotonic()
+                if due > now:
+                    self.condition.wait(due - now)
+                    continue
+                heapq.heappop(self.heap)
+                # Stopped tours and entries left behind by a restart are dropped
+                if not tour.running or due != tour.due:
+                    continue
+                if tour.paused_until > now:
+                    # The operator has the camera, the timing starts over from when they let go
+                    self.schedule(tour, tour.paused_until)
+                    continue
+                return tour, due, now
+        return None
+
+    def run(self):
+        while True:
+            step = self.next_step()
+            if step is None:
+                return
+            tour, due, now = step
+            token = tour.presets[tour.index]
+            try:
+                tour.goto(token, tour.speed)
+                error = None
+            except Exception as err:
+                error = err
+
+            with self.condition:
+                tour.steps += 1
+                tour.last_lateness = now - due
+                tour.lateness.record(now - due, error)
+                if error is not None:
+                    tour.errors += 1
+                    if str(error) != tour.error:
+                        logger.warning(f'{tour.name}: preset {token} failed: {error}')
+                tour.error = None if error is None else str(error)
+                self.latency_stats.record(tour.camera, TOUR, tour.name, now - due, error)
+
+                dwell = tour.dwell[tour.index % len(tour.dwell)]
+                tour.index = (tour.index + 1) % len(tour.presets)
+                next_due = due + dwell
+                if next_due <= time.monotonic():
+                    # More than a whole dwell behind, e.g. the machine slept, start the timing over from now
+                    next_due = time.monotonic()
+                    tour.resyncs += 1
+                if tour.running:
+                    self.schedule(tour, next_due)
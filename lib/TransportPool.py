@@ -0,0 +1,96 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from zeep.transports import Transport
+
+
+class PooledTransport(Transport):
+    """
+    zeep transport on a persistent keep-alive session.
+    Connections opened after mark_warm() are counted as reconnects, on a healthy link there should be none.
+    """
+
+    def __init__(self, session, connect_timeout, read_timeout):
+        super().__init__(operation_timeout=(connect_timeout, read_timeout), session=session)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.warm_connections = None
+
+    def connections(self):
+        """Number of connections opened by the session so far"""
+        total = 0
+        # The same adapter is mounted for http:// and https://
+        for adapter in {id(adapter): adapter for adapter in self.session.adapters.values()}.values():
+            poolmanager = getattr(adapter, 'poolmanager', None)
+            if poolmanager is None:
+                continue
+            for key in list(poolmanager.pools.keys()):
+                pool = poolmanager.pools.get(key)
+                if pool is not None:
+                    total += pool.num_connections
+        return total
+
+    def mark_warm(self):
+        with self.lock:
+            if self.warm_connections is None:
+                self.warm_connections = self.connections()
+
+    def post(self, address, message, headers):
+        response = super().post(address, message, headers)
+        with self.lock:
+            self.requests += 1
+        return response
+
+    def stats(self):
+        connections = self.connections()
+        with self.lock:
+            warm = connections if self.warm_connections is None else self.warm_connections
+            return {'requests': self.requests,
+                    'connections': connections,
+                    'reused': max(0, self.requests - connections),
+                    'reconnects': connections - warm,
+                    }
+
+
+class TransportPool:
+    """Keep-alive transports shared by every ONVIFControl that talks to the same camera host."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transports = {}
+        self.references = {}
+
+    def acquire(self, host, port, pool_size=2, connect_timeout=5, read_timeout=5):
+        key = (host, int(port))
+        with self.lock:
+            transport = self.transports.get(key)
+            if transport is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=1)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['Connection'] = 'keep-alive'
+                transport = PooledTransport(session, connect_timeout, read_timeout)
+                self.transports[key] = transport
+                self.references[key] = 0
+            self.references[key] += 1
+            return transport
+
+    def release(self, host, port):
+        key = (host, int(port))
+        with self.lock:
+            if key not in self.references:
+                return
+            self.references[key] -= 1
+            if self.references[key] > 0:
+                return
+            transport = self.transports.pop(key)
+            del self.references[key]
+        transport.session.close()
+
+
+_shared_pool = TransportPool()
+
+
+def get_transport_pool():
+    return _shared_pool
@@ -0,0 +1,52 @@
+import logging
+import queue
+import time
+from lib.LatencyStats import UI, get_latency_stats
+
+logger = logging.getLogger(__name__)
+
+
+class UIQueue:
+    """
+    Hands callbacks from worker threads over to the Tk main loop.
+    Tk widgets must only be touched from the thread running mainloop(), so background work posts its
+    result here and the callback is run on the next poll.
+
+    How long callbacks wait and how late each poll runs are recorded in latency_stats, a late poll means the Tk
+    loop was busy with something else.
+    """
+
+    def __init__(self, tk_root, interval=20, latency_stats=None):
+        self.root = tk_root
+        self.interval = interval
+        self.latency_stats = latency_stats or get_latency_stats()
+        self.queue = queue.SimpleQueue()
+        self.running = True
+        self.next_poll = time.perf_counter() + self.interval / 1000
+        self.root.after(self.interval, self.poll)
+
+    def post(self, callback, *args):
+        self.queue.put((callback, args, time.perf_counter()))
+
+    def poll(self):
+        if not self.running:
+            return
+
+        now = time.perf_counter()
+        self.latency_stats.record('UI', UI, 'loop lag', max(0, now - self.next_poll))
+        while True:
+            try:
+                callback, args, posted = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.latency_stats.record('UI', UI, 'callback delay', time.perf_counter() - posted)
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception('UI callback failed')
+
+        self.next_poll = time.perf_counter() + self.interval / 1000
+        self.root.after(self.interval, self.poll)
+
+    def close(self):
+        self.running = False
@@ -0,0 +1,216 @@
+import glob
+import hashlib
+import io
+import logging
+import os
+import pickle
+import sys
+import threading
+import zeep
+from lxml import etree
+from onvif import ONVIFCamera, ONVIFService
+from onvif.client import UsernameDigestTokenDtDiff
+from zeep import Client, Settings
+from zeep.transports import Transport
+from zeep.wsdl import Document
+from lib.pyinstaller_helper import resource_path, user_path
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pickled format below changes
+CACHE_VERSION = 1
+DYNAMIC_MODULES = ('zeep.xsd.dynamic_types', 'zeep.objects')
+
+
+def _dynamic_type(name, bases, attributes):
+    return type(name, bases, attributes)
+
+
+class _DocumentPickler(pickle.Pickler):
+    """
+    zeep documents contain a few things the standard pickler can't handle: lxml QNames and elements, classes
+    zeep generates at runtime and the transport/settings objects. The transport and settings are swapped for
+    the cache's own instances when loading.
+    """
+
+    def __init__(self, file, cache):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.cache = cache
+
+    def persistent_id(self, obj):
+        if obj is self.cache.settings:
+            return 'settings'
+        if obj is self.cache.transport:
+            return 'transport'
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, etree.QName):
+            return etree.QName, (obj.text,)
+        if isinstance(obj, etree._Element):
+            return etree.fromstring, (etree.tostring(obj),)
+        if isinstance(obj, type) and obj.__module__ in DYNAMIC_MODULES:
+            attributes = {key: value for key, value in obj.__dict__.items()
+                          if key not in ('__dict__', '__weakref__')}
+            return _dynamic_type, (obj.__name__, obj.__bases__, attributes)
+        if type(obj).__name__ == 'odict_values':
+            return list, (list(obj),)
+        return NotImplemented
+
+
+class _DocumentUnpickler(pickle.Unpickler):
+    def __init__(self, file, cache):
+        super().__init__(file)
+        self.cache = cache
+
+    def persistent_load(self, pid):
+        if pid == 'settings':
+            return self.cache.settings
+        if pid == 'transport':
+            return self.cache.transport
+        raise pickle.UnpicklingError(f'Unknown persistent id {pid}')
+
+
+class WSDLCache:
+    """
+    Parsed WSDL documents shared by every camera in the process and persisted between runs.
+    The cache key is a hash of every file in the WSDL directory, so editing or upgrading the bundled WSDLs
+    invalidates the cache.
+    """
+
+    def __init__(self, wsdl_dir, cache_dir):
+        self.wsdl_dir = wsdl_dir
+        self.cache_dir = cache_dir
+        self.settings = Settings(strict=False, xml_huge_tree=True)
+        self.transport = Transport()
+        self.documents = {}
+        self.lock = threading.Lock()
+        self.file_locks = {}
+        self._key = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def key(self):
+        if self._key is None:
+            digest = hashlib.sha256(f'{CACHE_VERSION}:{zeep.__version__}:{sys.version_info[:2]}'.encode())
+            for path in sorted(glob.glob(os.path.join(self.wsdl_dir, '**', '*'), recursive=True)):
+                if os.path.isfile(path):
+                    digest.update(os.path.relpath(path, self.wsdl_dir).encode())
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+            self._key = digest.hexdigest()[:16]
+        return self._key
+
+    def document(self, wsdl_file):
+        name = os.path.basename(wsdl_file)
+        with self.lock:
+            lock = self.file_locks.setdefault(name, threading.Lock())
+
+        # One lock per file so cameras starting together parse each WSDL once
+        with lock:
+            document = self.documents.get(name)
+            if document is not None:
+                self.hits += 1
+                return document
+
+            document = self.load(name)
+            if document is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                document = Document(os.path.join(self.wsdl_dir, name), self.transport, settings=self.settings)
+                self.save(name, document)
+
+            self.documents[name] = document
+            return document
+
+    def cache_file(self, name):
+        return os.path.join(self.cache_dir, f'{os.path.splitext(name)[0]}-{self.key}.pickle')
+
+    def load(self, name):
+        path = self.cache_file(name)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return _DocumentUnpickler(f, self).load()
+        except Exception:
+            logger.warning(f'Discarding unreadable WSDL cache {path}')
+            os.remove(path)
+            return None
+
+    def save(self, name, document):
+        path = self.cache_file(name)
+        try:
+            buffer = io.BytesIO()
+            _DocumentPickler(buffer, self).dump(document)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(buffer.getvalue())
+            os.replace(temp_path, path)
+        except Exception:
+            logger.warning(f'Unable to cache {name}', exc_info=True)
+            return
+
+        # Remove entries for older versions of the same WSDL
+        pattern = f'{os.path.splitext(name)[0]}-{"?" * len(self.key)}.pickle'
+        for old_path in glob.glob(os.path.join(self.cache_dir, pattern)):
+            if old_path != path:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_wsdl_cache():
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = WSDLCache(resource_path('wsdl'), user_path('Camera Control', 'wsdl_cache'))
+        return _shared_cache
+
+
+class CachedONVIFCamera(ONVIFCamera):
+    """
+    ONVIFCamera that builds its service clients from the shared WSDL cache instead of parsing the WSDL.
+    When xaddrs are given the service addresses are not requested from the camera.
+    """
+
+    def __init__(self, host, port, user, passwd, wsdl_cache=None, xaddrs=None, plugins=None, **kwargs):
+        self.wsdl_cache = wsdl_cache or get_wsdl_cache()
+        self.cached_xaddrs = xaddrs
+        self.plugins = plugins or []
+        kwargs.setdefault('wsdl_dir', self.wsdl_cache.wsdl_dir)
+        super().__init__(host, port, user, passwd, **kwargs)
+
+    def update_xaddrs(self):
+        if self.cached_xaddrs is None:
+            return super().update_xaddrs()
+
+        self.dt_diff = None
+        self.devicemgmt = self.create_devicemgmt_service()
+        self.xaddrs = dict(self.cached_xaddrs)
+
+    def create_onvif_service(self, name, from_template=True, portType=None):
+        name = name.lower()
+        xaddr, wsdl_file, binding_name = self.get_definition(name, portType)
+        document = self.wsdl_cache.document(wsdl_file)
+
+        with self.services_lock:
+            wsse = UsernameDigestTokenDtDiff(self.user, self.passwd, dt_diff=self.dt_diff, use_digest=self.encrypt)
+            client = Client(wsdl=document, wsse=wsse, transport=self.transport, settings=self.wsdl_cache.settings,
+                            plugins=self.plugins)
+            service = ONVIFService(xaddr, self.user, self.passwd, wsdl_file, self.encrypt, self.daemon,
+                                   zeep_client=client, portType=portType, dt_diff=self.dt_diff,
+                                   binding_name=binding_name, transport=self.transport)
+            self.services[name] = service
+            setattr(self, name, service)
+
+        return service